@@ -8,7 +8,7 @@ from sqlalchemy.engine import Connection
 from alembic import context
 
 from src.config import get_settings
-from src.models import Base, RefreshToken, User, Link, Click
+from src.models import Base, RefreshToken, User, Link, ArchivedLink, Click, UserAgent, Referrer
 
 
 config = context.config
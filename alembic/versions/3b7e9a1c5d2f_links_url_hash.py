@@ -0,0 +1,56 @@
+"""Links url_hash
+
+Revision ID: 3b7e9a1c5d2f
+Revises: 8c1d2e3f4a5b
+Create Date: 2026-10-18 11:02:17.402381
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e9a1c5d2f'
+down_revision: Union[str, Sequence[str], None] = '8c1d2e3f4a5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10_000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('links', sa.Column('url_hash', sa.LargeBinary(length=32), nullable=True))
+
+    # backfill in short transactions so the table is never locked for long;
+    # must match src.utils.link_shortener.hash_url
+    with op.get_context().autocommit_block():
+        while True:
+            result = op.get_bind().execute(sa.text(
+                "UPDATE links SET url_hash = sha256(convert_to(original_link, 'UTF8')) "
+                "WHERE id IN (SELECT id FROM links WHERE url_hash IS NULL "
+                "ORDER BY id LIMIT :batch_size FOR UPDATE SKIP LOCKED)"
+            ), {'batch_size': BATCH_SIZE})
+            if result.rowcount == 0:
+                break
+
+        # links duplicated by racing requests keep working by short code, only
+        # the oldest one is found by url
+        op.execute(
+            "UPDATE links SET url_hash = NULL WHERE id IN ("
+            "SELECT id FROM (SELECT id, row_number() OVER ("
+            "PARTITION BY user_id, url_hash ORDER BY id) AS n FROM links) d "
+            "WHERE n > 1)"
+        )
+        op.create_index(
+            'ix_links_user_id_url_hash', 'links', ['user_id', 'url_hash'],
+            unique=True, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_links_user_id_url_hash', table_name='links')
+    op.drop_column('links', 'url_hash')
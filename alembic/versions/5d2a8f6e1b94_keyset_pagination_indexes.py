@@ -0,0 +1,46 @@
+"""Keyset pagination indexes
+
+Revision ID: 5d2a8f6e1b94
+Revises: 3b7e9a1c5d2f
+Create Date: 2026-10-18 11:48:05.913264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8f6e1b94'
+down_revision: Union[str, Sequence[str], None] = '3b7e9a1c5d2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the composite indexes lead with the same columns, so they also serve
+    # the foreign key lookups the single-column ones were there for
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_links_user_id_created_at_id', 'links',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_clicks_link_id_clicked_at_id', 'clicks',
+            ['link_id', sa.text('clicked_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_links_user_id', table_name='links', postgresql_concurrently=True)
+        op.drop_index('ix_clicks_link_id', table_name='clicks', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_clicks_link_id', 'clicks', ['link_id'], postgresql_concurrently=True)
+        op.create_index('ix_links_user_id', 'links', ['user_id'], postgresql_concurrently=True)
+        op.drop_index('ix_clicks_link_id_clicked_at_id', table_name='clicks', postgresql_concurrently=True)
+        op.drop_index('ix_links_user_id_created_at_id', table_name='links', postgresql_concurrently=True)
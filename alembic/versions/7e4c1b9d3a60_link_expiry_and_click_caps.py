@@ -0,0 +1,55 @@
+"""Link expiry and click caps
+
+Revision ID: 7e4c1b9d3a60
+Revises: 5d2a8f6e1b94
+Create Date: 2026-10-18 12:36:51.207744
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e4c1b9d3a60'
+down_revision: Union[str, Sequence[str], None] = '5d2a8f6e1b94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('links', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('links', sa.Column('max_clicks', sa.Integer(), nullable=True))
+    # a constant default doesn't rewrite the table; existing links start at
+    # zero rather than being counted here
+    op.add_column('links', sa.Column('click_count', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index(
+        'ix_links_expires_at', 'links', ['expires_at'], unique=False,
+        postgresql_where=sa.text('expires_at IS NOT NULL'),
+    )
+    op.create_table('archived_links',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('original_link', sa.String(), nullable=False),
+    sa.Column('short_code', sa.String(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('max_clicks', sa.Integer(), nullable=True),
+    sa.Column('click_count', sa.BigInteger(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_archived_links_user_id'), 'archived_links', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_archived_links_user_id'), table_name='archived_links')
+    op.drop_table('archived_links')
+    op.drop_index('ix_links_expires_at', table_name='links')
+    op.drop_column('links', 'click_count')
+    op.drop_column('links', 'max_clicks')
+    op.drop_column('links', 'expires_at')
@@ -0,0 +1,28 @@
+"""Short code sequence
+
+Revision ID: 8c1d2e3f4a5b
+Revises: 201150410953
+Create Date: 2026-10-18 10:12:41.118532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d2e3f4a5b'
+down_revision: Union[str, Sequence[str], None] = '201150410953'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(sa.schema.CreateSequence(sa.Sequence('short_code_seq')))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(sa.schema.DropSequence(sa.Sequence('short_code_seq')))
@@ -0,0 +1,113 @@
+"""Click rollups
+
+Revision ID: 9a3f5c7e2b18
+Revises: 7e4c1b9d3a60
+Create Date: 2026-10-18 14:05:33.650129
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from user_agents import parse
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3f5c7e2b18'
+down_revision: Union[str, Sequence[str], None] = '7e4c1b9d3a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# links per backfill transaction
+BATCH_SIZE = 1_000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('click_rollups_hourly',
+    sa.Column('link_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('clicks', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('link_id', 'bucket')
+    )
+    op.create_table('click_rollups_daily',
+    sa.Column('link_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.Date(), nullable=False),
+    sa.Column('clicks', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('link_id', 'bucket')
+    )
+    op.create_table('referrer_rollups_daily',
+    sa.Column('link_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.Date(), nullable=False),
+    sa.Column('referrer', sa.String(length=255), nullable=False),
+    sa.Column('clicks', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('link_id', 'bucket', 'referrer')
+    )
+    op.create_table('browser_rollups_daily',
+    sa.Column('link_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.Date(), nullable=False),
+    sa.Column('browser', sa.String(length=64), nullable=False),
+    sa.Column('clicks', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('link_id', 'bucket', 'browser')
+    )
+
+    # Backfill from the existing clicks, each statement covering a range of
+    # links in its own transaction.
+    # Apply before deploying the code that maintains the rollups: clicks
+    # written in between are not counted.
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        # browser families are parsed in Python, once per distinct user agent
+        bind.execute(sa.text(
+            "CREATE TEMPORARY TABLE ua_browsers (user_agent varchar PRIMARY KEY, browser varchar(64))"
+        ))
+        user_agents = bind.execute(sa.text(
+            "SELECT DISTINCT user_agent FROM clicks WHERE user_agent <> ''"
+        )).scalars().all()
+        if user_agents:
+            bind.execute(
+                sa.text("INSERT INTO ua_browsers VALUES (:user_agent, :browser)"),
+                [
+                    {"user_agent": ua, "browser": parse(ua).browser.family[:64]}
+                    for ua in user_agents
+                ],
+            )
+
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM links")).scalar()
+        for start in range(0, max_id + 1, BATCH_SIZE):
+            params = {"start": start, "end": start + BATCH_SIZE}
+            bind.execute(sa.text(
+                "INSERT INTO click_rollups_hourly (link_id, bucket, clicks) "
+                "SELECT link_id, date_trunc('hour', clicked_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', count(*) "
+                "FROM clicks "
+                "WHERE link_id >= :start AND link_id < :end GROUP BY 1, 2"
+            ), params)
+            bind.execute(sa.text(
+                "INSERT INTO click_rollups_daily (link_id, bucket, clicks) "
+                "SELECT link_id, (clicked_at AT TIME ZONE 'UTC')::date, count(*) FROM clicks "
+                "WHERE link_id >= :start AND link_id < :end GROUP BY 1, 2"
+            ), params)
+            bind.execute(sa.text(
+                "INSERT INTO referrer_rollups_daily (link_id, bucket, referrer, clicks) "
+                "SELECT link_id, (clicked_at AT TIME ZONE 'UTC')::date, referrer, count(*) FROM clicks "
+                "WHERE link_id >= :start AND link_id < :end AND referrer <> '' GROUP BY 1, 2, 3"
+            ), params)
+            bind.execute(sa.text(
+                "INSERT INTO browser_rollups_daily (link_id, bucket, browser, clicks) "
+                "SELECT c.link_id, (c.clicked_at AT TIME ZONE 'UTC')::date, b.browser, count(*) "
+                "FROM clicks c JOIN ua_browsers b ON b.user_agent = c.user_agent "
+                "WHERE c.link_id >= :start AND c.link_id < :end GROUP BY 1, 2, 3"
+            ), params)
+        bind.execute(sa.text("DROP TABLE ua_browsers"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('browser_rollups_daily')
+    op.drop_table('referrer_rollups_daily')
+    op.drop_table('click_rollups_daily')
+    op.drop_table('click_rollups_hourly')
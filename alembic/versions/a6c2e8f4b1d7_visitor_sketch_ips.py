@@ -0,0 +1,65 @@
+"""Daily IP address sketches
+
+Revision ID: a6c2e8f4b1d7
+Revises: f1b7d5a3c8e6
+Create Date: 2026-10-18 22:14:06.318204
+
+"""
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.utils.hll import HyperLogLog, visitor_hash
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c2e8f4b1d7'
+down_revision: Union[str, Sequence[str], None] = 'f1b7d5a3c8e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# links per backfill transaction, as in d4e8b2f6a1c9
+BATCH_SIZE = 100
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # empty sketches for the existing rows, filled in below
+    op.add_column('visitor_sketches_daily', sa.Column(
+        'ip_registers', sa.LargeBinary(), nullable=False,
+        server_default=sa.text("decode(repeat('00', 4096), 'hex')"),
+    ))
+    op.alter_column('visitor_sketches_daily', 'ip_registers', server_default=None)
+
+    # Apply before deploying the code that maintains the sketches: IP addresses
+    # of clicks written in between are not counted.
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM links")).scalar()
+        for start in range(0, max_id + 1, BATCH_SIZE):
+            sketches = defaultdict(HyperLogLog)
+            rows = bind.execute(sa.text(
+                "SELECT DISTINCT link_id, (clicked_at AT TIME ZONE 'UTC')::date, ip_address "
+                "FROM clicks "
+                "WHERE link_id >= :start AND link_id < :end AND ip_address IS NOT NULL"
+            ), {"start": start, "end": start + BATCH_SIZE})
+            for link_id, bucket, ip_address in rows:
+                sketches[(link_id, bucket)].add(visitor_hash(ip_address, None))
+            if sketches:
+                bind.execute(
+                    sa.text(
+                        "UPDATE visitor_sketches_daily SET ip_registers = :ip_registers "
+                        "WHERE link_id = :link_id AND bucket = :bucket"
+                    ),
+                    [
+                        {"link_id": link_id, "bucket": bucket, "ip_registers": sketch.to_bytes()}
+                        for (link_id, bucket), sketch in sketches.items()
+                    ],
+                )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('visitor_sketches_daily', 'ip_registers')
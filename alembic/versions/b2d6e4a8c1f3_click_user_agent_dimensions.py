@@ -0,0 +1,97 @@
+"""Click user agent dimensions
+
+Revision ID: b2d6e4a8c1f3
+Revises: 9a3f5c7e2b18
+Create Date: 2026-10-18 15:20:41.208537
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.utils.user_agent import BROWSERS, parse_user_agent
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d6e4a8c1f3'
+down_revision: Union[str, Sequence[str], None] = '9a3f5c7e2b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# click ids per backfill transaction
+CLICK_BATCH_SIZE = 50_000
+# links per rollup rebuild transaction
+LINK_BATCH_SIZE = 1_000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('clicks', sa.Column('browser', sa.SmallInteger(), nullable=True))
+    op.add_column('clicks', sa.Column('os', sa.SmallInteger(), nullable=True))
+    op.add_column('clicks', sa.Column('device', sa.SmallInteger(), nullable=True))
+    # browser names become BROWSERS indexes; families that aren't listed
+    # merge into "Other", so the rollup is rebuilt from the clicks below
+    op.execute('TRUNCATE browser_rollups_daily')
+    op.alter_column(
+        'browser_rollups_daily', 'browser',
+        type_=sa.SmallInteger(), postgresql_using='0',
+    )
+
+    # Apply before deploying the code that parses user agents at ingest:
+    # clicks written in between keep NULL dimensions.
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_clicks_link_id_browser', 'clicks', ['link_id', 'browser'],
+            postgresql_concurrently=True,
+        )
+
+        # each distinct user agent is parsed once, in Python
+        bind.execute(sa.text(
+            "CREATE TEMPORARY TABLE ua_dimensions ("
+            "user_agent varchar PRIMARY KEY, browser smallint, os smallint, device smallint)"
+        ))
+        user_agents = bind.execute(sa.text(
+            "SELECT DISTINCT user_agent FROM clicks WHERE user_agent <> ''"
+        )).scalars().all()
+        if user_agents:
+            bind.execute(
+                sa.text("INSERT INTO ua_dimensions VALUES (:user_agent, :browser, :os, :device)"),
+                [{"user_agent": ua, **parse_user_agent(ua)._asdict()} for ua in user_agents],
+            )
+
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM clicks")).scalar()
+        for start in range(0, max_id + 1, CLICK_BATCH_SIZE):
+            bind.execute(sa.text(
+                "UPDATE clicks c SET browser = d.browser, os = d.os, device = d.device "
+                "FROM ua_dimensions d "
+                "WHERE d.user_agent = c.user_agent AND c.id >= :start AND c.id < :end"
+            ), {"start": start, "end": start + CLICK_BATCH_SIZE})
+        bind.execute(sa.text("DROP TABLE ua_dimensions"))
+
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM links")).scalar()
+        for start in range(0, max_id + 1, LINK_BATCH_SIZE):
+            bind.execute(sa.text(
+                "INSERT INTO browser_rollups_daily (link_id, bucket, browser, clicks) "
+                "SELECT link_id, (clicked_at AT TIME ZONE 'UTC')::date, browser, count(*) FROM clicks "
+                "WHERE link_id >= :start AND link_id < :end AND browser IS NOT NULL GROUP BY 1, 2, 3"
+            ), {"start": start, "end": start + LINK_BATCH_SIZE})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # ids map to distinct names, so the primary key stays unique
+    names = ", ".join("'" + name.replace("'", "''") + "'" for name in BROWSERS)
+    op.alter_column(
+        'browser_rollups_daily', 'browser',
+        type_=sa.String(length=64),
+        postgresql_using=f'(ARRAY[{names}])[browser + 1]',
+    )
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_clicks_link_id_browser', table_name='clicks', postgresql_concurrently=True
+        )
+    op.drop_column('clicks', 'device')
+    op.drop_column('clicks', 'os')
+    op.drop_column('clicks', 'browser')
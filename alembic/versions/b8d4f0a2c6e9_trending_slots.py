@@ -0,0 +1,35 @@
+"""Trending slots shared between workers
+
+Revision ID: b8d4f0a2c6e9
+Revises: a6c2e8f4b1d7
+Create Date: 2026-10-18 23:02:41.775310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d4f0a2c6e9'
+down_revision: Union[str, Sequence[str], None] = 'a6c2e8f4b1d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('trending_slots',
+    sa.Column('worker_id', sa.Uuid(), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('capacity', sa.Integer(), nullable=False),
+    sa.Column('items', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.PrimaryKeyConstraint('worker_id', 'started_at')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('trending_slots')
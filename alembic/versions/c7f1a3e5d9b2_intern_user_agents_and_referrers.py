@@ -0,0 +1,105 @@
+"""Intern user agents and referrers
+
+Revision ID: c7f1a3e5d9b2
+Revises: b2d6e4a8c1f3
+Create Date: 2026-10-18 16:02:17.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7f1a3e5d9b2'
+down_revision: Union[str, Sequence[str], None] = 'b2d6e4a8c1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# click ids per backfill transaction
+BATCH_SIZE = 50_000
+
+
+def _click_id_ranges(bind):
+    max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM clicks")).scalar()
+    for start in range(0, max_id + 1, BATCH_SIZE):
+        yield {"start": start, "end": start + BATCH_SIZE}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_agents',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.String(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('value')
+    )
+    op.create_table('referrers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.String(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('value')
+    )
+    op.add_column('clicks', sa.Column('user_agent_id', sa.Integer(), nullable=True))
+    op.add_column('clicks', sa.Column('referrer_id', sa.Integer(), nullable=True))
+
+    # Backfill in batches of click ids, one transaction each; every click row
+    # is rewritten once. Deploy the code that writes ids together with this
+    # migration: clicks written by the old code in between lose their strings.
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        for params in _click_id_ranges(bind):
+            bind.execute(sa.text(
+                "INSERT INTO user_agents (value) "
+                "SELECT DISTINCT user_agent FROM clicks "
+                "WHERE id >= :start AND id < :end AND user_agent IS NOT NULL "
+                "ON CONFLICT (value) DO NOTHING"
+            ), params)
+            bind.execute(sa.text(
+                "INSERT INTO referrers (value) "
+                "SELECT DISTINCT referrer FROM clicks "
+                "WHERE id >= :start AND id < :end AND referrer IS NOT NULL "
+                "ON CONFLICT (value) DO NOTHING"
+            ), params)
+            bind.execute(sa.text(
+                "UPDATE clicks c SET "
+                "user_agent_id = (SELECT id FROM user_agents WHERE value = c.user_agent), "
+                "referrer_id = (SELECT id FROM referrers WHERE value = c.referrer) "
+                "WHERE c.id >= :start AND c.id < :end "
+                "AND (c.user_agent IS NOT NULL OR c.referrer IS NOT NULL)"
+            ), params)
+
+        # added NOT VALID and validated separately so writes aren't blocked
+        # while the existing rows are checked
+        for column, table in (('user_agent_id', 'user_agents'), ('referrer_id', 'referrers')):
+            bind.execute(sa.text(
+                f"ALTER TABLE clicks ADD CONSTRAINT clicks_{column}_fkey "
+                f"FOREIGN KEY ({column}) REFERENCES {table} (id) NOT VALID"
+            ))
+            bind.execute(sa.text(f"ALTER TABLE clicks VALIDATE CONSTRAINT clicks_{column}_fkey"))
+
+    op.drop_column('clicks', 'referrer')
+    op.drop_column('clicks', 'user_agent')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('clicks', sa.Column('user_agent', sa.String(length=255), nullable=True))
+    op.add_column('clicks', sa.Column('referrer', sa.String(length=255), nullable=True))
+
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        for params in _click_id_ranges(bind):
+            bind.execute(sa.text(
+                "UPDATE clicks c SET "
+                "user_agent = (SELECT value FROM user_agents WHERE id = c.user_agent_id), "
+                "referrer = (SELECT value FROM referrers WHERE id = c.referrer_id) "
+                "WHERE c.id >= :start AND c.id < :end "
+                "AND (c.user_agent_id IS NOT NULL OR c.referrer_id IS NOT NULL)"
+            ), params)
+
+    op.drop_column('clicks', 'referrer_id')
+    op.drop_column('clicks', 'user_agent_id')
+    op.drop_table('referrers')
+    op.drop_table('user_agents')
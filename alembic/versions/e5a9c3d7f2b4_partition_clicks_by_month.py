@@ -0,0 +1,143 @@
+"""Partition clicks by month
+
+Revision ID: e5a9c3d7f2b4
+Revises: d4e8b2f6a1c9
+Create Date: 2026-10-18 18:24:09.316570
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c3d7f2b4'
+down_revision: Union[str, Sequence[str], None] = 'd4e8b2f6a1c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# click ids copied per transaction
+BATCH_SIZE = 50_000
+# months created after the current one; the maintenance task takes over
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, link_id, clicked_at, ip_address, browser, os, device, user_agent_id, referrer_id"
+
+# name on the new table -> name once it replaces clicks
+RENAMES = {
+    'clicks_new_pkey': 'clicks_pkey',
+    'clicks_new_link_id_fkey': 'clicks_link_id_fkey',
+    'clicks_new_user_agent_id_fkey': 'clicks_user_agent_id_fkey',
+    'clicks_new_referrer_id_fkey': 'clicks_referrer_id_fkey',
+}
+INDEX_RENAMES = {
+    'ix_clicks_new_link_id_clicked_at_id': 'ix_clicks_link_id_clicked_at_id',
+    'ix_clicks_new_link_id_browser': 'ix_clicks_link_id_browser',
+}
+
+
+def _create_clicks_new(partitioned: bool) -> None:
+    op.execute(
+        "CREATE TABLE clicks_new ("
+        "id integer NOT NULL DEFAULT nextval('clicks_id_seq'), "
+        "link_id integer NOT NULL, "
+        "clicked_at timestamp with time zone NOT NULL, "
+        "ip_address varchar(45), "
+        "browser smallint, os smallint, device smallint, "
+        "user_agent_id integer, referrer_id integer, "
+        + ("CONSTRAINT clicks_new_pkey PRIMARY KEY (id, clicked_at), "
+           if partitioned else "CONSTRAINT clicks_new_pkey PRIMARY KEY (id), ")
+        + "CONSTRAINT clicks_new_link_id_fkey FOREIGN KEY (link_id) "
+        "REFERENCES links (id) ON DELETE CASCADE, "
+        "CONSTRAINT clicks_new_user_agent_id_fkey FOREIGN KEY (user_agent_id) "
+        "REFERENCES user_agents (id), "
+        "CONSTRAINT clicks_new_referrer_id_fkey FOREIGN KEY (referrer_id) "
+        "REFERENCES referrers (id))"
+        + (" PARTITION BY RANGE (clicked_at)" if partitioned else "")
+    )
+
+
+def _create_indexes() -> None:
+    op.create_index(
+        'ix_clicks_new_link_id_clicked_at_id', 'clicks_new',
+        ['link_id', sa.text('clicked_at DESC'), sa.text('id DESC')],
+    )
+    op.create_index('ix_clicks_new_link_id_browser', 'clicks_new', ['link_id', 'browser'])
+
+
+def _swap() -> None:
+    # the sequence would go with the old table otherwise
+    op.execute("ALTER SEQUENCE clicks_id_seq OWNED BY clicks_new.id")
+    op.execute("DROP TABLE clicks")
+    op.execute("ALTER TABLE clicks_new RENAME TO clicks")
+    for old, new in RENAMES.items():
+        op.execute(f"ALTER TABLE clicks RENAME CONSTRAINT {old} TO {new}")
+    for old, new in INDEX_RENAMES.items():
+        op.execute(f"ALTER INDEX {old} RENAME TO {new}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _create_clicks_new(partitioned=True)
+    bind = op.get_bind()
+    months = bind.execute(sa.text(
+        "SELECT generate_series("
+        "date_trunc('month', coalesce(min(clicked_at), now()) AT TIME ZONE 'UTC'), "
+        "date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => :ahead), "
+        "interval '1 month')::date FROM clicks"
+    ), {"ahead": MONTHS_AHEAD}).scalars().all()
+    for month in months:
+        # same layout as ClickPartitionRepository.create
+        year, index = divmod(month.year * 12 + month.month, 12)
+        op.execute(
+            f"CREATE TABLE clicks_p{month:%Y%m} PARTITION OF clicks_new FOR VALUES "
+            f"FROM ('{month:%Y-%m-%d} 00:00+00') TO ('{year:04d}-{index + 1:02d}-01 00:00+00')"
+        )
+    op.execute("CREATE TABLE clicks_default PARTITION OF clicks_new DEFAULT")
+    # created up front: indexes can't be built concurrently on a partitioned
+    # table, and building them later would block writes for the duration
+    _create_indexes()
+
+    # Writers commit out of order, so a pass's max(id) can be ahead of ids
+    # still in flight. SHARE waits for the current writers; every id up to
+    # `settled` is then committed (or rolled back for good), later ones may
+    # show up behind any pass. The lock goes with the commit below.
+    op.execute("LOCK TABLE clicks IN SHARE MODE")
+    settled = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM clicks")).scalar()
+
+    # Copy in id batches, one transaction each, while clicks keeps taking
+    # writes; repeat until only a batch's worth of new clicks is left.
+    # Deleting a link deletes its clicks from both tables.
+    copied = 0
+    with op.get_context().autocommit_block():
+        while True:
+            max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM clicks")).scalar()
+            if max_id - copied <= BATCH_SIZE:
+                break
+            for start in range(copied + 1, max_id + 1, BATCH_SIZE):
+                bind.execute(sa.text(
+                    f"INSERT INTO clicks_new ({COLUMNS}) SELECT {COLUMNS} FROM clicks "
+                    "WHERE id >= :start AND id < :end"
+                ), {"start": start, "end": min(start + BATCH_SIZE, max_id + 1)})
+            copied = max_id
+
+    # the rest under a lock that only blocks writers, then the swap; past
+    # `settled`, ids skipped by a pass are picked up by the anti-join
+    op.execute("LOCK TABLE clicks IN EXCLUSIVE MODE")
+    op.execute(
+        f"INSERT INTO clicks_new ({COLUMNS}) SELECT {COLUMNS} FROM clicks c "
+        f"WHERE c.id > {min(copied, settled)} "
+        "AND NOT EXISTS (SELECT 1 FROM clicks_new n WHERE n.id = c.id)"
+    )
+    _swap()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _create_clicks_new(partitioned=False)
+    op.execute("LOCK TABLE clicks IN EXCLUSIVE MODE")
+    op.execute(f"INSERT INTO clicks_new ({COLUMNS}) SELECT {COLUMNS} FROM clicks")
+    _create_indexes()
+    # attached partitions are dropped with the parent; detached ones are left
+    _swap()
@@ -0,0 +1,172 @@
+"""Compare /api/clicks/stats/{link_id} query strategies on a large link.
+
+Seeds a throwaway user with one link and N clicks (and their rollups), then
+times the original six-query summary, the single scan over raw clicks and the
+rollup-backed ClickService.get_summary:
+
+    python -m scripts.bench_summary --clicks 1000000 10000000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from sqlalchemy import delete, func, text
+from src.db import get_engine, get_session_factory
+from src.models.click import Click
+from src.models.link import Link
+from src.models.user import User
+from src.repositories.click import ClickRepository
+from src.services.click import ClickService
+
+SEED_DIMENSIONS = [
+    text("""
+        INSERT INTO user_agents (value)
+        SELECT 'Mozilla/5.0 agent-' || g FROM generate_series(0, 39) AS g
+        ON CONFLICT (value) DO NOTHING
+        """),
+    text("""
+        INSERT INTO referrers (value)
+        SELECT 'https://ref' || g || '.example' FROM generate_series(0, 299) AS g
+        ON CONFLICT (value) DO NOTHING
+        """),
+]
+
+SEED_CLICKS = text("""
+    INSERT INTO clicks
+        (link_id, clicked_at, ip_address, user_agent_id, referrer_id, browser)
+    SELECT :link_id,
+           now() - random() * interval '90 days',
+           '10.0.' || (g % 250) || '.' || (g / 250 % 250),
+           ua.id,
+           r.id,
+           g % 40 % 8
+    FROM generate_series(1, :count) AS g
+    JOIN user_agents ua ON ua.value = 'Mozilla/5.0 agent-' || (g % 40)
+    LEFT JOIN referrers r
+        ON g % 5 <> 0 AND r.value = 'https://ref' || (g % 300) || '.example'
+    """)
+
+# what ClickRepository.insert_clicks would have maintained for those clicks
+SEED_ROLLUPS = [
+    text("""
+        INSERT INTO click_rollups_daily (link_id, bucket, clicks)
+        SELECT link_id, (clicked_at AT TIME ZONE 'UTC')::date, count(*)
+        FROM clicks WHERE link_id = :link_id GROUP BY 1, 2
+        """),
+    text("""
+        INSERT INTO referrer_rollups_daily (link_id, bucket, referrer, clicks)
+        SELECT c.link_id, (c.clicked_at AT TIME ZONE 'UTC')::date, r.value, count(*)
+        FROM clicks c JOIN referrers r ON r.id = c.referrer_id
+        WHERE c.link_id = :link_id
+        GROUP BY 1, 2, 3
+        """),
+    text("""
+        INSERT INTO browser_rollups_daily (link_id, bucket, browser, clicks)
+        SELECT link_id, (clicked_at AT TIME ZONE 'UTC')::date, browser, count(*)
+        FROM clicks WHERE link_id = :link_id GROUP BY 1, 2, 3
+        """),
+]
+
+
+async def legacy_summary(repo: ClickRepository, db, user_id, link_id) -> None:
+    # what get_summary used to run: one scan per figure
+    filters = [Click.link_id == link_id, Link.user_id == user_id]
+    await repo.aggregate_records(db, Click.id, filters)
+    await repo.aggregate_records(
+        db,
+        Click.id,
+        filters + [Click.clicked_at >= func.date_trunc("day", func.now())],
+    )
+    # (it counted distinct user agents as unique_ips; IPs are what it meant)
+    await repo.aggregate_records(db, Click.ip_address, filters, distinct_flag=True)
+    await repo.aggregate_records(db, Click.referrer_id, filters, distinct_flag=True)
+    await repo.aggregate_records(
+        db,
+        Click.referrer_id,
+        filters,
+        group_by=Click.referrer_id,
+        order_by=func.count(Click.referrer_id).desc(),
+        limit=5,
+    )
+    await repo.aggregate_records(
+        db, Click.user_agent_id, filters, group_by=Click.user_agent_id
+    )
+
+
+async def timed(func, runs: int) -> float:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+async def bench(session_factory, clicks: int, runs: int) -> None:
+    async with session_factory() as db:
+        user = User(
+            username=f"bench-{uuid.uuid4().hex[:8]}",
+            email=f"{uuid.uuid4().hex}@bench.example",
+            hashed_password="-",
+        )
+        link = Link(
+            original_link=f"https://bench.example/{uuid.uuid4()}",
+            short_code=uuid.uuid4().hex[:12],
+            user=user,
+        )
+        db.add_all([user, link])
+        await db.commit()
+        user_id, link_id = user.id, link.id
+
+        try:
+            start = time.perf_counter()
+            for stmt in SEED_DIMENSIONS:
+                await db.execute(stmt)
+            await db.execute(SEED_CLICKS, {"link_id": link_id, "count": clicks})
+            for stmt in SEED_ROLLUPS:
+                await db.execute(stmt, {"link_id": link_id})
+            await db.commit()
+            await db.execute(text("ANALYZE clicks"))
+            print(f"{clicks:>11,} clicks seeded in {time.perf_counter() - start:.1f}s")
+
+            repo = ClickRepository()
+            service = ClickService(repo)
+            legacy = await timed(
+                lambda: legacy_summary(repo, db, user_id, link_id), runs
+            )
+            single = await timed(
+                lambda: service.get_summary_from_clicks(db, user_id, link_id), runs
+            )
+            rollups = await timed(
+                lambda: service.get_summary(db, user_id, link_id), runs
+            )
+            print(
+                f"{'':>11}  six queries {legacy:9.1f} ms   "
+                f"single scan {single:9.1f} ms   rollups {rollups:9.1f} ms"
+            )
+        finally:
+            await db.rollback()
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--clicks", type=int, nargs="+", default=[1_000_000, 10_000_000]
+    )
+    parser.add_argument("--runs", type=int, default=5, help="median of N runs")
+    args = parser.parse_args()
+
+    engine = get_engine(pool_name="bench")
+    try:
+        for clicks in args.clicks:
+            await bench(get_session_factory(engine), clicks, args.runs)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
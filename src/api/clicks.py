@@ -1,12 +1,41 @@
-from datetime import date
+from datetime import date, datetime
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Request,
+    Response,
+    status,
+    Query,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.api.dependencies import get_active_user, get_click_service, get_db
-from src.exceptions import ClicksNotFoundException
+from src.api.dependencies import (
+    get_active_user,
+    get_click_service,
+    get_db,
+    superuser_required,
+)
+from fastapi.responses import StreamingResponse
+from src.exceptions import (
+    ClicksNotFoundException,
+    InvalidCursorException,
+    InvalidPeriodException,
+    LinkNotFoundException,
+)
 from src.models.user import User
-from src.schemas.click import ClickOut, ClicksByPeriodItem, StatsOut
+from src.schemas.click import (
+    ClickOut,
+    Granularity,
+    LinkPeriodClicksOut,
+    LinkStatsOut,
+    PeriodClicksResponse,
+    StatsOut,
+    TrendingShortCodeOut,
+)
 from src.services.click import ClickService
+from src.utils.export import ExportFormat, as_utc, export_response
+from src.utils.http_cache import conditional_response
 
 router = APIRouter(
     prefix="/clicks",
@@ -14,51 +43,210 @@ router = APIRouter(
 )
 
 
+# registered before /{link_id}, which would otherwise match them
+
+
+@router.get("/stats", status_code=status.HTTP_200_OK, response_model=List[LinkStatsOut])
+async def get_links_summary_stats(
+    response: Response,
+    link_id: List[int] | None = Query(
+        None, description="Links to include (repeatable); all links by default"
+    ),
+    date_from: date | None = Query(None, description="From (YYYY-MM-DD)"),
+    date_to: date | None = Query(None, description="To (YYYY-MM-DD)"),
+    cursor: str | None = Query(None, description="X-Next-Cursor of the last page"),
+    limit: int = Query(50, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_active_user),
+    click_service: ClickService = Depends(get_click_service),
+):
+    """Stats of many links at once, newest link first and paginated like
+    /api/links/all; unknown link ids are left out"""
+    try:
+        stats, next_cursor = await click_service.get_links_summary(
+            db,
+            current_user.id,
+            link_ids=link_id,
+            limit=limit,
+            cursor=cursor,
+            date_from=date_from,
+            date_to=date_to,
+        )
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return stats
+
+
+@router.get(
+    "/period",
+    status_code=status.HTTP_200_OK,
+    response_model=List[LinkPeriodClicksOut],
+)
+async def get_links_clicks_by_period(
+    response: Response,
+    date_from: date = Query(..., description="From (YYYY-MM-DD)"),
+    date_to: date = Query(..., description="To (YYYY-MM-DD)"),
+    link_id: List[int] | None = Query(
+        None, description="Links to include (repeatable); all links by default"
+    ),
+    cursor: str | None = Query(None, description="X-Next-Cursor of the last page"),
+    limit: int = Query(50, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_active_user),
+    click_service: ClickService = Depends(get_click_service),
+):
+    """Daily clicks of many links at once, paginated like /clicks/stats"""
+    try:
+        periods, next_cursor = await click_service.get_links_period_clicks(
+            db,
+            current_user.id,
+            link_ids=link_id,
+            limit=limit,
+            cursor=cursor,
+            date_from=date_from,
+            date_to=date_to,
+        )
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return periods
+
+
+@router.get(
+    "/trending",
+    status_code=status.HTTP_200_OK,
+    response_model=List[TrendingShortCodeOut],
+    dependencies=[Depends(superuser_required)],
+)
+async def get_trending_short_codes(
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    click_service: ClickService = Depends(get_click_service),
+):
+    """The most redirected short codes over the last TRENDING_WINDOW_SECONDS,
+    approximate and across all workers; the others' counts are up to
+    TRENDING_FLUSH_INTERVAL_SECONDS old"""
+    return await click_service.get_trending_short_codes(db, limit)
+
+
 @router.get("/{link_id}", status_code=status.HTTP_200_OK, response_model=List[ClickOut])
 async def get_link_clicks(
     link_id: int,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
+    response: Response,
+    cursor: str | None = Query(None, description="X-Next-Cursor of the last page"),
+    limit: int = Query(10, ge=1, le=1000),
+    skip: int = Query(0, ge=0, deprecated=True),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_active_user),
     click_service: ClickService = Depends(get_click_service),
 ):
+    """Newest clicks first, paginated like /api/links/all"""
     try:
-        clicks = await click_service.get_link_clicks(
-            db, user_id=current_user.id, link_id=link_id, skip=skip, limit=limit
+        clicks, next_cursor = await click_service.get_link_clicks(
+            db,
+            user_id=current_user.id,
+            link_id=link_id,
+            limit=limit,
+            cursor=cursor,
+            skip=skip,
         )
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except ClicksNotFoundException as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return clicks
 
 
+@router.get(
+    "/{link_id}/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+async def export_link_clicks(
+    link_id: int,
+    format: ExportFormat = Query("ndjson"),
+    date_from: datetime | None = Query(None, description="Clicked at or after"),
+    date_to: datetime | None = Query(None, description="Clicked before"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_active_user),
+    click_service: ClickService = Depends(get_click_service),
+):
+    """The link's full click history, oldest first, streamed as NDJSON or CSV"""
+    try:
+        chunks = await click_service.export_link_clicks(
+            db,
+            current_user.id,
+            link_id,
+            format,
+            clicked_from=as_utc(date_from),
+            clicked_to=as_utc(date_to),
+        )
+    except LinkNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return export_response(chunks, db, format, f"clicks-{link_id}")
+
+
 @router.get("/stats/{link_id}", status_code=status.HTTP_200_OK, response_model=StatsOut)
 async def get_summary_stats(
     link_id: int,
+    request: Request,
     date_from: date | None = Query(None, description="From (YYYY-MM-DD)"),
     date_to: date | None = Query(None, description="To (YYYY-MM-DD)"),
+    exact: bool = Query(
+        False,
+        description="Count unique visitors and IPs over the raw clicks instead of "
+        "estimating them (standard error ~1.6%)",
+    ),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_active_user),
     click_service: ClickService = Depends(get_click_service),
 ):
-    return await click_service.get_summary(
-        db, current_user.id, link_id=link_id, date_from=date_from, date_to=date_to
+    """Cached per link and parameters; answers If-None-Match and
+    If-Modified-Since with 304"""
+    result = await click_service.get_cached_summary(
+        db,
+        current_user.id,
+        link_id=link_id,
+        date_from=date_from,
+        date_to=date_to,
+        exact=exact,
     )
+    return conditional_response(request, result)
 
 
 @router.get(
     "/period/{link_id}",
     status_code=status.HTTP_200_OK,
-    response_model=List[ClicksByPeriodItem],
+    response_model=PeriodClicksResponse,
 )
 async def get_clicks_by_period(
     link_id: int,
+    request: Request,
     date_from: date = Query(..., description="From (YYYY-MM-DD)"),
-    date_to: date = Query(..., description="To (YYYY-MM-DD)"),
+    date_to: date = Query(..., description="To (YYYY-MM-DD), inclusive"),
+    granularity: Granularity = Query("day"),
+    tz: str = Query("UTC", description="IANA time zone of the dates and buckets"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_active_user),
     click_service: ClickService = Depends(get_click_service),
 ):
-    return await click_service.get_period_clicks(
-        db, current_user.id, link_id=link_id, date_from=date_from, date_to=date_to
-    )
+    """Clicks per bucket, empty buckets included, at most PERIOD_MAX_BUCKETS
+    of them. Cached and conditional like /clicks/stats."""
+    try:
+        result = await click_service.get_cached_period_clicks(
+            db,
+            current_user.id,
+            link_id=link_id,
+            date_from=date_from,
+            date_to=date_to,
+            granularity=granularity,
+            tz=tz,
+        )
+    except InvalidPeriodException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return conditional_response(request, result)
@@ -20,6 +20,13 @@ bearer_scheme = HTTPBearer()
 settings = get_settings()
 engine = get_engine()
 async_session_factory = get_session_factory(engine)
+redirect_engine = get_engine(
+    pool_name="redirect",
+    pool_size=settings.redirect_db_pool_size,
+    max_overflow=settings.redirect_db_max_overflow,
+    pool_timeout=settings.redirect_db_pool_timeout_seconds,
+)
+redirect_session_factory = get_session_factory(redirect_engine)
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -27,6 +34,11 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+async def get_redirect_db() -> AsyncGenerator[AsyncSession, None]:
+    async with redirect_session_factory() as session:
+        yield session
+
+
 async def get_user_service() -> UserService:
     return UserService(UserRepository())
 
@@ -0,0 +1,96 @@
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, RedirectResponse
+from starlette.types import Receive, Scope, Send
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from src.config import get_settings
+from src.exceptions import LinkExpiredException, LinkNotFoundException
+from src.repositories.click import ClickRepository
+from src.repositories.link import LinkRepository
+from src.services.click import ClickService
+from src.services.link import LinkService
+
+settings = get_settings()
+
+
+class _LazyConnection:
+    """Quacks like the AsyncSession the repositories expect, but checks a pooled
+    connection out only when a statement is actually executed, so cache hits
+    with buffered click tracking never touch the pool."""
+
+    def __init__(self, engine: AsyncEngine):
+        self._engine = engine
+        self._conn: AsyncConnection | None = None
+
+    async def execute(self, *args, **kwargs):
+        if self._conn is None:
+            self._conn = self._engine.connect()
+            await self._conn.start()
+        return await self._conn.execute(*args, **kwargs)
+
+    async def commit(self) -> None:
+        if self._conn is not None:
+            await self._conn.commit()
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+class RedirectApp:
+    """Plain ASGI app answering `/{short_code}` the same way `redirect_link` does,
+    without the FastAPI routing, validation and dependency machinery."""
+
+    def __init__(self, engine: AsyncEngine):
+        self._engine = engine
+        self._link_service = LinkService(LinkRepository())
+        self._click_service = ClickService(ClickRepository())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1000})
+            return
+        if scope["type"] != "http":
+            return
+
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path) :]
+        short_code = path[1:] if path.startswith("/") else path
+
+        if not short_code or "/" in short_code:
+            response = JSONResponse({"detail": "Not Found"}, status_code=404)
+        elif scope["method"] != "GET":
+            response = JSONResponse(
+                {"detail": "Method Not Allowed"},
+                status_code=405,
+                headers={"Allow": "GET"},
+            )
+        else:
+            response = await self._redirect(scope, short_code)
+        await response(scope, receive, send)
+
+    async def _redirect(self, scope: Scope, short_code: str):
+        db = _LazyConnection(self._engine)
+        try:
+            try:
+                link = await self._link_service.get_by_short_code_public(db, short_code)
+            except LinkNotFoundException as e:
+                return JSONResponse({"detail": str(e)}, status_code=404)
+            except LinkExpiredException as e:
+                return JSONResponse({"detail": str(e)}, status_code=410)
+
+            if settings.enable_tracking:
+                client = scope.get("client")
+                await self._click_service.register_request_click(
+                    db,
+                    link_id=link.id,
+                    short_code=short_code,
+                    headers=Headers(scope=scope),
+                    client_host=client[0] if client else None,
+                )
+        finally:
+            await db.close()
+
+        return RedirectResponse(url=link.original_link)
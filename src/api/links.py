@@ -1,22 +1,51 @@
-from typing import List
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, List, Tuple, Union
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    HTTPException,
+    Request,
+    Response,
+    status,
+    Depends,
+    Query,
+)
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
 from src.api.dependencies import (
+    async_session_factory,
     get_active_user,
     get_db,
     get_link_service,
 )
+from src.config import get_settings
+from src.exceptions import InvalidCursorException
 from src.models.user import User
-from src.schemas.link import BaseLink, LinkCreate, LinkListOut, LinkOut
+from src.schemas.link import (
+    BaseLink,
+    LinkBulkResult,
+    LinkCreate,
+    LinkListOut,
+    LinkOut,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.utils.export import ExportFormat, as_utc, export_response
 from src.services.link import (
     LinkAlreadyExistsException,
     LinkService,
     LinkNotFoundException,
 )
 
+settings = get_settings()
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/links", tags=["Links"])
 
+NDJSON = "application/x-ndjson"
+
 
 @router.post("/create", response_model=LinkOut, status_code=status.HTTP_201_CREATED)
 async def create_short_link(
@@ -31,19 +60,186 @@ async def create_short_link(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail
+    )
+
+
+async def _read_bulk_items(request: Request) -> List:
+    body_too_large = _too_large(f"At most {settings.bulk_max_bytes} bytes per request")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.bulk_max_bytes:
+        raise body_too_large
+
+    ndjson = request.headers.get("content-type", "").startswith(NDJSON)
+    raw_items = []
+    body = []
+    buffer = b""
+    received = 0
+    # chunked bodies carry no Content-Length: counted as they arrive
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > settings.bulk_max_bytes:
+            raise body_too_large
+        if not ndjson:
+            body.append(chunk)
+            continue
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > settings.bulk_max_line_bytes or any(
+            len(line) > settings.bulk_max_line_bytes for line in lines
+        ):
+            raise _too_large(
+                f"At most {settings.bulk_max_line_bytes} bytes per NDJSON line"
+            )
+        raw_items.extend(line for line in lines if line.strip())
+        if len(raw_items) > settings.bulk_max_items:
+            break
+
+    if ndjson:
+        if buffer.strip():
+            raw_items.append(buffer)
+        items = []
+        for line in raw_items:
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+    else:
+        try:
+            items = json.loads(b"".join(body))
+        except ValueError:
+            items = None
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Expected a JSON array or NDJSON of links",
+            )
+
+    if len(items) > settings.bulk_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.bulk_max_items} links per request",
+        )
+    return items
+
+
+def _validate_bulk_item(index: int, item) -> Union[LinkCreate, LinkBulkResult]:
+    try:
+        return LinkCreate.model_validate(item)
+    except ValidationError as e:
+        message = "; ".join(error["msg"] for error in e.errors())
+        return LinkBulkResult(index=index, error=message)
+
+
+@router.post(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON: {}}}},
+)
+async def create_short_links_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_active_user),
+    link_service: LinkService = Depends(get_link_service),
+):
+    """Create many links from a JSON array or NDJSON body of `LinkCreate`
+    items; one NDJSON `LinkBulkResult` line per item is streamed back"""
+    # the body is read up front: once the response starts streaming the
+    # request can't be read any more
+    items = await _read_bulk_items(request)
+    user_id = current_user.id
+
+    async def results() -> AsyncIterator[str]:
+        try:
+            for start in range(0, len(items), settings.bulk_chunk_size):
+                chunk: List[Tuple[int, LinkCreate]] = []
+                for index, item in enumerate(
+                    items[start : start + settings.bulk_chunk_size], start
+                ):
+                    valid = _validate_bulk_item(index, item)
+                    if isinstance(valid, LinkBulkResult):
+                        yield valid.model_dump_json(exclude_none=True) + "\n"
+                    else:
+                        chunk.append((index, valid))
+                if not chunk:
+                    continue
+
+                try:
+                    chunk_results = await link_service.create_links_bulk(
+                        db, chunk, user_id
+                    )
+                except SQLAlchemyError:
+                    logger.exception("Bulk link creation failed")
+                    await db.rollback()
+                    chunk_results = [
+                        LinkBulkResult(
+                            index=index,
+                            original_link=str(link_in.original_link),
+                            error="Database error",
+                        )
+                        for index, link_in in chunk
+                    ]
+                for result in chunk_results:
+                    yield result.model_dump_json(exclude_none=True) + "\n"
+        finally:
+            # get_db's cleanup has already run by the time the body streams
+            await db.close()
+
+    return StreamingResponse(results(), media_type=NDJSON)
+
+
 @router.get(
     "/all",
     response_model=List[LinkListOut],
     status_code=status.HTTP_200_OK,
 )
 async def get_links(
-    skip: int = 0,
-    limit: int = Query(5, ge=0, le=5),
+    response: Response,
+    cursor: str | None = Query(None, description="X-Next-Cursor of the last page"),
+    limit: int = Query(5, ge=1, le=1000),
+    skip: int = Query(0, ge=0, deprecated=True),
     db: AsyncSession = Depends(get_db),
     link_service: LinkService = Depends(get_link_service),
     current_user: User = Depends(get_active_user),
 ):
-    return await link_service.get_user_links(db, current_user.id, skip, limit)
+    """Newest links first. Pass the X-Next-Cursor response header back as
+    `cursor` for the next page; the header is absent on the last page."""
+    try:
+        links, next_cursor = await link_service.get_user_links(
+            db, current_user.id, limit=limit, cursor=cursor, skip=skip
+        )
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return links
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON: {}, "text/csv": {}}}},
+)
+async def export_links(
+    format: ExportFormat = Query("ndjson"),
+    date_from: datetime | None = Query(None, description="Created at or after"),
+    date_to: datetime | None = Query(None, description="Created before"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_active_user),
+    link_service: LinkService = Depends(get_link_service),
+):
+    """All of the user's links, oldest first, streamed as NDJSON or CSV"""
+    chunks = link_service.export_links(
+        db,
+        current_user.id,
+        format,
+        created_from=as_utc(date_from),
+        created_to=as_utc(date_to),
+    )
+    return export_response(chunks, db, format, "links")
 
 
 @router.get(
@@ -66,14 +262,30 @@ async def get_link_by_code(
 @router.delete(
     "/delete",
     status_code=status.HTTP_204_NO_CONTENT,
+    responses={202: {"description": "Purge scheduled"}},
 )
 async def delete_links_by_original_link(
     base_link: BaseLink,
+    background_tasks: BackgroundTasks,
+    background: bool = Query(
+        False, description="Purge clicks in chunks after responding (202)"
+    ),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_active_user),
     link_service: LinkService = Depends(get_link_service),
 ):
     try:
+        if background:
+            link = await link_service.get_user_link(
+                db, str(base_link.original_link), current_user.id
+            )
+            background_tasks.add_task(
+                link_service.purge_link,
+                async_session_factory,
+                link.id,
+                link.short_code,
+            )
+            return Response(status_code=status.HTTP_202_ACCEPTED)
         await link_service.delete_link(
             db, str(base_link.original_link), current_user.id
         )
@@ -1,6 +1,11 @@
 from fastapi import APIRouter, status
 from fastapi.responses import JSONResponse
 from datetime import datetime, timezone
+from src.api.dependencies import engine, redirect_engine
+from src.db import pool_metrics
+from src.services.click_buffer import click_buffer
+from src.services.link_filter import link_filter
+from src.utils.cache import link_cache, user_cache
 from src.utils.monitoring import check_db
 
 router = APIRouter(tags=["Monitoring"])
@@ -11,18 +16,52 @@ async def liveness():
     return {"status": "alive", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 
+def pool_snapshots() -> dict:
+    return {
+        "main": pool_metrics["main"].snapshot(engine.sync_engine.pool),
+        "redirect": pool_metrics["redirect"].snapshot(redirect_engine.sync_engine.pool),
+    }
+
+
 @router.get("/health")
 async def readiness():
-    db_status = await check_db()
+    db_status = await check_db(engine)
     overall = "ok" if db_status["db_status"] == "ok" else "degraded"
     code = (
         status.HTTP_200_OK if overall == "ok" else status.HTTP_503_SERVICE_UNAVAILABLE
     )
+    buffer = click_buffer.stats()
     return JSONResponse(
         status_code=code,
         content={
             "status": overall,
-            "details": db_status,
+            "details": {
+                **db_status,
+                "pool_saturation": {
+                    name: pool["saturation"] for name, pool in pool_snapshots().items()
+                },
+                "click_buffer": {
+                    "depth": buffer["depth"],
+                    "max_size": buffer["max_size"],
+                    "dropped": buffer["dropped"],
+                },
+                "cache_hit_ratio": {
+                    "link_cache": link_cache.stats()["hit_ratio"],
+                    "user_cache": user_cache.stats()["hit_ratio"],
+                },
+            },
             "timestamp": datetime.now(timezone.utc).isoformat(),
         },
     )
+
+
+@router.get("/metrics", status_code=status.HTTP_200_OK)
+async def metrics():
+    return {
+        "pools": pool_snapshots(),
+        "link_cache": link_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "link_filter": link_filter.stats(),
+        "click_buffer": click_buffer.stats(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
@@ -2,8 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.api.dependencies import get_click_service, get_db, get_link_service
-from src.exceptions import LinkNotFoundException
+from src.api.dependencies import (
+    get_click_service,
+    get_link_service,
+    get_redirect_db,
+)
+from src.exceptions import LinkExpiredException, LinkNotFoundException
 from src.services.click import ClickService
 from src.services.link import LinkService
 from src.config import get_settings
@@ -16,7 +20,7 @@ router = APIRouter(tags=["Redirect"])
 async def redirect_link(
     short_code: str,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_redirect_db),
     link_service: LinkService = Depends(get_link_service),
     click_service: ClickService = Depends(get_click_service),
 ):
@@ -24,22 +28,16 @@ async def redirect_link(
         link = await link_service.get_by_short_code_public(db, short_code)
     except LinkNotFoundException as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except LinkExpiredException as e:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(e))
 
     if settings.enable_tracking:
-        await click_service.register_click(
+        await click_service.register_request_click(
             db,
             link_id=link.id,
-            ip_address=(
-                request.headers.get("X-Forwarded-For", request.client.host)
-                if request.client and settings.log_ip_address
-                else None
-            ),
-            user_agent=(
-                request.headers.get("user-agent") if settings.log_user_agent else None
-            ),
-            referrer=(
-                request.headers.get("referer") if settings.log_referrer else None
-            ),
+            short_code=short_code,
+            headers=request.headers,
+            client_host=request.client.host if request.client else None,
         )
 
     return RedirectResponse(url=link.original_link)
@@ -1,5 +1,6 @@
 from functools import lru_cache
 import os
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import PostgresDsn
 
@@ -17,6 +18,9 @@ class Settings(BaseSettings):
     # prefix for shortlink redirects, e.g. URLs will look like http://host/r/<code>
     # if prefix is "" - shortlink look like http://host/<code>
     redirect_prefix: str = "r"
+    # serve redirects from a plain ASGI app mounted ahead of the FastAPI router
+    # (requires a non-empty redirect_prefix)
+    fast_redirect_enabled: bool = False
 
     # JWT
     secret_key: str
@@ -25,23 +29,138 @@ class Settings(BaseSettings):
     refresh_secret_key: str
     refresh_token_expire_days: int
 
+    # /health reuses a database check for this long
+    health_cache_ttl_seconds: float = 2.0
+
     host: str = "0.0.0.0"
     port: int = 8000
     base_url: str = "0.0.0.0"
 
     short_code_length: int
+    # "sequence": codes encoded from ids leased in blocks from a DB sequence,
+    # no existence checks; "random": random codes checked against the table
+    short_code_allocator: Literal["sequence", "random"] = "sequence"
+    # key of the sequence allocator's id -> code permutation, SECRET_KEY if
+    # unset; changing it only risks collisions with existing codes, which
+    # link creation retries
+    short_code_secret: str | None = None
+    short_code_block_size: int = 100
+
+    # POST /api/links/bulk: items and bytes accepted per request, bytes per
+    # NDJSON line, rows per INSERT
+    bulk_max_items: int = 100_000
+    bulk_max_bytes: int = 64 * 1024 * 1024
+    bulk_max_line_bytes: int = 16 * 1024
+    bulk_chunk_size: int = 1_000
+    # rows fetched per round trip by the streaming exports
+    export_chunk_size: int = 5_000
+    # clicks deleted per transaction by DELETE /api/links/delete?background=true
+    link_purge_chunk_size: int = 10_000
+
+    # clicks are partitioned by UTC month; a periodic task keeps the next
+    # click_partitions_ahead months created and, when click_retention_months
+    # is set, drops (or detaches) partitions older than that many months
+    # before the current one. Rollups and visitor sketches are kept.
+    click_partition_maintenance_interval_seconds: int = 86_400
+    click_partitions_ahead: int = 3
+    click_retention_months: int = 0
+    click_retention_action: Literal["drop", "detach"] = "drop"
+
+    # work_mem for the single-scan /api/clicks/stats query
+    stats_work_mem: str = "64MB"
+    # worker-local heavy hitters of the redirects (Space-Saving summaries of
+    # `capacity` counters): the hottest short codes over the sliding window,
+    # split in `slots` slots, and today's top referrers of the most recently
+    # clicked links. Short code slots are flushed to the database every
+    # `flush_interval_seconds` and merged across workers when queried.
+    trending_enabled: bool = True
+    trending_capacity: int = 1_000
+    trending_window_seconds: int = 3_600
+    trending_slots: int = 12
+    trending_flush_interval_seconds: int = 10
+    trending_referrer_links: int = 10_000
+    trending_referrer_capacity: int = 50
+    # serve today's top_referrers of /api/clicks/stats from the tracker; only
+    # complete when a single worker serves all redirects
+    top_referrers_fast_path: bool = False
+    # most buckets /api/clicks/period returns (a day of minutes, four years
+    # of days)
+    period_max_buckets: int = 2_000
+
+    # background sweeper moving long-expired links (and dropping their clicks)
+    # to archived_links
+    link_sweeper_enabled: bool = False
+    link_sweeper_interval_seconds: float = 3600
+    link_archive_after_days: int = 30
+    link_archive_batch_size: int = 100
 
     enable_tracking: bool = True
     log_ip_address: bool = True
     log_user_agent: bool = True
     log_referrer: bool = True
 
+    # in-process short_code -> destination cache used by redirects (per worker)
+    link_cache_size: int = 10_000
+    link_cache_ttl_seconds: int = 60
+    # worker-local cache of authenticated users; only used with the
+    # invalidation bus, which evicts changed and deleted users everywhere
+    user_cache_size: int = 10_000
+    user_cache_ttl_seconds: int = 300
+    # worker-local memo of parsed user agents (browser/os/device of new clicks)
+    user_agent_cache_size: int = 10_000
+    # worker-local user agent / referrer string -> id maps used to write clicks
+    dimension_cache_size: int = 50_000
+    # worker-local cache of /clicks/stats and /clicks/period results; ranges
+    # that include yesterday or today expire quickly, older ranges are settled
+    stats_cache_size: int = 10_000
+    stats_cache_ttl_seconds: int = 10
+    stats_cache_settled_ttl_seconds: int = 86_400
+
+    # cache invalidation between workers/containers over Postgres LISTEN/NOTIFY
+    invalidation_bus_enabled: bool = True
+    invalidation_channel: str = "shortlinks_invalidation"
+
+    # unknown short codes are rejected without a DB query when possible:
+    # malformed codes (wrong length/alphabet; disable after changing
+    # short_code_length on a live database), recently missed codes, and codes
+    # absent from the Bloom filter of existing codes
+    short_code_shape_check: bool = True
+    negative_cache_size: int = 100_000
+    negative_cache_ttl_seconds: int = 10
+    # other workers learn about new links through the invalidation bus; without
+    # the bus only enable the filter when running a single worker
+    bloom_filter_enabled: bool = False
+    bloom_filter_error_rate: float = 0.01
+    bloom_filter_rebuild_interval_seconds: int = 600
+
+    # clicks are buffered in memory and written in batches by a background task
+    click_buffer_enabled: bool = True
+    click_buffer_max_size: int = 100_000
+    click_buffer_batch_size: int = 1_000
+    click_buffer_flush_interval_seconds: float = 1.0
+    # what to do when the buffer is full: "drop_new" or "drop_oldest"
+    click_buffer_overflow_policy: Literal["drop_new", "drop_oldest"] = "drop_new"
+    click_buffer_drain_timeout_seconds: float = 10.0
+
     postgres_user: str
     postgres_password: str
     postgres_db: str
 
     database_url: PostgresDsn
 
+    # connection pool of the management API
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = False
+    # asyncpg prepared statement cache size, per connection
+    db_statement_cache_size: int = 500
+    # separate pool for redirects, so slow analytics can't starve them
+    redirect_db_pool_size: int = 10
+    redirect_db_max_overflow: int = 10
+    redirect_db_pool_timeout_seconds: float = 5.0
+
     @property
     def db_url_str(self):
         return str(self.database_url)
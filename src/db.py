@@ -1,13 +1,132 @@
+import time
+from typing import Dict
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from src.config import get_settings
 
 settings = get_settings()
 
 
-def get_engine(url: str | None = None):
+class PoolMetrics:
+    def __init__(self, capacity: int):
+        # pool_size + max_overflow
+        self.capacity = capacity
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.waits += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def snapshot(self, pool: AsyncAdaptedQueuePool | None = None) -> Dict:
+        data = {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "timeouts": self.timeouts,
+            "wait_ms_avg": (
+                round(self.wait_seconds_total / self.waits * 1000, 3)
+                if self.waits
+                else 0.0
+            ),
+            "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+        }
+        if pool is not None:
+            data.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+                capacity=self.capacity,
+                saturation=(
+                    round(pool.checkedout() / self.capacity, 4)
+                    if self.capacity
+                    else 1.0
+                ),
+            )
+        return data
+
+
+# pool name -> metrics, shared by every engine created with that name
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        metrics = pool_metrics.get(self.logging_name)
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if metrics is not None:
+                metrics.timeouts += 1
+            raise
+        finally:
+            if metrics is not None:
+                metrics.record_wait(time.perf_counter() - start)
+
+
+def get_engine(
+    url: str | None = None,
+    pool_name: str = "main",
+    pool_size: int | None = None,
+    max_overflow: int | None = None,
+    pool_timeout: float | None = None,
+):
     if url is None:
         url = settings.db_url_str
-    return create_async_engine(url, echo=False)
+
+    pool_size = settings.db_pool_size if pool_size is None else pool_size
+    max_overflow = settings.db_max_overflow if max_overflow is None else max_overflow
+    if pool_timeout is None:
+        pool_timeout = settings.db_pool_timeout_seconds
+
+    url = make_url(url)
+    if (
+        url.get_driver_name() == "asyncpg"
+        and "prepared_statement_cache_size" not in url.query
+    ):
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(settings.db_statement_cache_size)}
+        )
+
+    engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name=pool_name,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+
+    metrics = pool_metrics.setdefault(pool_name, PoolMetrics(pool_size + max_overflow))
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.checkins += 1
+
+    return engine
 
 
 def get_session_factory(engine=None):
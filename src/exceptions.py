@@ -14,6 +14,10 @@ class LinkNotFoundException(Exception):
     pass
 
 
+class LinkExpiredException(Exception):
+    pass
+
+
 class LinkDeleteException(Exception):
     pass
 
@@ -36,3 +40,11 @@ class InvalidPasswordException(Exception):
 
 class ClicksNotFoundException(Exception):
     pass
+
+
+class InvalidCursorException(Exception):
+    pass
+
+
+class InvalidPeriodException(Exception):
+    pass
@@ -1,12 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from src.api.dependencies import redirect_engine
+from src.api.fast_redirect import RedirectApp
 from src.api.router import api_router
 from src.api.redirect import router as redirect_router
 from src.api.monitoring import router as monitoring_router
 from src.config import get_settings
+from src.tasks import start_background_tasks, stop_background_tasks
 
 settings = get_settings()
 
-app = FastAPI(title=settings.app_name, debug=settings.debug)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_background_tasks()
+    yield
+    await stop_background_tasks()
+
+
+app = FastAPI(title=settings.app_name, debug=settings.debug, lifespan=lifespan)
 app.include_router(api_router, prefix="/api")
+if settings.fast_redirect_enabled and settings.redirect_prefix:
+    # mounted before the redirect router so it answers first
+    app.mount(f"/{settings.redirect_prefix}", RedirectApp(redirect_engine))
 app.include_router(redirect_router, prefix=f"/{settings.redirect_prefix}")
 app.include_router(monitoring_router, prefix="")
@@ -1,7 +1,31 @@
 from .base import Base
 from .user import User
-from .link import Link
+from .link import ArchivedLink, Link
 from .click import Click
+from .dimension import Referrer, UserAgent
 from .auth import RefreshToken
+from .rollup import (
+    BrowserRollupDaily,
+    ClickRollupDaily,
+    ClickRollupHourly,
+    ReferrerRollupDaily,
+    VisitorSketchDaily,
+)
+from .trending import TrendingSlot
 
-__all__ = ["Base", "RefreshToken", "User", "Link", "Click"]
+__all__ = [
+    "Base",
+    "RefreshToken",
+    "User",
+    "Link",
+    "ArchivedLink",
+    "Click",
+    "UserAgent",
+    "Referrer",
+    "ClickRollupHourly",
+    "ClickRollupDaily",
+    "ReferrerRollupDaily",
+    "BrowserRollupDaily",
+    "VisitorSketchDaily",
+    "TrendingSlot",
+]
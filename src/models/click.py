@@ -1,24 +1,64 @@
-from sqlalchemy import DateTime, ForeignKey
-from sqlalchemy import String
+from sqlalchemy import DateTime, ForeignKey, Index, select, text
+from sqlalchemy import SmallInteger, String
 from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import column_property
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
 from .base import Base
+from .dimension import Referrer, UserAgent
 from datetime import datetime, timezone
 
 
 class Click(Base):
     __tablename__ = "clicks"
-
-    id: Mapped[int] = mapped_column(primary_key=True)
-    link_id: Mapped[int] = mapped_column(
-        ForeignKey("links.id", ondelete="CASCADE"), index=True
+    __table_args__ = (
+        # keyset pagination of a link's clicks, newest first; the included
+        # columns let the stats over a link and date range (grouped by
+        # referrer, browser, IP or day) run as index-only scans
+        Index(
+            "ix_clicks_link_id_clicked_at_id",
+            "link_id",
+            text("clicked_at DESC"),
+            text("id DESC"),
+            postgresql_include=[
+                "referrer_id",
+                "user_agent_id",
+                "browser",
+                "ip_address",
+            ],
+        ),
+        # time-range scans across all links
+        Index("ix_clicks_clicked_at_brin", "clicked_at", postgresql_using="brin"),
+        # one partition per UTC month, clicks_pYYYYMM, plus clicks_default;
+        # see ClickPartitionRepository
+        {"postgresql_partition_by": "RANGE (clicked_at)"},
     )
+
+    # the partition key has to be part of the primary key
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     clicked_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+        DateTime(timezone=True),
+        primary_key=True,
+        default=lambda: datetime.now(timezone.utc),
     )
+    link_id: Mapped[int] = mapped_column(ForeignKey("links.id", ondelete="CASCADE"))
     ip_address: Mapped[str] = mapped_column(String(45), nullable=True)
-    user_agent: Mapped[str] = mapped_column(String(255), nullable=True)
-    referrer: Mapped[str] = mapped_column(String(255), nullable=True)
+    user_agent_id: Mapped[int] = mapped_column(
+        ForeignKey("user_agents.id"), nullable=True
+    )
+    referrer_id: Mapped[int] = mapped_column(ForeignKey("referrers.id"), nullable=True)
+    # parsed from user_agent when the click is recorded; indexes into
+    # src.utils.user_agent.BROWSERS / OPERATING_SYSTEMS / DEVICES
+    browser: Mapped[int] = mapped_column(SmallInteger, nullable=True)
+    os: Mapped[int] = mapped_column(SmallInteger, nullable=True)
+    device: Mapped[int] = mapped_column(SmallInteger, nullable=True)
+
+    # read-only; written as ids by ClickRepository.insert_clicks
+    user_agent: Mapped[str | None] = column_property(
+        select(UserAgent.value).where(UserAgent.id == user_agent_id).scalar_subquery()
+    )
+    referrer: Mapped[str | None] = column_property(
+        select(Referrer.value).where(Referrer.id == referrer_id).scalar_subquery()
+    )
 
     link: Mapped["Link"] = relationship(back_populates="clicks")  # type: ignore
@@ -0,0 +1,20 @@
+from sqlalchemy import String
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+
+# Interned strings referenced by clicks. Rows are never updated or deleted,
+# so their ids can be cached by every worker indefinitely.
+
+
+class UserAgent(Base):
+    __tablename__ = "user_agents"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(String(255), unique=True)
+
+
+class Referrer(Base):
+    __tablename__ = "referrers"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(String(255), unique=True)
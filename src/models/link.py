@@ -1,38 +1,96 @@
 from typing import List
 import uuid
-from sqlalchemy import DateTime, ForeignKey
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    ForeignKey,
+    Index,
+    LargeBinary,
+    Sequence,
+    text,
+)
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
 from .base import Base
 from datetime import datetime, timezone
-from src.config import get_settings
+from src.utils.link_shortener import build_short_url, hash_url
 
-settings = get_settings()
+# ids leased in blocks by the sequence short code allocator
+short_code_seq = Sequence("short_code_seq", metadata=Base.metadata)
+
+
+def _default_url_hash(context) -> bytes:
+    return hash_url(context.get_current_parameters()["original_link"])
 
 
 class Link(Base):
     __tablename__ = "links"
+    __table_args__ = (
+        Index("ix_links_user_id_url_hash", "user_id", "url_hash", unique=True),
+        # keyset pagination of a user's links, newest first
+        Index(
+            "ix_links_user_id_created_at_id",
+            "user_id",
+            text("created_at DESC"),
+            text("id DESC"),
+        ),
+        # expired links for the archive sweeper
+        Index(
+            "ix_links_expires_at",
+            "expires_at",
+            postgresql_where=text("expires_at IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     original_link: Mapped[str] = mapped_column(nullable=False)
+    # dedup key; NULL only for duplicate rows that predate the unique index
+    url_hash: Mapped[bytes | None] = mapped_column(
+        LargeBinary(32), default=_default_url_hash
+    )
     short_code: Mapped[str] = mapped_column(nullable=False, unique=True, index=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    max_clicks: Mapped[int | None]
+    # clicks so far; claimed one at a time for capped links, added in batches
+    # by the click writer for the rest
+    click_count: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
 
     user_id: Mapped[uuid.UUID] = mapped_column(
-        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
 
     # Many-to-one: Links -> User
     user: Mapped["User"] = relationship(back_populates="links")  # type: ignore
     # One-to-many: Link -> Clicks
     clicks: Mapped[List["Click"]] = relationship(  # type: ignore
-        back_populates="link", cascade="all, delete-orphan"
+        back_populates="link", cascade="all, delete-orphan", passive_deletes=True
     )
 
     @property
     def short_url(self) -> str:
-        prefix_part = f"/{settings.redirect_prefix}" if settings.redirect_prefix else ""
-        return f"{settings.base_url}{prefix_part}/{self.short_code}"
+        return build_short_url(self.short_code)
+
+
+class ArchivedLink(Base):
+    """Expired links moved out of `links` by the archive sweeper; their clicks
+    are gone, `click_count` keeps the total"""
+
+    __tablename__ = "archived_links"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    original_link: Mapped[str] = mapped_column(nullable=False)
+    short_code: Mapped[str] = mapped_column(nullable=False)
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    max_clicks: Mapped[int | None]
+    click_count: Mapped[int] = mapped_column(BigInteger)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=text("now()")
+    )
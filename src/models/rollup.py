@@ -0,0 +1,73 @@
+from datetime import date, datetime
+from sqlalchemy import (
+    BigInteger,
+    Date,
+    DateTime,
+    ForeignKey,
+    LargeBinary,
+    SmallInteger,
+    String,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+
+# Click counts pre-aggregated per link and time bucket, kept up to date by
+# ClickRepository.insert_clicks in the same transaction as the clicks
+
+
+class ClickRollupHourly(Base):
+    __tablename__ = "click_rollups_hourly"
+
+    link_id: Mapped[int] = mapped_column(
+        ForeignKey("links.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    clicks: Mapped[int] = mapped_column(BigInteger)
+
+
+class ClickRollupDaily(Base):
+    __tablename__ = "click_rollups_daily"
+
+    link_id: Mapped[int] = mapped_column(
+        ForeignKey("links.id", ondelete="CASCADE"), primary_key=True
+    )
+    # UTC day
+    bucket: Mapped[date] = mapped_column(Date, primary_key=True)
+    clicks: Mapped[int] = mapped_column(BigInteger)
+
+
+class ReferrerRollupDaily(Base):
+    __tablename__ = "referrer_rollups_daily"
+
+    link_id: Mapped[int] = mapped_column(
+        ForeignKey("links.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket: Mapped[date] = mapped_column(Date, primary_key=True)
+    referrer: Mapped[str] = mapped_column(String(255), primary_key=True)
+    clicks: Mapped[int] = mapped_column(BigInteger)
+
+
+class BrowserRollupDaily(Base):
+    __tablename__ = "browser_rollups_daily"
+
+    link_id: Mapped[int] = mapped_column(
+        ForeignKey("links.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket: Mapped[date] = mapped_column(Date, primary_key=True)
+    # index into src.utils.user_agent.BROWSERS
+    browser: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    clicks: Mapped[int] = mapped_column(BigInteger)
+
+
+class VisitorSketchDaily(Base):
+    """HyperLogLog sketches (src.utils.hll) of the day's distinct visitors and
+    distinct IP addresses"""
+
+    __tablename__ = "visitor_sketches_daily"
+
+    link_id: Mapped[int] = mapped_column(
+        ForeignKey("links.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket: Mapped[date] = mapped_column(Date, primary_key=True)
+    registers: Mapped[bytes] = mapped_column(LargeBinary)
+    ip_registers: Mapped[bytes] = mapped_column(LargeBinary)
@@ -0,0 +1,24 @@
+import uuid
+from datetime import datetime
+from typing import Any, List
+from sqlalchemy import DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+
+
+class TrendingSlot(Base):
+    """A worker's Space-Saving summary (src.utils.heavy_hitters) of the short
+    codes it redirected during one trending slot, flushed periodically so any
+    worker can merge them all"""
+
+    __tablename__ = "trending_slots"
+
+    # random per process
+    worker_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True
+    )
+    capacity: Mapped[int]
+    # [short_code, count, error] counters
+    items: Mapped[List[Any]] = mapped_column(JSONB)
@@ -18,9 +18,11 @@ class User(Base):
     is_superuser: Mapped[bool] = mapped_column(default=False)
 
     # One-to-many: User -> Links
+    # passive_deletes: the FKs cascade in the database, so deleting a user is
+    # one DELETE instead of loading and deleting every link and click
     links: Mapped[List["Link"]] = relationship(  # type: ignore
-        back_populates="user", cascade="all, delete-orphan"
+        back_populates="user", cascade="all, delete-orphan", passive_deletes=True
     )
     refresh_tokens: Mapped[list["RefreshToken"]] = relationship(  # type: ignore
-        back_populates="user", cascade="all, delete-orphan"
+        back_populates="user", cascade="all, delete-orphan", passive_deletes=True
     )
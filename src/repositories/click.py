@@ -1,34 +1,273 @@
 import datetime
 import uuid
-from typing import List, Optional
-from sqlalchemy import distinct, func, select
+from collections import Counter
+from typing import AsyncIterator, Iterable, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import (
+    BigInteger,
+    Integer,
+    String,
+    and_,
+    cast,
+    column,
+    distinct,
+    func,
+    insert,
+    or_,
+    select,
+    text,
+    true,
+    tuple_,
+    update,
+    values,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.click import Click
+from src.models.dimension import Referrer, UserAgent
 from src.models.link import Link
 from src.repositories.base import BaseRepository
+from src.repositories.dimension import DimensionRepository
+from src.repositories.rollup import RollupRepository
+from src.utils.cache import referrer_ids, user_agent_ids
+
+
+class SummaryRow(NamedTuple):
+    # "total", "referrer" or "browser": which grouping set the row is from
+    kind: str
+    value: str | None
+    clicks: int
+    today_clicks: int
+    unique_ips: int
+    unique_referrers: int
 
 
 class ClickRepository(BaseRepository):
     model = Click
 
+    def __init__(self, rollup_repository: RollupRepository | None = None):
+        self._rollup_repository = rollup_repository or RollupRepository()
+        self._user_agents = DimensionRepository(UserAgent, user_agent_ids)
+        self._referrers = DimensionRepository(Referrer, referrer_ids)
+
+    async def insert_clicks(self, db: AsyncSession, rows: List[dict]) -> None:
+        """The single write path for clicks: inserts them and updates the
+        per-link counters and rollups in the same transaction.
+
+        Rows carry `user_agent` and `referrer` as strings; they are stored as
+        ids into the user_agents and referrers tables.
+        """
+        agents = await self._user_agents.get_ids(
+            db, (row["user_agent"] for row in rows if row.get("user_agent"))
+        )
+        referrers = await self._referrers.get_ids(
+            db, (row["referrer"] for row in rows if row.get("referrer"))
+        )
+        clicks = [
+            {
+                **{k: v for k, v in row.items() if k not in ("user_agent", "referrer")},
+                "user_agent_id": agents.get(row.get("user_agent")),
+                "referrer_id": referrers.get(row.get("referrer")),
+            }
+            for row in rows
+        ]
+        # executemany is batched by the asyncpg dialect into multi-row INSERTs
+        await db.execute(insert(self.model), clicks)
+        await self._add_click_counts(db, Counter(row["link_id"] for row in rows))
+        await self._rollup_repository.add_clicks(db, rows)
+        await db.commit()
+        self._user_agents.remember(agents)
+        self._referrers.remember(referrers)
+
+    async def _add_click_counts(self, db: AsyncSession, counts: Counter) -> None:
+        """One UPDATE per batch for links.click_count; capped links are counted
+        on redirect by LinkRepository.claim_click instead"""
+        # sorted so concurrent writers lock rows in the same order
+        counts_table = values(
+            column("link_id", Integer), column("n", BigInteger), name="counts"
+        ).data(sorted(counts.items()))
+        await db.execute(
+            update(Link)
+            .where(Link.id == counts_table.c.link_id, Link.max_clicks.is_(None))
+            .values(click_count=Link.click_count + counts_table.c.n)
+        )
+
     async def get_clicks_list(
         self,
         db: AsyncSession,
         user_id: uuid.UUID,
         link_id: int,
-        skip: int,
         limit: int,
+        after: Tuple[datetime.datetime, int] | None = None,
+        skip: int = 0,
     ) -> list[Click]:
+        """Newest first; `after` is the (clicked_at, id) of the last click of the
+        previous page and is served by ix_clicks_link_id_clicked_at_id"""
         stmt = (
             select(self.model)
             .join(self.model.link)
             .where(Link.user_id == user_id, Link.id == link_id)
-            .offset(skip)
+            .order_by(Click.clicked_at.desc(), Click.id.desc())
             .limit(limit)
         )
+        if after is not None:
+            stmt = stmt.where(tuple_(Click.clicked_at, Click.id) < after)
+        if skip:
+            stmt = stmt.offset(skip)
         result = await db.execute(stmt)
         return result.scalars().all()
 
+    async def get_existing_link_ids(
+        self, db: AsyncSession, link_ids: Iterable[int]
+    ) -> Set[int]:
+        result = await db.execute(select(Link.id).where(Link.id.in_(list(link_ids))))
+        return set(result.scalars())
+
+    async def user_owns_link(
+        self, db: AsyncSession, user_id: uuid.UUID, link_id: int
+    ) -> bool:
+        stmt = select(Link.id).where(Link.id == link_id, Link.user_id == user_id)
+        return (await db.scalar(stmt)) is not None
+
+    async def iter_link_clicks(
+        self,
+        db: AsyncSession,
+        link_id: int,
+        clicked_from: datetime.datetime | None = None,
+        clicked_to: datetime.datetime | None = None,
+        chunk_size: int = 5_000,
+    ) -> AsyncIterator[Tuple]:
+        """(id, link_id, clicked_at, ip_address, user_agent, referrer) rows from
+        a server-side cursor, oldest first"""
+        stmt = (
+            select(
+                Click.id,
+                Click.link_id,
+                Click.clicked_at,
+                Click.ip_address,
+                UserAgent.value,
+                Referrer.value,
+            )
+            .outerjoin(UserAgent, UserAgent.id == Click.user_agent_id)
+            .outerjoin(Referrer, Referrer.id == Click.referrer_id)
+            .where(Click.link_id == link_id)
+            .order_by(Click.clicked_at, Click.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        if clicked_from is not None:
+            stmt = stmt.where(Click.clicked_at >= clicked_from)
+        if clicked_to is not None:
+            stmt = stmt.where(Click.clicked_at < clicked_to)
+        async for row in await db.stream(stmt):
+            yield tuple(row)
+
+    async def get_summary_rows(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        link_id: int,
+        clicked_from: datetime.datetime | None,
+        clicked_to: datetime.datetime | None,
+        today_from: datetime.datetime,
+        top_referrers: int = 5,
+        work_mem: str | None = None,
+    ) -> List[SummaryRow]:
+        """Everything `/stats/{link_id}` needs from one scan of the link's clicks.
+
+        GROUPING SETS ((), (referrer), (browser), (ip_address)) are hashed
+        side by side in a single pass; distinct referrers and IPs are counted
+        from their groups rather than with COUNT(DISTINCT), which would force a
+        sort per set. Only the totals row, the top referrers and the browser
+        groups are returned. Clicks from today are always scanned for
+        `today_clicks`; everything else counts only [clicked_from, clicked_to].
+        """
+        in_range = and_(
+            Click.clicked_at >= clicked_from if clicked_from else true(),
+            Click.clicked_at <= clicked_to if clicked_to else true(),
+        )
+        is_today = Click.clicked_at >= today_from
+        groups = (
+            select(
+                func.grouping(Click.referrer_id, Click.browser, Click.ip_address).label(
+                    "grouping"
+                ),
+                Click.referrer_id,
+                func.coalesce(
+                    cast(Click.referrer_id, String),
+                    cast(Click.browser, String),
+                    Click.ip_address,
+                ).label("value"),
+                func.count().filter(in_range).label("clicks"),
+                func.count().filter(is_today).label("today_clicks"),
+            )
+            .where(
+                Click.link_id == link_id,
+                Click.link_id.in_(
+                    select(Link.id).where(Link.id == link_id, Link.user_id == user_id)
+                ),
+                or_(in_range, is_today),
+            )
+            .group_by(
+                func.grouping_sets(
+                    text("()"),
+                    tuple_(Click.referrer_id),
+                    tuple_(Click.browser),
+                    tuple_(Click.ip_address),
+                )
+            )
+            .cte("groups")
+        )
+        # grouping() bit per column left out of the set: referrer 4, browser 2, ip 1
+        kinds = {7: "total", 3: "referrer", 5: "browser", 6: "ip_address"}
+        counted = and_(groups.c.clicks > 0, groups.c.value.is_not(None))
+        ranked = select(
+            groups,
+            func.count()
+            .filter(and_(groups.c.grouping == 6, counted))
+            .over()
+            .label("unique_ips"),
+            func.count()
+            .filter(and_(groups.c.grouping == 3, counted))
+            .over()
+            .label("unique_referrers"),
+            func.row_number()
+            .over(
+                partition_by=groups.c.grouping,
+                order_by=(
+                    groups.c.value.is_(None),
+                    groups.c.clicks.desc(),
+                    groups.c.value,
+                ),
+            )
+            .label("rank"),
+        ).subquery()
+        # only the few surviving referrer groups are looked up by id
+        stmt = (
+            select(
+                ranked.c.grouping,
+                func.coalesce(Referrer.value, ranked.c.value),
+                ranked.c.clicks,
+                ranked.c.today_clicks,
+                ranked.c.unique_ips,
+                ranked.c.unique_referrers,
+            )
+            .outerjoin(Referrer, Referrer.id == ranked.c.referrer_id)
+            .where(
+                or_(
+                    ranked.c.grouping == 7,
+                    and_(ranked.c.clicks > 0, ranked.c.value.is_not(None))
+                    & or_(
+                        ranked.c.grouping == 5,
+                        and_(ranked.c.grouping == 3, ranked.c.rank <= top_referrers),
+                    ),
+                )
+            )
+        )
+        if work_mem:
+            # grouping sets only stay hashed (one pass, no sorts) while the
+            # hash tables fit in work_mem; SET LOCAL ends with the transaction
+            await db.execute(select(func.set_config("work_mem", work_mem, True)))
+        rows = (await db.execute(stmt)).all()
+        return [SummaryRow(kinds[grouping], *rest) for grouping, *rest in rows]
+
     async def aggregate_records(
         self,
         db: AsyncSession,
@@ -0,0 +1,77 @@
+import datetime
+import re
+from typing import List
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+_PARTITION_NAME = re.compile(r"^clicks_p(\d{4})(\d{2})$")
+# pg_advisory lock key of the maintenance run ("clicks" in ASCII)
+_MAINTENANCE_LOCK = 0x636C69636B73
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    year, index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return datetime.date(year, index + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"clicks_p{month:%Y%m}"
+
+
+class ClickPartitionRepository:
+    """Monthly range partitions of `clicks`, named clicks_pYYYYMM and covering
+    [first of the month, first of the next month) in UTC. Rows outside every
+    partition land in clicks_default, so keep partitions created ahead."""
+
+    async def try_lock(self, db: AsyncSession) -> bool:
+        """Whether this transaction got to maintain the partitions; the lock
+        is released when it ends"""
+        return await db.scalar(
+            text("SELECT pg_try_advisory_xact_lock(:key)"),
+            {"key": _MAINTENANCE_LOCK},
+        )
+
+    async def list_months(self, db: AsyncSession) -> List[datetime.date]:
+        result = await db.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'clicks'::regclass"
+            )
+        )
+        months = []
+        for name in result.scalars():
+            match = _PARTITION_NAME.match(name)
+            if match:
+                months.append(datetime.date(int(match[1]), int(match[2]), 1))
+        return sorted(months)
+
+    async def create(self, db: AsyncSession, month: datetime.date) -> None:
+        await db.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+                f"PARTITION OF clicks FOR VALUES "
+                f"FROM ('{month:%Y-%m-%d} 00:00+00') "
+                f"TO ('{add_months(month, 1):%Y-%m-%d} 00:00+00')"
+            )
+        )
+
+    async def drop(self, db: AsyncSession, month: datetime.date) -> None:
+        await db.execute(text(f"DROP TABLE IF EXISTS {partition_name(month)}"))
+
+    async def detach(self, db: AsyncSession, month: datetime.date) -> bool:
+        """Leaves the month's clicks in a standalone table, e.g. for archiving;
+        False if it isn't attached (anymore)"""
+        attached = await db.scalar(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_inherits "
+                "WHERE inhrelid = to_regclass(:name) "
+                "AND inhparent = 'clicks'::regclass)"
+            ),
+            {"name": partition_name(month)},
+        )
+        if attached:
+            await db.execute(
+                text(f"ALTER TABLE clicks DETACH PARTITION {partition_name(month)}")
+            )
+        return attached
@@ -0,0 +1,56 @@
+from typing import Dict, Iterable, List
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.utils.cache import LRUTTLCache
+
+
+class DimensionRepository:
+    """Maps strings to the ids of their rows in an interned-string table
+    (`id`, unique `value`), creating rows for strings not seen before"""
+
+    def __init__(self, model, cache: LRUTTLCache):
+        self.model = model
+        self._cache = cache
+
+    async def get_ids(self, db: AsyncSession, values: Iterable[str]) -> Dict[str, int]:
+        """Cached strings cost nothing; the rest take one SELECT, plus an
+        INSERT for new ones. New rows are only visible to other transactions
+        once the caller commits, so pass the result to `remember` after that."""
+        ids: Dict[str, int] = {}
+        missing: List[str] = []
+        for value in set(values):
+            value_id = self._cache.get(value)
+            if value_id is None:
+                missing.append(value)
+            else:
+                ids[value] = value_id
+        if not missing:
+            return ids
+
+        ids.update(await self._select(db, missing))
+        new = sorted(value for value in missing if value not in ids)
+        if new:
+            # sorted so concurrent writers lock the same values in the same order
+            stmt = (
+                insert(self.model)
+                .values([{"value": value} for value in new])
+                .on_conflict_do_nothing(index_elements=["value"])
+                .returning(self.model.value, self.model.id)
+            )
+            ids.update((await db.execute(stmt)).tuples().all())
+            # inserted meanwhile by another transaction, which has committed
+            raced = [value for value in new if value not in ids]
+            if raced:
+                ids.update(await self._select(db, raced))
+        return ids
+
+    async def _select(self, db: AsyncSession, values: List[str]) -> Dict[str, int]:
+        stmt = select(self.model.value, self.model.id).where(
+            self.model.value.in_(values)
+        )
+        return dict((await db.execute(stmt)).tuples().all())
+
+    def remember(self, ids: Dict[str, int]) -> None:
+        for value, value_id in ids.items():
+            self._cache.set(value, value_id)
@@ -1,25 +1,233 @@
-from typing import List
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, NamedTuple, Set, Tuple
 from uuid import UUID
+from sqlalchemy import delete, func, insert as sql_insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.models.link import Link
+from src.models.click import Click
+from src.models.link import ArchivedLink, Link, short_code_seq
 from src.repositories.base import BaseRepository
+from src.utils.link_shortener import hash_url
+
+
+class LinkTarget(NamedTuple):
+    id: int
+    original_link: str
+    user_id: UUID
+    expires_at: datetime | None = None
+    max_clicks: int | None = None
 
 
 class LinkRepository(BaseRepository):
     model = Link
 
+    async def get_redirect_target(
+        self, db: AsyncSession, short_code: str
+    ) -> LinkTarget | None:
+        stmt = select(
+            Link.id,
+            Link.original_link,
+            Link.user_id,
+            Link.expires_at,
+            Link.max_clicks,
+        ).where(Link.short_code == short_code)
+        row = (await db.execute(stmt)).first()
+        return LinkTarget(*row) if row else None
+
+    async def claim_click(self, db: AsyncSession, link_id: int) -> bool:
+        """Count one click against a capped link; False once the cap is hit"""
+        stmt = (
+            update(Link)
+            .where(Link.id == link_id, Link.click_count < Link.max_clicks)
+            .values(click_count=Link.click_count + 1)
+            .returning(Link.id)
+        )
+        claimed = (await db.execute(stmt)).first() is not None
+        await db.commit()
+        return claimed
+
+    async def get_expired_ids(
+        self, db: AsyncSession, expired_before: datetime, limit: int, after: int = 0
+    ) -> List[int]:
+        """Ids of up to `limit` links that expired before `expired_before`,
+        ascending from `after`"""
+        stmt = (
+            select(Link.id)
+            .where(Link.expires_at < expired_before, Link.id > after)
+            .order_by(Link.id)
+            .limit(limit)
+        )
+        return list((await db.scalars(stmt)).all())
+
+    async def archive_expired(
+        self, db: AsyncSession, link_ids: List[int], expired_before: datetime
+    ) -> List[str]:
+        """Move those of `link_ids` that expired before `expired_before` to
+        archived_links in one statement, skipping links another sweeper is
+        moving; returns their short codes. Delete their clicks first: the
+        DELETE cascades to them. Not committed."""
+        expired = (
+            select(Link.id)
+            .where(Link.id.in_(link_ids), Link.expires_at < expired_before)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        columns = [
+            "id",
+            "original_link",
+            "short_code",
+            "user_id",
+            "created_at",
+            "expires_at",
+            "max_clicks",
+            "click_count",
+        ]
+        moved = (
+            delete(Link)
+            .where(Link.id.in_(expired))
+            .returning(*(getattr(Link, name) for name in columns))
+            .cte("moved")
+        )
+        stmt = (
+            sql_insert(ArchivedLink)
+            .from_select(columns, select(*(moved.c[name] for name in columns)))
+            .returning(ArchivedLink.short_code)
+        )
+        return list((await db.scalars(stmt)).all())
+
+    async def existing_short_codes(
+        self, db: AsyncSession, short_codes: Iterable[str]
+    ) -> Set[str]:
+        stmt = select(Link.short_code).where(Link.short_code.in_(list(short_codes)))
+        return set((await db.scalars(stmt)).all())
+
+    async def lease_code_ids(self, db: AsyncSession, count: int) -> List[int]:
+        stmt = select(short_code_seq.next_value()).select_from(
+            func.generate_series(1, count)
+        )
+        return list((await db.scalars(stmt)).all())
+
+    async def count_links(self, db: AsyncSession) -> int:
+        return await db.scalar(select(func.count(Link.id)))
+
+    async def iter_short_codes(
+        self, db: AsyncSession, chunk_size: int = 10_000
+    ) -> AsyncIterator[str]:
+        stmt = select(Link.short_code).execution_options(yield_per=chunk_size)
+        async for short_code in await db.stream_scalars(stmt):
+            yield short_code
+
+    async def iter_user_links(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+        chunk_size: int = 5_000,
+    ) -> AsyncIterator[Tuple]:
+        """(id, original_link, short_code, created_at) rows from a server-side
+        cursor, oldest first"""
+        stmt = (
+            select(Link.id, Link.original_link, Link.short_code, Link.created_at)
+            .where(Link.user_id == user_id)
+            .order_by(Link.created_at, Link.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        if created_from is not None:
+            stmt = stmt.where(Link.created_at >= created_from)
+        if created_to is not None:
+            stmt = stmt.where(Link.created_at < created_to)
+        async for row in await db.stream(stmt):
+            yield tuple(row)
+
     async def get_by_original_link(
         self, db: AsyncSession, original_link: str, user_id: UUID
     ) -> Link | None:
         return await self.get_one_by_filters(
-            db, original_link=original_link, user_id=user_id
+            db, url_hash=hash_url(original_link), user_id=user_id
+        )
+
+    async def get_codes_by_original_links(
+        self, db: AsyncSession, original_links: Iterable[str], user_id: UUID
+    ) -> dict[str, str]:
+        stmt = select(Link.original_link, Link.short_code).where(
+            Link.user_id == user_id,
+            Link.url_hash.in_([hash_url(link) for link in original_links]),
+        )
+        return dict((await db.execute(stmt)).all())
+
+    async def insert_links(self, db: AsyncSession, rows: List[dict]) -> dict[str, str]:
+        """Multi-row INSERT skipping rows that hit a unique constraint; returns
+        original_link -> short_code for the rows actually inserted"""
+        # column defaults that read other parameters don't see multi-VALUES rows
+        rows = [{**row, "url_hash": hash_url(row["original_link"])} for row in rows]
+        stmt = (
+            insert(Link)
+            .values(rows)
+            .on_conflict_do_nothing()
+            .returning(Link.original_link, Link.short_code)
         )
+        return dict((await db.execute(stmt)).all())
+
+    async def delete_user_link(
+        self, db: AsyncSession, original_link: str, user_id: UUID
+    ) -> Tuple[int, str] | None:
+        """Single DELETE, clicks go with it through ON DELETE CASCADE; returns
+        the deleted link's id and short code. Not committed."""
+        stmt = (
+            delete(Link)
+            .where(Link.user_id == user_id, Link.url_hash == hash_url(original_link))
+            .returning(Link.id, Link.short_code)
+        )
+        return (await db.execute(stmt)).one_or_none()
+
+    async def delete_clicks_chunk(
+        self, db: AsyncSession, link_id: int, chunk_size: int
+    ) -> int:
+        """Delete the link's `chunk_size` oldest clicks. Matched on the full
+        primary key and bounded by the chunk's time range, so partitions the
+        chunk doesn't reach are pruned at run time."""
+        chunk = (
+            select(Click.id, Click.clicked_at)
+            .where(Click.link_id == link_id)
+            .order_by(Click.clicked_at)
+            .limit(chunk_size)
+            .cte("chunk")
+        )
+        stmt = delete(Click).where(
+            Click.link_id == link_id,
+            tuple_(Click.id, Click.clicked_at).in_(
+                select(chunk.c.id, chunk.c.clicked_at)
+            ),
+            Click.clicked_at >= select(func.min(chunk.c.clicked_at)).scalar_subquery(),
+            Click.clicked_at <= select(func.max(chunk.c.clicked_at)).scalar_subquery(),
+        )
+        result = await db.execute(stmt)
+        await db.commit()
+        return result.rowcount
+
+    async def delete_by_id(self, db: AsyncSession, link_id: int) -> None:
+        await db.execute(delete(Link).where(Link.id == link_id))
+        await db.commit()
 
     async def get_user_links_list(
         self,
         db: AsyncSession,
         user_id: UUID,
-        skip: int,
         limit: int,
+        after: Tuple[datetime, int] | None = None,
+        skip: int = 0,
     ) -> List[Link]:
-        return await self.get_list_objs(db, skip=skip, limit=limit, user_id=user_id)
+        """Newest first; `after` is the (created_at, id) of the last link of the
+        previous page and is served by ix_links_user_id_created_at_id"""
+        stmt = (
+            select(Link)
+            .where(Link.user_id == user_id)
+            .order_by(Link.created_at.desc(), Link.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            stmt = stmt.where(tuple_(Link.created_at, Link.id) < after)
+        if skip:
+            stmt = stmt.offset(skip)
+        return list((await db.scalars(stmt)).all())
@@ -0,0 +1,533 @@
+import datetime
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Literal, NamedTuple, Set, Tuple
+from sqlalchemy import (
+    DateTime,
+    bindparam,
+    String,
+    cast,
+    distinct,
+    func,
+    literal,
+    null,
+    select,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import INTERVAL, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models.click import Click
+from src.models.link import Link
+from src.models.rollup import (
+    BrowserRollupDaily,
+    ClickRollupDaily,
+    ClickRollupHourly,
+    ReferrerRollupDaily,
+    VisitorSketchDaily,
+)
+from src.utils.hll import HyperLogLog, visitor_hash
+
+SketchKey = Tuple[int, datetime.date]
+
+
+class RollupRow(NamedTuple):
+    # "total", "today", "unique_referrers", "unique_ips", "unique_visitors",
+    # "referrer" or "browser"
+    kind: str
+    value: str | None
+    clicks: int
+
+
+class PageLink(NamedTuple):
+    id: int
+    short_code: str
+    created_at: datetime.datetime
+
+
+class LinkRollupRow(NamedTuple):
+    # "total", "today" or "referrer" for the stats, "day" (value: ISO date)
+    # for the period clicks
+    kind: str
+    link_id: int
+    value: str | None
+    clicks: int
+
+
+def _hour(moment: datetime.datetime) -> datetime.datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class RollupRepository:
+    async def add_clicks(self, db: AsyncSession, rows: List[dict]) -> None:
+        """Fold a batch of new click rows into the rollups, one upsert per table.
+        Not committed: runs in the transaction that inserts the clicks."""
+        hourly = Counter((row["link_id"], _hour(row["clicked_at"])) for row in rows)
+        daily = Counter((row["link_id"], row["clicked_at"].date()) for row in rows)
+        referrers = Counter(
+            (row["link_id"], row["clicked_at"].date(), row["referrer"])
+            for row in rows
+            if row.get("referrer")
+        )
+        browsers = Counter(
+            (row["link_id"], row["clicked_at"].date(), row["browser"])
+            for row in rows
+            if row.get("browser") is not None
+        )
+
+        await self._upsert(db, ClickRollupHourly, ("link_id", "bucket"), hourly)
+        await self._upsert(db, ClickRollupDaily, ("link_id", "bucket"), daily)
+        await self._upsert(
+            db, ReferrerRollupDaily, ("link_id", "bucket", "referrer"), referrers
+        )
+        await self._upsert(
+            db, BrowserRollupDaily, ("link_id", "bucket", "browser"), browsers
+        )
+        await self._add_visitors(db, rows)
+
+    async def _upsert(
+        self, db: AsyncSession, model, keys: Tuple[str, ...], counts: Counter
+    ) -> None:
+        if not counts:
+            return
+        # sorted so concurrent writers lock rows in the same order
+        rows = [
+            {**dict(zip(keys, key)), "clicks": clicks}
+            for key, clicks in sorted(counts.items())
+        ]
+        stmt = insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={"clicks": model.clicks + stmt.excluded.clicks},
+        )
+        await db.execute(stmt)
+
+    async def _add_visitors(self, db: AsyncSession, rows: List[dict]) -> None:
+        """Merge the batch's visitors and IP addresses into the daily
+        HyperLogLog sketches. Existing sketches are locked, merged here and
+        written back only when a register went up, which stops happening once
+        a day's sketches saturate with repeat visitors."""
+        visitors: Dict[SketchKey, Set[int]] = defaultdict(set)
+        ips: Dict[SketchKey, Set[int]] = defaultdict(set)
+        for row in rows:
+            ip_address, user_agent = row.get("ip_address"), row.get("user_agent")
+            if ip_address or user_agent:
+                key = (row["link_id"], row["clicked_at"].date())
+                visitors[key].add(visitor_hash(ip_address, user_agent))
+                if ip_address:
+                    ips[key].add(visitor_hash(ip_address, None))
+        if not visitors:
+            return
+
+        sketches = await self._lock_sketches(db, sorted(visitors))
+        new = sorted(key for key in visitors if key not in sketches)
+        if new:
+            created = []
+            for key in new:
+                sketch, ip_sketch = HyperLogLog(), HyperLogLog()
+                sketch.update(visitors[key])
+                ip_sketch.update(ips[key])
+                created.append(
+                    {
+                        "link_id": key[0],
+                        "bucket": key[1],
+                        "registers": sketch.to_bytes(),
+                        "ip_registers": ip_sketch.to_bytes(),
+                    }
+                )
+            stmt = (
+                insert(VisitorSketchDaily)
+                .values(created)
+                .on_conflict_do_nothing()
+                .returning(VisitorSketchDaily.link_id, VisitorSketchDaily.bucket)
+            )
+            inserted = set((await db.execute(stmt)).tuples().all())
+            # created meanwhile by another writer: merge into theirs instead
+            raced = [key for key in new if key not in inserted]
+            if raced:
+                sketches.update(await self._lock_sketches(db, raced))
+
+        changed = []
+        for key, (sketch, ip_sketch) in sketches.items():
+            # both, without short-circuiting
+            if sketch.update(visitors[key]) | ip_sketch.update(ips[key]):
+                changed.append(
+                    {
+                        "b_link_id": key[0],
+                        "b_bucket": key[1],
+                        "b_registers": sketch.to_bytes(),
+                        "b_ip_registers": ip_sketch.to_bytes(),
+                    }
+                )
+        if changed:
+            # a Core executemany with an explicit WHERE, the same through a
+            # session or the fast redirect app's plain connection (an ORM bulk
+            # UPDATE by primary key loses its WHERE on a connection)
+            sketches_table = VisitorSketchDaily.__table__
+            stmt = (
+                update(sketches_table)
+                .where(
+                    sketches_table.c.link_id == bindparam("b_link_id"),
+                    sketches_table.c.bucket == bindparam("b_bucket"),
+                )
+                .values(
+                    registers=bindparam("b_registers"),
+                    ip_registers=bindparam("b_ip_registers"),
+                )
+            )
+            await db.execute(stmt, changed)
+
+    async def _lock_sketches(
+        self, db: AsyncSession, keys: List[SketchKey]
+    ) -> Dict[SketchKey, Tuple[HyperLogLog, HyperLogLog]]:
+        """(visitors, IP addresses) sketches of the existing keys"""
+        stmt = (
+            select(
+                VisitorSketchDaily.link_id,
+                VisitorSketchDaily.bucket,
+                VisitorSketchDaily.registers,
+                VisitorSketchDaily.ip_registers,
+            )
+            .where(
+                tuple_(VisitorSketchDaily.link_id, VisitorSketchDaily.bucket).in_(keys)
+            )
+            # same order as the other rollups, to avoid deadlocks between writers
+            .order_by(VisitorSketchDaily.link_id, VisitorSketchDaily.bucket)
+            .with_for_update()
+        )
+        rows = (await db.execute(stmt)).tuples().all()
+        return {
+            (link_id, bucket): (HyperLogLog(registers), HyperLogLog(ip_registers))
+            for link_id, bucket, registers, ip_registers in rows
+        }
+
+    def _owned_link(self, user_id: uuid.UUID, link_id: int):
+        return select(Link.id).where(Link.id == link_id, Link.user_id == user_id)
+
+    async def get_summary_rows(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        link_id: int,
+        day_from: datetime.date | None,
+        day_to: datetime.date | None,
+        today: datetime.date,
+        top: int = 5,
+        exact: bool = False,
+        referrers: bool = True,
+    ) -> List[RollupRow]:
+        """The /stats figures from the daily rollups in one round trip. Distinct
+        visitors and IPs don't add up across days: they come from
+        get_unique_estimates, or, with `exact`, from counting the raw clicks.
+        `referrers=False` leaves out the top referrers."""
+        owned = self._owned_link(user_id, link_id)
+
+        def daily(model):
+            filters = [model.link_id.in_(owned)]
+            if day_from:
+                filters.append(model.bucket >= day_from)
+            if day_to:
+                filters.append(model.bucket <= day_to)
+            return filters
+
+        clicks_filters = [Click.link_id.in_(owned)]
+        if day_from:
+            clicks_filters.append(
+                Click.clicked_at
+                >= datetime.datetime.combine(
+                    day_from, datetime.time.min, tzinfo=datetime.timezone.utc
+                )
+            )
+        if day_to:
+            clicks_filters.append(
+                Click.clicked_at
+                < datetime.datetime.combine(
+                    day_to + datetime.timedelta(days=1),
+                    datetime.time.min,
+                    tzinfo=datetime.timezone.utc,
+                )
+            )
+
+        def breakdown(kind: str, model, column):
+            clicks = func.sum(model.clicks)
+            return (
+                select(literal(kind), column, clicks)
+                .where(*daily(model))
+                .group_by(column)
+                .order_by(clicks.desc(), column)
+                .limit(top)
+            )
+
+        selects = [
+            select(literal("total"), null(), func.sum(ClickRollupDaily.clicks)).where(
+                *daily(ClickRollupDaily)
+            ),
+            select(literal("today"), null(), func.sum(ClickRollupDaily.clicks)).where(
+                ClickRollupDaily.link_id.in_(owned), ClickRollupDaily.bucket == today
+            ),
+            select(
+                literal("unique_referrers"),
+                null(),
+                func.count(ReferrerRollupDaily.referrer.distinct()),
+            ).where(*daily(ReferrerRollupDaily)),
+            breakdown(
+                "browser", BrowserRollupDaily, cast(BrowserRollupDaily.browser, String)
+            ),
+        ]
+        if referrers:
+            selects.append(
+                breakdown("referrer", ReferrerRollupDaily, ReferrerRollupDaily.referrer)
+            )
+        if exact:
+            selects += [
+                select(
+                    literal("unique_ips"),
+                    null(),
+                    func.count(Click.ip_address.distinct()),
+                ).where(*clicks_filters),
+                select(
+                    literal("unique_visitors"),
+                    null(),
+                    # a visitor is an (IP, user agent) pair, as in visitor_hash
+                    func.count(distinct(tuple_(Click.ip_address, Click.user_agent_id))),
+                ).where(*clicks_filters),
+            ]
+        rows = (await db.execute(union_all(*selects))).all()
+        return [RollupRow(kind, value, clicks or 0) for kind, value, clicks in rows]
+
+    async def get_unique_estimates(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        link_id: int,
+        day_from: datetime.date | None,
+        day_to: datetime.date | None,
+    ) -> Tuple[int, int]:
+        """HyperLogLog estimates of the distinct visitors and IP addresses,
+        each within about 2 * hll.STANDARD_ERROR (3.3%) of the exact count 95%
+        of the time"""
+        stmt = select(
+            VisitorSketchDaily.registers, VisitorSketchDaily.ip_registers
+        ).where(VisitorSketchDaily.link_id.in_(self._owned_link(user_id, link_id)))
+        if day_from:
+            stmt = stmt.where(VisitorSketchDaily.bucket >= day_from)
+        if day_to:
+            stmt = stmt.where(VisitorSketchDaily.bucket <= day_to)
+        rows = (await db.execute(stmt)).tuples().all()
+        return (
+            HyperLogLog.merged(row[0] for row in rows).estimate(),
+            HyperLogLog.merged(row[1] for row in rows).estimate(),
+        )
+
+    async def get_period_clicks(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        link_id: int,
+        granularity: str,
+        tz: str,
+        start: datetime.datetime,
+        stop: datetime.datetime,
+        source: Literal["clicks", "hourly", "daily"],
+    ) -> List[Tuple[datetime.datetime, int]]:
+        """Clicks per `granularity` bucket of time zone `tz` in [start, stop),
+        zero-filled by generate_series. `source` has to be at least as fine as
+        the buckets and aligned with them: the daily rollups are UTC days, the
+        hourly rollups UTC hours."""
+        owned = self._owned_link(user_id, link_id)
+        if source == "clicks":
+            moment = Click.clicked_at
+            clicks = func.count()
+            filters = [
+                Click.link_id.in_(owned),
+                Click.clicked_at >= start,
+                Click.clicked_at < stop,
+            ]
+        elif source == "hourly":
+            moment = ClickRollupHourly.bucket
+            clicks = func.sum(ClickRollupHourly.clicks)
+            filters = [
+                ClickRollupHourly.link_id.in_(owned),
+                ClickRollupHourly.bucket >= start,
+                ClickRollupHourly.bucket < stop,
+            ]
+        else:
+            moment = func.timezone("UTC", cast(ClickRollupDaily.bucket, DateTime))
+            clicks = func.sum(ClickRollupDaily.clicks)
+            filters = [
+                ClickRollupDaily.link_id.in_(owned),
+                ClickRollupDaily.bucket >= start.date(),
+                ClickRollupDaily.bucket < stop.date(),
+            ]
+
+        counts = (
+            select(
+                func.date_trunc(granularity, moment, tz).label("period"),
+                clicks.label("clicks"),
+            )
+            .where(*filters)
+            # the output column: the rollups have an input column named bucket
+            .group_by("period")
+            .subquery()
+        )
+        series = select(
+            func.generate_series(
+                func.date_trunc(granularity, start, tz),
+                stop - datetime.timedelta(microseconds=1),
+                cast(literal(f"1 {granularity}"), INTERVAL),
+                tz,
+            ).label("period")
+        ).subquery()
+        stmt = (
+            select(series.c.period, func.coalesce(counts.c.clicks, 0))
+            .select_from(series.outerjoin(counts, counts.c.period == series.c.period))
+            .order_by(series.c.period)
+        )
+        return [tuple(row) for row in (await db.execute(stmt)).all()]
+
+    def _links_page(
+        self,
+        user_id: uuid.UUID,
+        link_ids: Iterable[int] | None,
+        after: Tuple[datetime.datetime, int] | None,
+        limit: int,
+    ):
+        """`limit` of the user's links (all, or those among `link_ids`) in
+        /api/links/all order, as a CTE"""
+        stmt = (
+            select(Link.id, Link.short_code, Link.created_at)
+            .where(Link.user_id == user_id)
+            .order_by(Link.created_at.desc(), Link.id.desc())
+            .limit(limit)
+        )
+        if link_ids is not None:
+            stmt = stmt.where(Link.id.in_(list(link_ids)))
+        if after is not None:
+            stmt = stmt.where(tuple_(Link.created_at, Link.id) < after)
+        return stmt.cte("page")
+
+    async def _get_link_rows(
+        self, db: AsyncSession, page, selects: list
+    ) -> Tuple[List[PageLink], List[LinkRollupRow]]:
+        """The page's links, each as a "link" row, and the rollup rows of
+        `selects`, in one statement"""
+        links = select(
+            literal("link"),
+            page.c.id,
+            page.c.short_code,
+            null(),
+            page.c.created_at,
+        )
+        selects = [stmt.add_columns(null()) for stmt in selects]
+        rows = (await db.execute(union_all(links, *selects))).all()
+        page_links = sorted(
+            (
+                PageLink(link_id, value, created_at)
+                for kind, link_id, value, _, created_at in rows
+                if kind == "link"
+            ),
+            key=lambda link: (link.created_at, link.id),
+            reverse=True,
+        )
+        return page_links, [
+            LinkRollupRow(kind, link_id, value, clicks or 0)
+            for kind, link_id, value, clicks, _ in rows
+            if kind != "link"
+        ]
+
+    async def get_links_summary_rows(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        link_ids: Iterable[int] | None,
+        after: Tuple[datetime.datetime, int] | None,
+        limit: int,
+        day_from: datetime.date | None,
+        day_to: datetime.date | None,
+        today: datetime.date,
+        top: int = 5,
+    ) -> Tuple[List[PageLink], List[LinkRollupRow]]:
+        """Totals, today's clicks and top referrers of a page of links, grouped
+        per link over the daily rollups in one round trip"""
+        page = self._links_page(user_id, link_ids, after, limit)
+        page_ids = select(page.c.id)
+
+        def daily(model):
+            filters = [model.link_id.in_(page_ids)]
+            if day_from:
+                filters.append(model.bucket >= day_from)
+            if day_to:
+                filters.append(model.bucket <= day_to)
+            return filters
+
+        clicks = func.sum(ReferrerRollupDaily.clicks)
+        referrers = (
+            select(
+                ReferrerRollupDaily.link_id,
+                ReferrerRollupDaily.referrer,
+                clicks.label("clicks"),
+                func.row_number()
+                .over(
+                    partition_by=ReferrerRollupDaily.link_id,
+                    order_by=(clicks.desc(), ReferrerRollupDaily.referrer),
+                )
+                .label("rank"),
+            )
+            .where(*daily(ReferrerRollupDaily))
+            .group_by(ReferrerRollupDaily.link_id, ReferrerRollupDaily.referrer)
+            .subquery()
+        )
+        return await self._get_link_rows(
+            db,
+            page,
+            [
+                select(
+                    literal("total"),
+                    ClickRollupDaily.link_id,
+                    null(),
+                    func.sum(ClickRollupDaily.clicks),
+                )
+                .where(*daily(ClickRollupDaily))
+                .group_by(ClickRollupDaily.link_id),
+                select(
+                    literal("today"),
+                    ClickRollupDaily.link_id,
+                    null(),
+                    ClickRollupDaily.clicks,
+                ).where(
+                    ClickRollupDaily.link_id.in_(page_ids),
+                    ClickRollupDaily.bucket == today,
+                ),
+                select(
+                    literal("referrer"),
+                    referrers.c.link_id,
+                    referrers.c.referrer,
+                    referrers.c.clicks,
+                ).where(referrers.c.rank <= top),
+            ],
+        )
+
+    async def get_links_daily_rows(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        link_ids: Iterable[int] | None,
+        after: Tuple[datetime.datetime, int] | None,
+        limit: int,
+        day_from: datetime.date | None,
+        day_to: datetime.date | None,
+    ) -> Tuple[List[PageLink], List[LinkRollupRow]]:
+        """Daily clicks of a page of links in one round trip"""
+        page = self._links_page(user_id, link_ids, after, limit)
+        stmt = select(
+            literal("day"),
+            ClickRollupDaily.link_id,
+            cast(ClickRollupDaily.bucket, String),
+            ClickRollupDaily.clicks,
+        ).where(ClickRollupDaily.link_id.in_(select(page.c.id)))
+        if day_from:
+            stmt = stmt.where(ClickRollupDaily.bucket >= day_from)
+        if day_to:
+            stmt = stmt.where(ClickRollupDaily.bucket <= day_to)
+        return await self._get_link_rows(db, page, [stmt])
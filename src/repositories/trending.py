@@ -0,0 +1,51 @@
+import uuid
+from datetime import datetime
+from typing import List, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models.trending import TrendingSlot
+from src.utils.heavy_hitters import SpaceSaving
+
+
+class TrendingRepository:
+    async def save_slots(
+        self,
+        db: AsyncSession,
+        worker_id: uuid.UUID,
+        slots: List[Tuple[datetime, SpaceSaving]],
+    ) -> None:
+        """Replace the worker's summaries of these slots"""
+        if not slots:
+            return
+        stmt = insert(TrendingSlot).values(
+            [
+                {
+                    "worker_id": worker_id,
+                    "started_at": started_at,
+                    "capacity": summary.capacity,
+                    "items": summary.items(),
+                }
+                for started_at, summary in slots
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TrendingSlot.worker_id, TrendingSlot.started_at],
+            set_={"capacity": stmt.excluded.capacity, "items": stmt.excluded["items"]},
+        )
+        await db.execute(stmt)
+
+    async def get_summaries(
+        self, db: AsyncSession, since: datetime, exclude_worker: uuid.UUID
+    ) -> List[SpaceSaving]:
+        """Other workers' summaries of the slots started since `since`"""
+        stmt = select(TrendingSlot.capacity, TrendingSlot.items).where(
+            TrendingSlot.started_at >= since,
+            TrendingSlot.worker_id != exclude_worker,
+        )
+        rows = (await db.execute(stmt)).tuples().all()
+        return [SpaceSaving.from_items(capacity, items) for capacity, items in rows]
+
+    async def delete_before(self, db: AsyncSession, before: datetime) -> None:
+        """Drop slots that left the window, including those of stopped workers"""
+        await db.execute(delete(TrendingSlot).where(TrendingSlot.started_at < before))
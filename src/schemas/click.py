@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -20,16 +20,44 @@ class ClickOut(BaseClick):
 class StatsOut(BaseModel):
     total_clicks: int = 0
     today_clicks: int = 0
+    # HyperLogLog estimates unless exact=true; visitors are distinct
+    # (IP, user agent) pairs
     unique_ips: int = 0
+    unique_visitors: int = 0
     unique_referrers: int = 0
     top_referrers: Dict[str, int] = Field(default_factory=dict)
     browsers: Dict[str, int] = Field(default_factory=dict)
 
 
+class LinkStatsOut(BaseModel):
+    link_id: int
+    short_code: str
+    total_clicks: int = 0
+    today_clicks: int = 0
+    top_referrers: Dict[str, int] = Field(default_factory=dict)
+
+
+class TrendingShortCodeOut(BaseModel):
+    short_code: str
+    # approximate: at most `error` more than the actual clicks
+    clicks: int
+    error: int
+
+
+Granularity = Literal["minute", "hour", "day", "week", "month"]
+
+
 class ClicksByPeriodItem(BaseModel):
+    # start of the bucket in the requested time zone: a date for days and
+    # up, a date and time with UTC offset for hours and minutes
     period: str
     count: int
 
 
 class PeriodClicksResponse(BaseModel):
     clicks_by_period: List[ClicksByPeriodItem]
+
+
+class LinkPeriodClicksOut(PeriodClicksResponse):
+    link_id: int
+    short_code: str
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, HttpUrl
+from typing import Optional
+from pydantic import BaseModel, Field, HttpUrl, field_validator
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 class BaseLink(BaseModel):
@@ -8,7 +9,19 @@ class BaseLink(BaseModel):
 
 
 class LinkCreate(BaseLink):
-    pass
+    expires_at: Optional[datetime] = Field(
+        None, description="Stops redirecting after this time (UTC if no offset)"
+    )
+    max_clicks: Optional[int] = Field(
+        None, ge=1, description="Stops redirecting after this many clicks"
+    )
+
+    @field_validator("expires_at")
+    @classmethod
+    def expires_at_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
 
 
 class LinkListOut(BaseLink):
@@ -24,5 +37,17 @@ class LinkOut(BaseLink):
     user_id: UUID
     short_code: str
     short_url: str
+    expires_at: Optional[datetime] = None
+    max_clicks: Optional[int] = None
+    click_count: int = 0
 
     model_config = {"from_attributes": True}
+
+
+class LinkBulkResult(BaseModel):
+    index: int
+    original_link: Optional[str] = None
+    short_code: Optional[str] = None
+    short_url: Optional[str] = None
+    created: bool = False
+    error: Optional[str] = None
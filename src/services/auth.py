@@ -28,6 +28,14 @@ class AuthService:
             expires_delta=timedelta(minutes=settings.access_token_expire_minutes),
         )
 
+    def decode_access_token(self, token: str) -> Dict[str, Any]:
+        try:
+            return decode_jwt(token, settings.secret_key, settings.algorithm)
+        except JWTError as e:
+            if "Signature has expired" in str(e):
+                raise ExpiredTokenError("Access token expired")
+            raise InvalidTokenError("Invalid access token")
+
     async def decode_refresh_token(self, token: str) -> Dict[str, Any]:
         try:
             return decode_jwt(token, settings.refresh_secret_key, settings.algorithm)
@@ -1,44 +1,196 @@
+import logging
+import math
 from collections import Counter
-from datetime import date, datetime, time, timezone
-from typing import Dict, List
-from sqlalchemy import func
-from src.exceptions import ClicksNotFoundException
-from src.models.link import Link
+from datetime import date, datetime, time, timedelta, timezone
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+from pydantic import BaseModel
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from src.exceptions import (
+    ClicksNotFoundException,
+    InvalidPeriodException,
+    LinkNotFoundException,
+)
 from src.repositories.click import ClickRepository
+from src.repositories.click_partition import ClickPartitionRepository, add_months
+from src.repositories.rollup import RollupRepository
+from src.repositories.trending import TrendingRepository
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.click import Click
-from user_agents import parse
+from src.schemas.click import Granularity, PeriodClicksResponse, StatsOut
+from src.services.click_buffer import click_buffer
+from src.services.trending import trending
+from src.config import get_settings
+from src.utils.cache import stats_cache
+from src.utils.export import ExportFormat, encode_rows
+from src.utils.heavy_hitters import merge_top
+from src.utils.http_cache import CachedResult
+from src.utils.pagination import decode_cursor, paginate
+from src.utils.user_agent import BROWSERS, user_agent_dimensions
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# RollupRow.kind -> StatsOut field
+SUMMARY_FIELDS = {
+    "total": "total_clicks",
+    "today": "today_clicks",
+    "unique_referrers": "unique_referrers",
+    "unique_ips": "unique_ips",
+    "unique_visitors": "unique_visitors",
+}
+
+CLICK_EXPORT_FIELDS = (
+    "id",
+    "link_id",
+    "clicked_at",
+    "ip_address",
+    "user_agent",
+    "referrer",
+)
+
+
+# upper bounds, months counted as four weeks
+BUCKET_SECONDS = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86_400,
+    "week": 7 * 86_400,
+    "month": 28 * 86_400,
+}
+
+
+def _bucket_count(granularity: Granularity, start: datetime, stop: datetime) -> int:
+    seconds = (
+        stop.astimezone(timezone.utc) - start.astimezone(timezone.utc)
+    ).total_seconds()
+    # weeks and months rarely start at `start`
+    partial = 1 if granularity in ("week", "month") else 0
+    return math.ceil(seconds / BUCKET_SECONDS[granularity]) + partial
+
+
+def _period_source(
+    granularity: Granularity, tz: str, start: datetime, stop: datetime
+) -> str:
+    """The coarsest table whose buckets line up with the requested ones"""
+    if granularity == "minute":
+        return "clicks"
+    if tz in ("UTC", "Etc/UTC") and granularity != "hour":
+        return "daily"
+    # UTC hours are also local hours where the offset is a whole number of
+    # hours; checked at both ends of the range
+    if all(
+        moment.utcoffset() % timedelta(hours=1) == timedelta(0)
+        for moment in (start, stop)
+    ):
+        return "hourly"
+    return "clicks"
 
 
 class ClickService:
-    def __init__(self, click_repository: ClickRepository):
+    def __init__(
+        self,
+        click_repository: ClickRepository,
+        rollup_repository: RollupRepository | None = None,
+        partition_repository: ClickPartitionRepository | None = None,
+        trending_repository: TrendingRepository | None = None,
+    ):
         self._click_repository = click_repository
+        self._rollup_repository = rollup_repository or RollupRepository()
+        self._partition_repository = partition_repository or ClickPartitionRepository()
+        self._trending_repository = trending_repository or TrendingRepository()
 
     async def register_click(self, db, link_id, ip_address, user_agent, referrer):
-        click = Click(
+        # truncate to the column sizes so one odd header can't fail a whole batch
+        user_agent = user_agent[:255] if user_agent else None
+        click = {
+            "link_id": link_id,
+            "clicked_at": datetime.now(timezone.utc),
+            "ip_address": ip_address[:45] if ip_address else None,
+            "user_agent": user_agent,
+            "referrer": referrer[:255] if referrer else None,
+            **user_agent_dimensions(user_agent),
+        }
+        if settings.click_buffer_enabled and click_buffer.running:
+            click_buffer.enqueue(click)
+            return
+        await self._click_repository.insert_clicks(db, [click])
+
+    async def register_request_click(
+        self,
+        db,
+        link_id: int,
+        headers: Mapping[str, str],
+        client_host: str | None,
+        short_code: str | None = None,
+    ) -> None:
+        """Record a click from redirect request headers, honouring tracking settings"""
+        referrer = headers.get("referer") if settings.log_referrer else None
+        await self.register_click(
+            db,
             link_id=link_id,
-            ip_address=ip_address,
-            user_agent=user_agent,
+            ip_address=(
+                headers.get("X-Forwarded-For", client_host)
+                if client_host and settings.log_ip_address
+                else None
+            ),
+            user_agent=headers.get("user-agent") if settings.log_user_agent else None,
             referrer=referrer,
         )
-        return await self._click_repository.create_obj(db, click)
+        if settings.trending_enabled and short_code:
+            trending.record(short_code, link_id, referrer)
 
     async def get_link_clicks(
         self,
         db: AsyncSession,
         user_id: uuid.UUID,
         link_id: int,
-        skip: int,
         limit: int,
-    ) -> List[Click]:
-
+        cursor: str | None = None,
+        skip: int = 0,
+    ) -> Tuple[List[Click], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
         clicks = await self._click_repository.get_clicks_list(
-            db, user_id=user_id, link_id=link_id, skip=skip, limit=limit
+            db,
+            user_id=user_id,
+            link_id=link_id,
+            limit=limit + 1,
+            after=after,
+            skip=skip,
         )
         if not clicks:
             raise ClicksNotFoundException(f"No clicks found for link_id={link_id}")
-        return clicks
+        return paginate(clicks, limit, "clicked_at")
+
+    async def export_link_clicks(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        link_id: int,
+        format: ExportFormat,
+        clicked_from: datetime | None = None,
+        clicked_to: datetime | None = None,
+    ) -> AsyncIterator[str]:
+        if not await self._click_repository.user_owns_link(db, user_id, link_id):
+            raise LinkNotFoundException(f"Link id={link_id} not found")
+        rows = self._click_repository.iter_link_clicks(
+            db,
+            link_id,
+            clicked_from=clicked_from,
+            clicked_to=clicked_to,
+            chunk_size=settings.export_chunk_size,
+        )
+        return encode_rows(rows, CLICK_EXPORT_FIELDS, format)
 
     async def get_summary(
         self,
@@ -47,110 +199,372 @@ class ClickService:
         link_id: int,
         date_from: date | None = None,
         date_to: date | None = None,
+        exact: bool = False,
     ) -> Dict:
-        filters = [Click.link_id == link_id, Link.user_id == user_id]
-
-        if date_from:
-            filters.append(
-                Click.clicked_at
-                >= datetime.combine(date_from, datetime.min.time(), tzinfo=timezone.utc)
-            )
-        if date_to:
-            filters.append(
-                Click.clicked_at
-                <= datetime.combine(date_to, datetime.max.time(), tzinfo=timezone.utc)
+        """Served from the daily rollups and visitor sketches, so the cost
+        follows the number of days and distinct referrers/browsers rather than
+        the number of clicks; `exact` counts distinct visitors and IPs over the
+        raw clicks instead. With TOP_REFERRERS_FAST_PATH, today's top referrers
+        come from the trending tracker when it has all of them."""
+        today = datetime.now(timezone.utc).date()
+        top_referrers = None
+        if (
+            settings.top_referrers_fast_path
+            and date_from == today
+            and date_to in (None, today)
+        ):
+            top_referrers = trending.top_referrers_today(link_id, 5)
+        rows = await self._rollup_repository.get_summary_rows(
+            db,
+            user_id=user_id,
+            link_id=link_id,
+            day_from=date_from,
+            day_to=date_to,
+            today=today,
+            exact=exact,
+            referrers=top_referrers is None,
+        )
+        summary = {"top_referrers": {}, "browsers": {}}
+        for row in rows:
+            if row.kind == "referrer":
+                summary["top_referrers"][row.value] = row.clicks
+            elif row.kind == "browser":
+                summary["browsers"][BROWSERS[int(row.value)]] = row.clicks
+            else:
+                summary[SUMMARY_FIELDS[row.kind]] = row.clicks
+        # the tracker doesn't know owners: no clicks, not the user's link
+        if top_referrers and summary.get("total_clicks"):
+            summary["top_referrers"] = {
+                referrer: clicks for referrer, clicks, _ in top_referrers
+            }
+        if not exact:
+            (
+                summary["unique_visitors"],
+                summary["unique_ips"],
+            ) = await self._rollup_repository.get_unique_estimates(
+                db,
+                user_id=user_id,
+                link_id=link_id,
+                day_from=date_from,
+                day_to=date_to,
             )
+        return summary
 
-        total_clicks = await self._click_repository.aggregate_records(
-            db=db, column=Click.id, filters=filters
+    async def get_summary_from_clicks(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        link_id: int,
+        date_from: date | None = None,
+        date_to: date | None = None,
+    ) -> Dict:
+        """Same figures as get_summary, from one scan of the raw clicks"""
+        today = datetime.now(timezone.utc).date()
+        rows = await self._click_repository.get_summary_rows(
+            db,
+            user_id=user_id,
+            link_id=link_id,
+            clicked_from=(
+                datetime.combine(date_from, time.min, tzinfo=timezone.utc)
+                if date_from
+                else None
+            ),
+            clicked_to=(
+                datetime.combine(date_to, time.max, tzinfo=timezone.utc)
+                if date_to
+                else None
+            ),
+            today_from=datetime.combine(today, time.min, tzinfo=timezone.utc),
+            work_mem=settings.stats_work_mem,
         )
 
-        today = datetime.now(timezone.utc).date()
-        today_filters = [
-            Click.link_id == link_id,
-            Link.user_id == user_id,
-            Click.clicked_at >= datetime.combine(today, time.min, tzinfo=timezone.utc),
-            Click.clicked_at <= datetime.combine(today, time.max, tzinfo=timezone.utc),
-        ]
+        summary = {
+            "total_clicks": 0,
+            "today_clicks": 0,
+            "unique_ips": 0,
+            "unique_referrers": 0,
+            "top_referrers": {},
+            "browsers": {},
+        }
+        browsers = Counter()
+        for row in rows:
+            if row.kind == "total":
+                summary.update(
+                    total_clicks=row.clicks,
+                    today_clicks=row.today_clicks,
+                    unique_ips=row.unique_ips,
+                    unique_referrers=row.unique_referrers,
+                )
+            elif row.kind == "referrer":
+                summary["top_referrers"][row.value] = row.clicks
+            else:
+                browsers[BROWSERS[int(row.value)]] = row.clicks
 
-        today_clicks = await self._click_repository.aggregate_records(
-            db=db, column=Click.id, filters=today_filters
-        )
+        summary["browsers"] = dict(browsers.most_common(5))
+        return summary
 
-        unique_ips = await self._click_repository.aggregate_records(
-            db=db, column=Click.user_agent, filters=filters, distinct_flag=True
-        )
+    async def get_period_clicks(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        link_id: int,
+        date_from: date,
+        date_to: date,
+        granularity: Granularity = "day",
+        tz: str = "UTC",
+    ) -> Dict:
+        """Clicks per bucket from the start of date_from to the end of date_to
+        in time zone `tz`, empty buckets included"""
+        try:
+            zone = ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise InvalidPeriodException(f"Unknown time zone '{tz}'")
+        start = datetime.combine(date_from, time.min, tzinfo=zone)
+        stop = datetime.combine(date_to + timedelta(days=1), time.min, tzinfo=zone)
+        buckets = _bucket_count(granularity, start, stop)
+        if buckets > settings.period_max_buckets:
+            raise InvalidPeriodException(
+                f"{buckets} {granularity} buckets requested, "
+                f"at most {settings.period_max_buckets} allowed"
+            )
 
-        unique_referrers = await self._click_repository.aggregate_records(
-            db=db, column=Click.referrer, filters=filters, distinct_flag=True
+        rows = await self._rollup_repository.get_period_clicks(
+            db,
+            user_id=user_id,
+            link_id=link_id,
+            granularity=granularity,
+            tz=tz,
+            start=start,
+            stop=stop,
+            source=_period_source(granularity, tz, start, stop),
         )
+        return {
+            "clicks_by_period": [
+                {
+                    "period": (
+                        period.astimezone(zone).date().isoformat()
+                        if granularity in ("day", "week", "month")
+                        else period.astimezone(zone).isoformat()
+                    ),
+                    "count": count,
+                }
+                for period, count in rows
+            ]
+        }
 
-        top_referrers = await self._click_repository.aggregate_records(
-            db=db,
-            column=Click.referrer,
-            filters=filters,
-            group_by=Click.referrer,
-            order_by=func.count(Click.referrer).desc(),
-            limit=5,
-            key="referrer",
-        )
-        brows = await self._click_repository.aggregate_records(
-            db=db,
-            column=Click.user_agent,
-            filters=filters,
-            group_by=Click.user_agent,
-            order_by=func.count(Click.user_agent),
+    async def get_links_summary(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        link_ids: List[int] | None,
+        limit: int,
+        cursor: str | None = None,
+        date_from: date | None = None,
+        date_to: date | None = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Totals, today's clicks and top referrers for a page of the user's
+        links (all of them, or those among `link_ids`), newest link first"""
+        after = decode_cursor(cursor) if cursor else None
+        links, rows = await self._rollup_repository.get_links_summary_rows(
+            db,
+            user_id=user_id,
+            link_ids=link_ids,
+            after=after,
+            limit=limit + 1,
+            day_from=date_from,
+            day_to=date_to,
+            today=datetime.now(timezone.utc).date(),
         )
-        counter = Counter()
-        for row in brows:
-            ua = row["user_agent"]
-            if not ua:
+        links, next_cursor = paginate(links, limit, "created_at")
+        summaries = {
+            link.id: {
+                "link_id": link.id,
+                "short_code": link.short_code,
+                "top_referrers": {},
+            }
+            for link in links
+        }
+        # most clicked referrers first
+        for row in sorted(rows, key=lambda row: (-row.clicks, row.value or "")):
+            summary = summaries.get(row.link_id)
+            if summary is None:
+                # the link fetched to tell whether there is a next page
                 continue
-            browser = parse(ua).browser.family
-            counter[browser] += row["count"]
+            if row.kind == "referrer":
+                summary["top_referrers"][row.value] = row.clicks
+            else:
+                summary[SUMMARY_FIELDS[row.kind]] = row.clicks
+        return list(summaries.values()), next_cursor
 
-        browsers = dict(counter.most_common(5))
-
-        return {
-            "total_clicks": total_clicks,
-            "today_clicks": today_clicks,
-            "unique_ips": unique_ips,
-            "unique_referrers": unique_referrers,
-            "top_referrers": top_referrers,
-            "browsers": browsers,
+    async def get_links_period_clicks(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        link_ids: List[int] | None,
+        limit: int,
+        cursor: str | None = None,
+        date_from: date | None = None,
+        date_to: date | None = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """get_period_clicks for a page of links, like get_links_summary"""
+        after = decode_cursor(cursor) if cursor else None
+        links, rows = await self._rollup_repository.get_links_daily_rows(
+            db,
+            user_id=user_id,
+            link_ids=link_ids,
+            after=after,
+            limit=limit + 1,
+            day_from=date_from,
+            day_to=date_to,
+        )
+        links, next_cursor = paginate(links, limit, "created_at")
+        periods = {
+            link.id: {
+                "link_id": link.id,
+                "short_code": link.short_code,
+                "clicks_by_period": [],
+            }
+            for link in links
         }
+        for row in sorted(rows, key=lambda row: row.value):
+            if row.link_id in periods:
+                periods[row.link_id]["clicks_by_period"].append(
+                    {"period": row.value, "count": row.clicks}
+                )
+        return list(periods.values()), next_cursor
 
-    async def get_period_clicks(
+    async def get_trending_short_codes(
+        self, db: AsyncSession, limit: int
+    ) -> List[Dict]:
+        """The most redirected short codes over the trending window: this
+        worker's live counts merged with what the others last flushed"""
+        others = await self._trending_repository.get_summaries(
+            db, since=trending.window_started_at(), exclude_worker=trending.worker_id
+        )
+        return [
+            {"short_code": short_code, "clicks": clicks, "error": error}
+            for short_code, clicks, error in merge_top(
+                [*trending.short_code_summaries(), *others], limit
+            )
+        ]
+
+    async def flush_trending(self, db: AsyncSession) -> int:
+        """Save this worker's short code slots that changed since the last
+        flush, for the other workers to merge; returns how many"""
+        slots = trending.unflushed_slots()
+        # taken along with the items, before anything else is counted
+        totals = {index: summary.total for index, summary in slots}
+        await self._trending_repository.save_slots(
+            db,
+            trending.worker_id,
+            [(trending.slot_started_at(index), summary) for index, summary in slots],
+        )
+        await self._trending_repository.delete_before(db, trending.window_started_at())
+        await db.commit()
+        trending.mark_flushed(totals)
+        return len(slots)
+
+    async def get_cached_summary(
         self,
         db: AsyncSession,
         user_id: int,
         link_id: int,
         date_from: date | None = None,
         date_to: date | None = None,
-    ) -> Dict:
-        filters = [Click.link_id == link_id, Link.user_id == user_id]
+        exact: bool = False,
+    ) -> CachedResult:
+        return await self._cached(
+            ("stats", link_id, user_id, date_from, date_to, exact),
+            date_to,
+            StatsOut,
+            lambda: self.get_summary(db, user_id, link_id, date_from, date_to, exact),
+        )
 
-        if date_from:
-            filters.append(
-                Click.clicked_at
-                >= datetime.combine(date_from, datetime.min.time(), tzinfo=timezone.utc)
-            )
-        if date_to:
-            filters.append(
-                Click.clicked_at
-                <= datetime.combine(date_to, datetime.max.time(), tzinfo=timezone.utc)
-            )
+    async def get_cached_period_clicks(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        link_id: int,
+        date_from: date,
+        date_to: date,
+        granularity: Granularity = "day",
+        tz: str = "UTC",
+    ) -> CachedResult:
+        return await self._cached(
+            ("period", link_id, user_id, date_from, date_to, granularity, tz),
+            date_to,
+            PeriodClicksResponse,
+            lambda: self.get_period_clicks(
+                db, user_id, link_id, date_from, date_to, granularity, tz
+            ),
+        )
 
-        clicks_by_period = await self._click_repository.aggregate_records(
-            db,
-            column=func.date_trunc("day", Click.clicked_at).label("period"),
-            filters=filters,
-            group_by="period",
-            order_by="period",
-            key="period",
+    async def _cached(
+        self,
+        key: Hashable,
+        date_to: date | None,
+        schema: type[BaseModel],
+        compute: Callable[[], Awaitable[Dict]],
+    ) -> CachedResult:
+        result = stats_cache.get(key)
+        if result is not None:
+            return result
+        body = schema.model_validate(await compute()).model_dump(mode="json")
+        result = CachedResult.build(body)
+        # clicks buffered just before midnight may still land in yesterday
+        today = datetime.now(timezone.utc).date()
+        settled = date_to is not None and date_to < today - timedelta(days=1)
+        stats_cache.set(
+            key,
+            result,
+            ttl=(
+                settings.stats_cache_settled_ttl_seconds
+                if settled
+                else settings.stats_cache_ttl_seconds
+            ),
         )
+        return result
 
-        for row in clicks_by_period:
-            row["period"] = row["period"].date().isoformat()
+    async def maintain_partitions(
+        self, db: AsyncSession, today: date | None = None
+    ) -> Dict[str, List[date]]:
+        """Create the partitions for the current and the next
+        CLICK_PARTITIONS_AHEAD months and apply CLICK_RETENTION_MONTHS. Every
+        worker runs this at startup; only one at a time does the work, the
+        others skip the run."""
+        today = today or datetime.now(timezone.utc).date()
+        current = today.replace(day=1)
+        if not await self._partition_repository.try_lock(db):
+            await db.rollback()
+            logger.info("Click partition maintenance already running elsewhere")
+            return {"created": [], "expired": []}
+        existing = set(await self._partition_repository.list_months(db))
 
-        return {"clicks_by_period": clicks_by_period}
+        created = []
+        for months in range(settings.click_partitions_ahead + 1):
+            month = add_months(current, months)
+            if month not in existing:
+                await self._partition_repository.create(db, month)
+                created.append(month)
+
+        expired = []
+        if settings.click_retention_months:
+            keep_from = add_months(current, -settings.click_retention_months)
+            for month in sorted(month for month in existing if month < keep_from):
+                if settings.click_retention_action == "detach":
+                    if await self._partition_repository.detach(db, month):
+                        expired.append(month)
+                else:
+                    await self._partition_repository.drop(db, month)
+                    expired.append(month)
+        await db.commit()
+
+        if created:
+            logger.info("Created click partitions for %s", created)
+        if expired:
+            logger.info(
+                "Click partitions past retention (%s): %s",
+                settings.click_retention_action,
+                expired,
+            )
+        return {"created": created, "expired": expired}
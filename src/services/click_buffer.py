@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from typing import Dict, List
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from src.config import get_settings
+from src.repositories.click import ClickRepository
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer:
+    """Bounded in-process queue of clicks flushed to the database in batches.
+
+    Clicks are accepted with `enqueue` without touching the database; a
+    background task writes them once `batch_size` rows are collected or
+    `flush_interval` seconds have passed, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        click_repository: ClickRepository,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        overflow_policy: str = "drop_new",
+    ):
+        self._click_repository = click_repository
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self._session_factory: async_sessionmaker[AsyncSession] | None = None
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        # clicks of links deleted before they were written
+        self.orphaned = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._closing
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def enqueue(self, click: dict) -> bool:
+        try:
+            self._queue.put_nowait(click)
+        except asyncio.QueueFull:
+            if self.overflow_policy != "drop_oldest":
+                self.dropped += 1
+                return False
+            self._queue.get_nowait()
+            self._queue.put_nowait(click)
+            self.dropped += 1
+        self.enqueued += 1
+        return True
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        if self.running:
+            return
+        self._session_factory = session_factory
+        self._closing = False
+        self._task = asyncio.create_task(self._run(), name="click-buffer-flusher")
+
+    async def stop(self, timeout: float) -> None:
+        """Let the flusher drain what is left in the queue, then stop it"""
+        if self._task is None:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Click buffer drain timed out, %s clicks lost", self._queue.qsize()
+            )
+        self._task = None
+
+    async def _run(self) -> None:
+        while not (self._closing and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+    async def _next_batch(self) -> List[dict]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch: List[dict] = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - loop.time()
+            if timeout <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[dict]) -> None:
+        try:
+            while True:
+                try:
+                    await self._insert(batch)
+                    break
+                except IntegrityError:
+                    # most likely clicks of a link deleted since they were
+                    # buffered: drop those rather than the whole batch
+                    live = await self._without_deleted_links(batch)
+                    if len(live) == len(batch):
+                        raise
+                    batch = live
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to write %s buffered clicks", len(batch))
+
+    async def _insert(self, batch: List[dict]) -> None:
+        if not batch:
+            return
+        async with self._session_factory() as db:
+            await self._click_repository.insert_clicks(db, batch)
+
+    async def _without_deleted_links(self, batch: List[dict]) -> List[dict]:
+        async with self._session_factory() as db:
+            existing = await self._click_repository.get_existing_link_ids(
+                db, {click["link_id"] for click in batch}
+            )
+        live = [click for click in batch if click["link_id"] in existing]
+        if len(live) != len(batch):
+            self.orphaned += len(batch) - len(live)
+            logger.warning(
+                "Dropped %s buffered clicks of deleted links", len(batch) - len(live)
+            )
+        return live
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.depth(),
+            "max_size": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "orphaned": self.orphaned,
+        }
+
+
+click_buffer = ClickBuffer(
+    ClickRepository(),
+    max_size=settings.click_buffer_max_size,
+    batch_size=settings.click_buffer_batch_size,
+    flush_interval=settings.click_buffer_flush_interval_seconds,
+    overflow_policy=settings.click_buffer_overflow_policy,
+)
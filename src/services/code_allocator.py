@@ -0,0 +1,66 @@
+import asyncio
+from collections import deque
+from typing import Deque, List, Protocol
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import get_settings
+from src.exceptions import LinkAlreadyExistsException
+from src.repositories.link import LinkRepository
+from src.utils.link_shortener import encode_short_code, gen_short_code
+
+settings = get_settings()
+
+
+class CodeAllocator(Protocol):
+    async def allocate(self, db: AsyncSession, count: int = 1) -> List[str]: ...
+
+
+class RandomCodeAllocator:
+    """Random codes, checked against existing links with one query per attempt"""
+
+    def __init__(self, link_repository: LinkRepository, attempts: int = 5):
+        self._link_repository = link_repository
+        self._attempts = attempts
+
+    async def allocate(self, db: AsyncSession, count: int = 1) -> List[str]:
+        codes: set = set()
+        for _ in range(self._attempts):
+            candidates = {gen_short_code() for _ in range(count - len(codes))}
+            candidates -= codes
+            taken = await self._link_repository.existing_short_codes(db, candidates)
+            codes |= candidates - taken
+            if len(codes) == count:
+                return list(codes)
+        raise LinkAlreadyExistsException("Cannot generate unique short code, try again")
+
+
+class SequenceCodeAllocator:
+    """Unique codes without existence probes.
+
+    Each worker leases blocks of ids from `short_code_seq` in a single round
+    trip and encodes them with `encode_short_code`. Ids are never reused, so
+    codes can only collide with links created by the random allocator.
+    """
+
+    def __init__(self, link_repository: LinkRepository, block_size: int):
+        self._link_repository = link_repository
+        self.block_size = block_size
+        self._ids: Deque[int] = deque()
+        self._lock = asyncio.Lock()
+
+    async def allocate(self, db: AsyncSession, count: int = 1) -> List[str]:
+        async with self._lock:
+            if len(self._ids) < count:
+                lease = max(self.block_size, count - len(self._ids))
+                self._ids.extend(await self._link_repository.lease_code_ids(db, lease))
+            return [encode_short_code(self._ids.popleft()) for _ in range(count)]
+
+
+def get_code_allocator() -> CodeAllocator:
+    if settings.short_code_allocator == "random":
+        return RandomCodeAllocator(LinkRepository())
+    return SequenceCodeAllocator(
+        LinkRepository(), block_size=settings.short_code_block_size
+    )
+
+
+code_allocator = get_code_allocator()
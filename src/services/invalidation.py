@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from contextlib import suppress
+from typing import Any, Callable, Dict, List
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import get_settings
+from src.services.link_filter import link_filter
+from src.utils.cache import link_cache, stats_cache, user_cache
+from src.utils.monitoring import normalize_dsn
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], None]
+
+
+class InvalidationBus:
+    """Keeps worker-local caches consistent across processes.
+
+    Events are sent with NOTIFY inside the caller's transaction, so other
+    workers only see them once the change is committed. Every worker LISTENs
+    on a dedicated connection and runs the registered handlers; the worker
+    that made the change applies them itself right after committing.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._on_reconnect: List[Callable[[], None]] = []
+        self._task: asyncio.Task | None = None
+        self.received = 0
+
+    def subscribe(self, event: str, handler: Handler) -> None:
+        self._handlers[event].append(handler)
+
+    def on_reconnect(self, callback: Callable[[], None]) -> None:
+        self._on_reconnect.append(callback)
+
+    async def publish(self, db: AsyncSession, event: str, **payload) -> None:
+        """NOTIFY all workers; delivered when db's transaction commits"""
+        if not settings.invalidation_bus_enabled:
+            return
+        message = json.dumps({"event": event, **payload}, default=str)
+        await db.execute(select(func.pg_notify(self.channel, message)))
+
+    def apply(self, event: str, **payload) -> None:
+        """Run the handlers for `event` in this worker"""
+        for handler in self._handlers.get(event, ()):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Invalidation handler for %s failed", event)
+
+    def _on_notify(self, connection, pid: int, channel: str, message: str) -> None:
+        self.received += 1
+        try:
+            payload = json.loads(message)
+            event = payload.pop("event")
+        except (ValueError, KeyError):
+            logger.warning("Malformed invalidation message: %r", message)
+            return
+        self.apply(event, **payload)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen(), name="invalidation-bus")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _listen(self) -> None:
+        dsn = normalize_dsn(settings.db_url_str)
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(self.channel, self._on_notify)
+                if connected_before:
+                    # events sent while we weren't listening are gone
+                    for callback in self._on_reconnect:
+                        callback()
+                connected_before = True
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), timeout=30)
+                    except asyncio.TimeoutError:
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Invalidation listener connection failed")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    with suppress(Exception):
+                        await conn.close()
+            await asyncio.sleep(1)
+
+
+def _link_created(payload: Dict[str, Any]) -> None:
+    link_filter.add(payload["short_code"])
+
+
+def _links_created(payload: Dict[str, Any]) -> None:
+    for short_code in payload["short_codes"]:
+        link_filter.add(short_code)
+
+
+def _link_deleted(payload: Dict[str, Any]) -> None:
+    link_cache.invalidate(payload["short_code"])
+    link_filter.discard(payload["short_code"])
+    link_id = payload.get("link_id")
+    if link_id is not None:
+        stats_cache.invalidate_where(lambda key, _: key[1] == link_id)
+
+
+def _links_deleted(payload: Dict[str, Any]) -> None:
+    for short_code in payload["short_codes"]:
+        link_cache.invalidate(short_code)
+        link_filter.discard(short_code)
+
+
+def _user_changed(payload: Dict[str, Any]) -> None:
+    user_cache.invalidate(uuid.UUID(str(payload["user_id"])))
+
+
+def _user_deleted(payload: Dict[str, Any]) -> None:
+    user_id = uuid.UUID(str(payload["user_id"]))
+    user_cache.invalidate(user_id)
+    link_cache.invalidate_where(lambda _, target: target.user_id == user_id)
+    stats_cache.invalidate_where(lambda key, _: key[2] == user_id)
+
+
+def _reset_caches() -> None:
+    link_cache.clear()
+    user_cache.clear()
+    stats_cache.clear()
+    # the Bloom filter may have missed new links; fall back to the DB until
+    # the next rebuild
+    link_filter.clear()
+
+
+invalidation_bus = InvalidationBus(settings.invalidation_channel)
+invalidation_bus.subscribe("link_created", _link_created)
+invalidation_bus.subscribe("links_created", _links_created)
+invalidation_bus.subscribe("link_deleted", _link_deleted)
+invalidation_bus.subscribe("links_deleted", _links_deleted)
+invalidation_bus.subscribe("user_changed", _user_changed)
+invalidation_bus.subscribe("user_deleted", _user_deleted)
+invalidation_bus.on_reconnect(_reset_caches)
@@ -1,11 +1,33 @@
-from typing import List
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Tuple
 from uuid import UUID
-from src.exceptions import LinkAlreadyExistsException, LinkNotFoundException
-from src.repositories.link import LinkRepository
-from sqlalchemy.ext.asyncio import AsyncSession
+from src.exceptions import (
+    LinkAlreadyExistsException,
+    LinkExpiredException,
+    LinkNotFoundException,
+)
+from src.repositories.link import LinkRepository, LinkTarget
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from src.models.link import Link
-from src.schemas.link import LinkCreate
-from src.utils.link_shortener import gen_short_code
+from src.schemas.link import LinkBulkResult, LinkCreate
+from src.config import get_settings
+from src.services.code_allocator import code_allocator
+from src.services.invalidation import invalidation_bus
+from src.services.link_filter import link_filter
+from src.utils.cache import link_cache
+from src.utils.link_shortener import build_short_url
+from src.utils.export import ExportFormat, encode_rows
+from src.utils.pagination import decode_cursor, paginate
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# short codes per "links_created" NOTIFY; payloads are capped at 8000 bytes
+NOTIFY_BATCH_SIZE = 200
+
+LINK_EXPORT_FIELDS = ("id", "original_link", "short_code", "created_at")
 
 
 class LinkService:
@@ -22,24 +44,117 @@ class LinkService:
         if existing:
             return existing
 
-        for _ in range(5):
-            short_code = gen_short_code()
-            if not await self._link_repository.get_one_by_filters(
-                db, short_code=short_code
-            ):
-                break
-        else:
-            raise LinkAlreadyExistsException(
-                "Cannot generate unique short code, try again"
+        # codes from the sequence allocator can still collide with links made
+        # by the random one, and a concurrent request may create the same link;
+        # either way a unique index rejects the insert
+        for _ in range(3):
+            (short_code,) = await code_allocator.allocate(db)
+            link = Link(
+                original_link=str(link_in.original_link),
+                short_code=short_code,
+                user_id=user_id,
+                expires_at=link_in.expires_at,
+                max_clicks=link_in.max_clicks,
             )
+            await invalidation_bus.publish(db, "link_created", short_code=short_code)
+            try:
+                link = await self._link_repository.create_obj(db, link)
+            except IntegrityError:
+                await db.rollback()
+                existing = await self._link_repository.get_by_original_link(
+                    db, str(link_in.original_link), user_id
+                )
+                if existing:
+                    return existing
+                continue
+            invalidation_bus.apply("link_created", short_code=short_code)
+            return link
+
+        raise LinkAlreadyExistsException("Cannot generate unique short code, try again")
+
+    async def create_links_bulk(
+        self, db: AsyncSession, items: List[Tuple[int, LinkCreate]], user_id: UUID
+    ) -> List[LinkBulkResult]:
+        """Create links for (index, LinkCreate) pairs in one transaction.
 
-        link = Link(
-            original_link=str(link_in.original_link),
-            short_code=short_code,
-            user_id=user_id,
+        Existing links are looked up with one query and returned as is, the
+        rest get codes allocated in one go and are inserted with a single
+        multi-row INSERT; rows that lose a short code race are retried.
+        """
+        links_in: dict[str, LinkCreate] = {}
+        for _, link_in in items:
+            links_in.setdefault(str(link_in.original_link), link_in)
+        original_links = list(links_in)
+        existing = await self._link_repository.get_codes_by_original_links(
+            db, original_links, user_id
         )
+        pending = [link for link in original_links if link not in existing]
+        created: dict[str, str] = {}
+        for _ in range(3):
+            if not pending:
+                break
+            short_codes = await code_allocator.allocate(db, len(pending))
+            rows = [
+                {
+                    "original_link": link,
+                    "short_code": code,
+                    "user_id": user_id,
+                    "expires_at": links_in[link].expires_at,
+                    "max_clicks": links_in[link].max_clicks,
+                }
+                for link, code in zip(pending, short_codes)
+            ]
+            inserted = await self._link_repository.insert_links(db, rows)
+            created.update(inserted)
+            pending = [link for link in pending if link not in inserted]
+            if pending:
+                # skipped either for the short code or because a concurrent
+                # request has just created the same link
+                existing.update(
+                    await self._link_repository.get_codes_by_original_links(
+                        db, pending, user_id
+                    )
+                )
+                pending = [link for link in pending if link not in existing]
 
-        return await self._link_repository.create_obj(db, link)
+        new_codes = list(created.values())
+        for start in range(0, len(new_codes), NOTIFY_BATCH_SIZE):
+            await invalidation_bus.publish(
+                db,
+                "links_created",
+                short_codes=new_codes[start : start + NOTIFY_BATCH_SIZE],
+            )
+        await db.commit()
+        if new_codes:
+            invalidation_bus.apply("links_created", short_codes=new_codes)
+
+        results = []
+        for index, link_in in items:
+            link = str(link_in.original_link)
+            short_code = existing.get(link) or created.get(link)
+            if short_code is None:
+                results.append(
+                    LinkBulkResult(
+                        index=index,
+                        original_link=link,
+                        error="Cannot generate unique short code, try again",
+                    )
+                )
+                continue
+            # repeated URLs in one request: only the first one is "created"
+            is_new = created.pop(link, None) is not None
+            if is_new:
+                existing[link] = short_code
+            results.append(
+                LinkBulkResult(
+                    index=index,
+                    original_link=link,
+                    short_code=short_code,
+                    short_url=build_short_url(short_code),
+                    created=is_new,
+                )
+            )
+        return results
 
     async def get_by_short_code(
         self,
@@ -56,29 +171,149 @@ class LinkService:
 
     async def get_by_short_code_public(
         self, db: AsyncSession, short_code: str
-    ) -> Link | None:
-        """For redirect"""
-        result = await self._link_repository.get_one_by_filters(
-            db, short_code=short_code
-        )
-        if not result:
-            raise LinkNotFoundException(f"Short code '{short_code}' not found")
-        return result
+    ) -> LinkTarget:
+        """For redirect, served from the worker-local link cache when possible.
 
-    async def get_user_links(
-        self, db: AsyncSession, user_id: UUID, skip: int, limit: int
-    ) -> List[Link]:
-        return (
-            await self._link_repository.get_user_links_list(
-                db, skip=skip, limit=limit, user_id=user_id
+        Raises LinkExpiredException past `expires_at` or once `max_clicks` is
+        used up; a click is claimed against the cap here.
+        """
+        target = link_cache.get(short_code)
+        if target is None:
+            if not link_filter.might_exist(short_code):
+                raise LinkNotFoundException(f"Short code '{short_code}' not found")
+
+            target = await self._link_repository.get_redirect_target(db, short_code)
+            if not target:
+                link_filter.remember_missing(short_code)
+                raise LinkNotFoundException(f"Short code '{short_code}' not found")
+            link_cache.set(short_code, target)
+
+        now = datetime.now(timezone.utc)
+        if target.expires_at is not None and target.expires_at <= now:
+            raise LinkExpiredException(f"Short code '{short_code}' has expired")
+        if target.max_clicks is not None and not (
+            await self._link_repository.claim_click(db, target.id)
+        ):
+            # answer from the cache from now on instead of retrying the claim
+            link_cache.set(short_code, target._replace(expires_at=now))
+            raise LinkExpiredException(
+                f"Short code '{short_code}' has reached its click limit"
             )
-            or []
+        return target
+
+    async def get_user_links(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        limit: int,
+        cursor: str | None = None,
+        skip: int = 0,
+    ) -> Tuple[List[Link], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        links = await self._link_repository.get_user_links_list(
+            db, user_id=user_id, limit=limit + 1, after=after, skip=skip
         )
+        return paginate(links, limit, "created_at")
 
-    async def delete_link(self, db: AsyncSession, link: str, user_id: UUID) -> None:
+    def export_links(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        format: ExportFormat,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+    ) -> AsyncIterator[str]:
+        rows = self._link_repository.iter_user_links(
+            db,
+            user_id,
+            created_from=created_from,
+            created_to=created_to,
+            chunk_size=settings.export_chunk_size,
+        )
+        return encode_rows(rows, LINK_EXPORT_FIELDS, format)
+
+    async def get_user_link(self, db: AsyncSession, link: str, user_id: UUID) -> Link:
         link_obj = await self._link_repository.get_by_original_link(
             db, original_link=link, user_id=user_id
         )
         if not link_obj:
             raise LinkNotFoundException(f"Link '{link}' not found")
-        await self._link_repository.delete_obj(db, link_obj)
+        return link_obj
+
+    async def delete_link(self, db: AsyncSession, link: str, user_id: UUID) -> None:
+        deleted = await self._link_repository.delete_user_link(
+            db, original_link=link, user_id=user_id
+        )
+        if deleted is None:
+            raise LinkNotFoundException(f"Link '{link}' not found")
+        link_id, short_code = deleted
+        await invalidation_bus.publish(
+            db, "link_deleted", short_code=short_code, link_id=link_id
+        )
+        await db.commit()
+        invalidation_bus.apply("link_deleted", short_code=short_code, link_id=link_id)
+
+    async def archive_expired_links(self, db: AsyncSession) -> int:
+        """Move links expired for more than LINK_ARCHIVE_AFTER_DAYS to
+        archived_links, one batch per transaction, after deleting their clicks
+        in LINK_PURGE_CHUNK_SIZE chunks; returns how many moved"""
+        expired_before = datetime.now(timezone.utc) - timedelta(
+            days=settings.link_archive_after_days
+        )
+        archived = 0
+        after = 0
+        while True:
+            link_ids = await self._link_repository.get_expired_ids(
+                db, expired_before, settings.link_archive_batch_size, after
+            )
+            if not link_ids:
+                return archived
+            # expired links take no new clicks
+            for link_id in link_ids:
+                await self._delete_clicks(db, link_id)
+            short_codes = await self._link_repository.archive_expired(
+                db, link_ids, expired_before
+            )
+            for start in range(0, len(short_codes), NOTIFY_BATCH_SIZE):
+                await invalidation_bus.publish(
+                    db,
+                    "links_deleted",
+                    short_codes=short_codes[start : start + NOTIFY_BATCH_SIZE],
+                )
+            await db.commit()
+            if short_codes:
+                invalidation_bus.apply("links_deleted", short_codes=short_codes)
+            archived += len(short_codes)
+            if len(link_ids) < settings.link_archive_batch_size:
+                return archived
+            after = link_ids[-1]
+
+    async def _delete_clicks(self, db: AsyncSession, link_id: int) -> None:
+        """In LINK_PURGE_CHUNK_SIZE chunks, one transaction each"""
+        while (
+            await self._link_repository.delete_clicks_chunk(
+                db, link_id, settings.link_purge_chunk_size
+            )
+            == settings.link_purge_chunk_size
+        ):
+            pass
+
+    async def purge_link(
+        self, session_factory: async_sessionmaker, link_id: int, short_code: str
+    ) -> None:
+        """Delete a link's clicks in short transactions, then the link itself.
+
+        For links with too many clicks to cascade in one statement. The link
+        keeps redirecting until its clicks are gone.
+        """
+        try:
+            async with session_factory() as db:
+                await self._delete_clicks(db, link_id)
+                await invalidation_bus.publish(
+                    db, "link_deleted", short_code=short_code, link_id=link_id
+                )
+                await self._link_repository.delete_by_id(db, link_id)
+        except Exception:
+            logger.exception("Purging link id=%s failed", link_id)
+            return
+        invalidation_bus.apply("link_deleted", short_code=short_code, link_id=link_id)
@@ -0,0 +1,87 @@
+from typing import Dict, Set
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import get_settings
+from src.repositories.link import LinkRepository
+from src.utils.bloom import BloomFilter
+from src.utils.cache import LRUTTLCache
+from src.utils.link_shortener import is_valid_short_code
+
+settings = get_settings()
+
+
+class ShortCodeFilter:
+    """Answers "can this short code exist?" without a database query.
+
+    A `False` from `might_exist` is definitive; `True` means the database has
+    to be asked. Until the Bloom filter has been built every well-formed code
+    that isn't in the negative cache passes.
+    """
+
+    def __init__(self, link_repository: LinkRepository):
+        self._link_repository = link_repository
+        self._missing = LRUTTLCache(
+            maxsize=settings.negative_cache_size,
+            ttl=settings.negative_cache_ttl_seconds,
+        )
+        self._bloom: BloomFilter | None = None
+        # codes added while a rebuild is in progress
+        self._pending: Set[str] | None = None
+        self.rejected = 0
+
+    def might_exist(self, short_code: str) -> bool:
+        if settings.short_code_shape_check and not is_valid_short_code(short_code):
+            self.rejected += 1
+            return False
+        if short_code in self._missing:
+            self.rejected += 1
+            return False
+        if self._bloom is not None and short_code not in self._bloom:
+            self.rejected += 1
+            return False
+        return True
+
+    def add(self, short_code: str) -> None:
+        self._missing.invalidate(short_code)
+        if self._bloom is not None:
+            self._bloom.add(short_code)
+        if self._pending is not None:
+            self._pending.add(short_code)
+
+    def discard(self, short_code: str) -> None:
+        # Bloom filters can't remove items: the code stays "maybe" until the
+        # next rebuild, the negative cache answers for it meanwhile
+        self._missing.set(short_code, True)
+
+    def remember_missing(self, short_code: str) -> None:
+        self._missing.set(short_code, True)
+
+    def clear(self) -> None:
+        self._missing.clear()
+        self._bloom = None
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        self._pending = set()
+        try:
+            count = await self._link_repository.count_links(db)
+            # headroom for links created until the next rebuild
+            bloom = BloomFilter(
+                capacity=max(count * 2, 10_000),
+                error_rate=settings.bloom_filter_error_rate,
+            )
+            async for short_code in self._link_repository.iter_short_codes(db):
+                bloom.add(short_code)
+            for short_code in self._pending:
+                bloom.add(short_code)
+            self._bloom = bloom
+        finally:
+            self._pending = None
+
+    def stats(self) -> Dict:
+        return {
+            "rejected": self.rejected,
+            "bloom_items": self._bloom.count if self._bloom is not None else None,
+            "negative_cache": self._missing.stats(),
+        }
+
+
+link_filter = ShortCodeFilter(LinkRepository())
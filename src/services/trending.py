@@ -0,0 +1,118 @@
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+from src.config import get_settings
+from src.utils.cache import LRUTTLCache
+from src.utils.heavy_hitters import HeavyHitter, SlidingTopK, SpaceSaving
+
+settings = get_settings()
+
+DAY_SECONDS = 86_400
+
+
+class Trending:
+    """Approximate heavy hitters of this worker's redirects, in bounded memory:
+    the hottest short codes over the last TRENDING_WINDOW_SECONDS, and the top
+    referrers of each recently clicked link since UTC midnight.
+
+    Every worker only sees the redirects it served itself. Short code slots
+    are flushed to the trending_slots table (ClickService.flush_trending) and
+    merged across workers when queried; referrers stay local.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4()
+        # slot index -> the slot's total when it was last flushed
+        self._flushed: Dict[int, int] = {}
+        self.short_codes = SlidingTopK(
+            capacity=settings.trending_capacity,
+            slot_seconds=max(
+                1, settings.trending_window_seconds // settings.trending_slots
+            ),
+            slots=settings.trending_slots,
+        )
+        # link_id -> (counting since, SlidingTopK of referrers with a single
+        # slot per UTC day)
+        self._referrers = LRUTTLCache(
+            maxsize=settings.trending_referrer_links, ttl=float("inf")
+        )
+        # a link without a tracker had no referred clicks since then; moves
+        # forward when a tracker is evicted, as its counts are gone
+        self._complete_since = time.time()
+
+    def record(self, short_code: str, link_id: int, referrer: str | None) -> None:
+        now = time.time()
+        self.short_codes.add(short_code, now=now)
+        if not referrer:
+            return
+        entry = self._referrers.get(link_id)
+        if entry is None:
+            evictions = self._referrers.evictions
+            entry = (
+                self._complete_since,
+                SlidingTopK(
+                    capacity=settings.trending_referrer_capacity,
+                    slot_seconds=DAY_SECONDS,
+                    slots=1,
+                ),
+            )
+            self._referrers.set(link_id, entry)
+            if self._referrers.evictions != evictions:
+                self._complete_since = now
+        entry[1].add(referrer[:255], now=now)
+
+    def slot_started_at(self, index: int) -> datetime:
+        return datetime.fromtimestamp(
+            index * self.short_codes.slot_seconds, timezone.utc
+        )
+
+    def window_started_at(self) -> datetime:
+        """Start of the oldest slot in the window"""
+        index = int(time.time() // self.short_codes.slot_seconds)
+        return self.slot_started_at(index - settings.trending_slots + 1)
+
+    def short_code_summaries(self) -> List[SpaceSaving]:
+        return [summary for _, summary in self.short_codes.slots()]
+
+    def unflushed_slots(self) -> List[Tuple[int, SpaceSaving]]:
+        """Short code slots in the window that counted redirects since they
+        were last flushed"""
+        return [
+            (index, summary)
+            for index, summary in self.short_codes.slots()
+            if self._flushed.get(index) != summary.total
+        ]
+
+    def mark_flushed(self, totals: Dict[int, int]) -> None:
+        flushed = {**self._flushed, **totals}
+        self._flushed = {
+            index: flushed[index]
+            for index, _ in self.short_codes.slots()
+            if index in flushed
+        }
+
+    def top_referrers_today(self, link_id: int, k: int) -> List[HeavyHitter] | None:
+        """None unless this worker counted all of the link's referrers today"""
+        now = time.time()
+        midnight = now - now % DAY_SECONDS
+        entry = self._referrers.get(link_id)
+        if entry is None:
+            return [] if self._complete_since <= midnight else None
+        started, tracker = entry
+        if started > midnight:
+            return None
+        return tracker.top(k, now=now)
+
+    def clear(self) -> None:
+        self.short_codes = SlidingTopK(
+            self.short_codes.capacity,
+            self.short_codes.slot_seconds,
+            settings.trending_slots,
+        )
+        self._referrers.clear()
+        self._complete_since = time.time()
+        self._flushed.clear()
+
+
+trending = Trending()
@@ -9,8 +9,14 @@ import uuid
 import bcrypt
 from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from src.config import get_settings
 from src.models.user import User
 from src.schemas.user import UserCreate
+from src.services.invalidation import invalidation_bus
+from src.utils.cache import user_cache
+
+settings = get_settings()
 
 
 class UserService:
@@ -23,6 +29,18 @@ class UserService:
             plain_password.encode("utf-8"), hashed_password.encode("utf-8")
         )
 
+    @staticmethod
+    def _detached_copy(user: User) -> User:
+        # cache a copy no session owns, so in-flight changes never leak into it
+        copy = User(
+            **{
+                column.key: getattr(user, column.key)
+                for column in User.__table__.columns
+            }
+        )
+        make_transient_to_detached(copy)
+        return copy
+
     async def authenticate_user(
         self, db: AsyncSession, login: str, password: str
     ) -> User:
@@ -40,9 +58,19 @@ class UserService:
         return user
 
     async def get_user_by_id(self, db: AsyncSession, user_id: uuid.UUID) -> User:
+        # without the bus other workers would keep serving deactivated or
+        # deleted users from their cache until the TTL runs out
+        use_cache = settings.invalidation_bus_enabled
+        cached = user_cache.get(user_id) if use_cache else None
+        if cached is not None:
+            # attach a copy to this session without re-selecting it
+            return await db.merge(cached, load=False)
+
         user = await self._user_repository.get_by_id(db, user_id)
         if not user:
             raise UserNotFoundException(f"User with id '{user_id}' not found")
+        if use_cache:
+            user_cache.set(user_id, self._detached_copy(user))
         return user
 
     async def get_users(
@@ -100,12 +128,19 @@ class UserService:
         for field, value in update_data.items():
             setattr(db_user, field, value)
 
+        await invalidation_bus.publish(db, "user_changed", user_id=db_user.id)
         await self._user_repository.update_obj(db, db_user)
+        invalidation_bus.apply("user_changed", user_id=db_user.id)
         return db_user
 
     async def deactivate_user(self, db: AsyncSession, db_user: User) -> None:
         db_user.is_active = False
+        await invalidation_bus.publish(db, "user_changed", user_id=db_user.id)
         await self._user_repository.update_obj(db, db_user)
+        invalidation_bus.apply("user_changed", user_id=db_user.id)
 
     async def delete_user(self, db: AsyncSession, user: User) -> None:
+        user_id = user.id
+        await invalidation_bus.publish(db, "user_deleted", user_id=user_id)
         await self._user_repository.delete_obj(db, user)
+        invalidation_bus.apply("user_deleted", user_id=user_id)
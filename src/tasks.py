@@ -0,0 +1,86 @@
+from typing import List
+from src.api.dependencies import async_session_factory
+from src.config import get_settings
+from src.repositories.click import ClickRepository
+from src.repositories.link import LinkRepository
+from src.services.click import ClickService
+from src.services.click_buffer import click_buffer
+from src.services.invalidation import invalidation_bus
+from src.services.link import LinkService
+from src.services.link_filter import link_filter
+from src.utils.periodic import PeriodicTask
+
+settings = get_settings()
+
+
+async def rebuild_link_filter() -> None:
+    async with async_session_factory() as db:
+        await link_filter.rebuild(db)
+
+
+async def archive_expired_links() -> None:
+    async with async_session_factory() as db:
+        await LinkService(LinkRepository()).archive_expired_links(db)
+
+
+async def maintain_click_partitions() -> None:
+    async with async_session_factory() as db:
+        await ClickService(ClickRepository()).maintain_partitions(db)
+
+
+async def flush_trending() -> None:
+    async with async_session_factory() as db:
+        await ClickService(ClickRepository()).flush_trending(db)
+
+
+periodic_tasks: List[PeriodicTask] = [
+    PeriodicTask(
+        "click-partition-maintenance",
+        settings.click_partition_maintenance_interval_seconds,
+        maintain_click_partitions,
+        run_immediately=True,
+    )
+]
+if settings.bloom_filter_enabled:
+    periodic_tasks.append(
+        PeriodicTask(
+            "link-filter-rebuild",
+            settings.bloom_filter_rebuild_interval_seconds,
+            rebuild_link_filter,
+            run_immediately=True,
+        )
+    )
+
+if settings.trending_enabled:
+    periodic_tasks.append(
+        PeriodicTask(
+            "trending-flush",
+            settings.trending_flush_interval_seconds,
+            flush_trending,
+        )
+    )
+
+if settings.link_sweeper_enabled:
+    periodic_tasks.append(
+        PeriodicTask(
+            "link-archive-sweeper",
+            settings.link_sweeper_interval_seconds,
+            archive_expired_links,
+        )
+    )
+
+
+async def start_background_tasks() -> None:
+    if settings.invalidation_bus_enabled:
+        invalidation_bus.start()
+    if settings.click_buffer_enabled:
+        click_buffer.start(async_session_factory)
+    for task in periodic_tasks:
+        task.start()
+
+
+async def stop_background_tasks() -> None:
+    for task in periodic_tasks:
+        await task.stop()
+    await click_buffer.stop(timeout=settings.click_buffer_drain_timeout_seconds)
+    await invalidation_bus.stop()
@@ -1,10 +1,13 @@
+import uuid
 import pytest
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
-from src.api.dependencies import get_db
+from src.api.dependencies import get_db, get_redirect_db
 from src.db import get_engine, get_session_factory
 from sqlalchemy import text
 from src.main import app
+from src.services.trending import trending
+from src.utils.cache import referrer_ids, stats_cache, user_agent_ids
 
 
 @pytest.fixture
@@ -32,6 +35,12 @@ async def clean_tables(engine: AsyncEngine):
             await conn.execute(
                 text(f'TRUNCATE TABLE "{table}" RESTART IDENTITY CASCADE')
             )
+    # cached ids of the interned strings that were just truncated
+    user_agent_ids.clear()
+    referrer_ids.clear()
+    # results cached for link ids that are about to be reused
+    stats_cache.clear()
+    trending.clear()
     yield
 
 
@@ -41,6 +50,7 @@ async def client(async_session: AsyncSession):
         yield async_session
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_redirect_db] = override_get_db
 
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url="http://test"
@@ -48,3 +58,22 @@ async def client(async_session: AsyncSession):
         yield ac
 
     app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_redirect_db, None)
+
+
+@pytest.fixture
+async def auth_headers(client: AsyncClient) -> dict:
+    user_data = {
+        "username": f"user_{uuid.uuid4().hex[:6]}",
+        "email": f"user_{uuid.uuid4().hex[:6]}@example.com",
+        "password": "stringst",
+    }
+    reg_response = await client.post("/api/users/register/", json=user_data)
+    assert reg_response.status_code == 201
+
+    response = await client.post(
+        "/api/auth/login",
+        json={"login": user_data["username"], "password": user_data["password"]},
+    )
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -1,6 +1,10 @@
 import uuid
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models.user import User
+from src.services import user as user_service_module
 
 
 @pytest.mark.asyncio
@@ -86,3 +90,30 @@ async def test_login_with_email(client: AsyncClient):
     data = response.json()
     assert "access_token" in data
     assert "refresh_token" in data
+
+
+@pytest.mark.asyncio
+async def test_deactivated_user_is_rejected(client: AsyncClient, auth_headers: dict):
+    me = await client.get("/api/users/me", headers=auth_headers)
+    assert me.status_code == 200
+
+    response = await client.delete("/api/users/me", headers=auth_headers)
+    assert response.status_code == 204
+
+    me = await client.get("/api/users/me", headers=auth_headers)
+    assert me.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_users_not_cached_without_invalidation_bus(
+    client: AsyncClient, auth_headers: dict, async_session: AsyncSession, monkeypatch
+):
+    monkeypatch.setattr(user_service_module.settings, "invalidation_bus_enabled", False)
+    me = await client.get("/api/users/me", headers=auth_headers)
+    assert me.status_code == 200
+
+    # deactivated by another worker, which can't tell this one
+    await async_session.execute(update(User).values(is_active=False))
+    await async_session.commit()
+    me = await client.get("/api/users/me", headers=auth_headers)
+    assert me.status_code == 403
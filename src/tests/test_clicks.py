@@ -0,0 +1,518 @@
+import json
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from src.db import get_session_factory
+from src.models.click import Click
+from src.models.dimension import Referrer, UserAgent
+from src.models.link import Link
+from src.models.trending import TrendingSlot
+from src.models.user import User
+from src.repositories.click import ClickRepository
+from src.repositories.click_partition import ClickPartitionRepository
+from src.repositories.link import LinkRepository
+from src.repositories.trending import TrendingRepository
+from src.services import click as click_service_module
+from src.services.click import ClickService
+from src.services import link as link_service_module
+from src.services.link import LinkService
+from src.services.click_buffer import click_buffer
+from src.services.trending import trending
+from src.utils.cache import user_cache
+from src.utils.heavy_hitters import SpaceSaving
+from src.utils.user_agent import user_agent_dimensions
+
+
+async def create_link(client: AsyncClient, headers: dict, url: str) -> dict:
+    response = await client.post(
+        "/api/links/create", json={"original_link": url}, headers=headers
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_redirect_records_click(
+    client: AsyncClient, auth_headers: dict, async_session: AsyncSession
+):
+    link = await create_link(client, auth_headers, "https://example.com/clicks")
+
+    for _ in range(2):
+        redirect = await client.get(
+            f"/r/{link['short_code']}",
+            headers={"user-agent": "pytest-agent", "referer": "https://ref.example"},
+        )
+        assert redirect.status_code == 307
+
+    response = await client.get(f"/api/clicks/{link['id']}", headers=auth_headers)
+    assert response.status_code == 200
+    clicks = response.json()
+    assert len(clicks) == 2
+    assert clicks[0]["user_agent"] == "pytest-agent"
+    assert clicks[0]["referrer"] == "https://ref.example"
+    # both clicks point at the same interned strings
+    assert await async_session.scalar(select(func.count()).select_from(UserAgent)) == 1
+    assert await async_session.scalar(select(func.count()).select_from(Referrer)) == 1
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_drains_on_stop(
+    client: AsyncClient,
+    auth_headers: dict,
+    engine: AsyncEngine,
+    async_session: AsyncSession,
+):
+    link = await create_link(client, auth_headers, "https://example.com/buffered")
+
+    click_buffer.start(get_session_factory(engine))
+    try:
+        for _ in range(5):
+            redirect = await client.get(f"/r/{link['short_code']}")
+            assert redirect.status_code == 307
+    finally:
+        await click_buffer.stop(timeout=10)
+
+    assert click_buffer.depth() == 0
+    total = await async_session.scalar(
+        select(func.count(Click.id)).where(Click.link_id == link["id"])
+    )
+    assert total == 5
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_skips_deleted_links(
+    client: AsyncClient,
+    auth_headers: dict,
+    engine: AsyncEngine,
+    async_session: AsyncSession,
+):
+    live = await create_link(client, auth_headers, "https://example.com/live")
+    gone = await create_link(client, auth_headers, "https://example.com/deleted")
+    orphaned = click_buffer.orphaned
+    for link in (live, gone, live):
+        click_buffer.enqueue(
+            {
+                "link_id": link["id"],
+                "clicked_at": datetime.now(timezone.utc),
+                "ip_address": "10.0.0.1",
+                "user_agent": None,
+                "referrer": None,
+                **user_agent_dimensions(None),
+            }
+        )
+    # deleted while its click waits in the buffer
+    response = await client.request(
+        "DELETE",
+        "/api/links/delete",
+        json={"original_link": gone["original_link"]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 204
+
+    click_buffer.start(get_session_factory(engine))
+    await click_buffer.stop(timeout=10)
+
+    assert click_buffer.orphaned == orphaned + 1
+    total = await async_session.scalar(
+        select(func.count(Click.id)).where(Click.link_id == live["id"])
+    )
+    assert total == 2
+
+
+@pytest.mark.asyncio
+async def test_export_clicks(client: AsyncClient, auth_headers: dict):
+    link = await create_link(client, auth_headers, "https://example.com/export")
+    for agent in ("agent-1", "agent-2", "agent-3"):
+        await client.get(f"/r/{link['short_code']}", headers={"user-agent": agent})
+
+    response = await client.get(
+        f"/api/clicks/{link['id']}/export", headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["user_agent"] for row in rows] == ["agent-1", "agent-2", "agent-3"]
+
+    response = await client.get(
+        f"/api/clicks/{link['id']}/export",
+        params={"format": "csv", "date_from": rows[1]["clicked_at"]},
+        headers=auth_headers,
+    )
+    lines = response.text.splitlines()
+    assert lines[0].startswith("id,link_id,clicked_at")
+    assert len(lines) == 3
+
+    response = await client.get("/api/links/export", headers=auth_headers)
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [
+        link["id"]
+    ]
+
+    response = await client.get("/api/clicks/0/export", headers=auth_headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_delete_link_with_clicks(
+    client: AsyncClient, auth_headers: dict, async_session: AsyncSession
+):
+    link = await create_link(client, auth_headers, "https://example.com/gone")
+    for _ in range(3):
+        await client.get(f"/r/{link['short_code']}")
+
+    response = await client.request(
+        "DELETE",
+        "/api/links/delete",
+        json={"original_link": link["original_link"]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 204
+    total = await async_session.scalar(
+        select(func.count(Click.id)).where(Click.link_id == link["id"])
+    )
+    assert total == 0
+
+
+@pytest.mark.asyncio
+async def test_purge_link_in_chunks(
+    client: AsyncClient,
+    auth_headers: dict,
+    engine: AsyncEngine,
+    async_session: AsyncSession,
+    monkeypatch,
+):
+    link = await create_link(client, auth_headers, "https://example.com/purged")
+    for _ in range(5):
+        await client.get(f"/r/{link['short_code']}")
+
+    monkeypatch.setattr(link_service_module.settings, "link_purge_chunk_size", 2)
+    await LinkService(LinkRepository()).purge_link(
+        get_session_factory(engine), link["id"], link["short_code"]
+    )
+
+    assert await async_session.get(Link, link["id"]) is None
+    assert (await client.get(f"/r/{link['short_code']}")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_summary_stats(client: AsyncClient, auth_headers: dict):
+    link = await create_link(client, auth_headers, "https://example.com/stats")
+    other = await create_link(client, auth_headers, "https://example.com/other")
+    firefox = "Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0"
+    for referrer in ("https://a.example", "https://a.example", "https://b.example"):
+        await client.get(
+            f"/r/{link['short_code']}",
+            headers={"referer": referrer, "user-agent": firefox},
+        )
+    await client.get(f"/r/{link['short_code']}")
+    await client.get(f"/r/{other['short_code']}")
+
+    response = await client.get(f"/api/clicks/stats/{link['id']}", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "total_clicks": 4,
+        "today_clicks": 4,
+        "unique_ips": 1,
+        # firefox and the client's own user agent, from one address
+        "unique_visitors": 2,
+        "unique_referrers": 2,
+        "top_referrers": {"https://a.example": 2, "https://b.example": 1},
+        "browsers": {"Firefox": 3, "Other": 1},
+    }
+
+    response = await client.get(
+        f"/api/clicks/stats/{link['id']}", params={"exact": True}, headers=auth_headers
+    )
+    assert response.json()["unique_ips"] == 1
+    assert response.json()["unique_visitors"] == 2
+
+    response = await client.get(
+        f"/api/clicks/stats/{link['id']}",
+        params={"date_to": "2020-01-01"},
+        headers=auth_headers,
+    )
+    assert response.json()["total_clicks"] == 0
+    assert response.json()["today_clicks"] == 4
+
+
+@pytest.mark.asyncio
+async def test_period_clicks(client: AsyncClient, auth_headers: dict):
+    link = await create_link(client, auth_headers, "https://example.com/period")
+    for _ in range(2):
+        await client.get(f"/r/{link['short_code']}")
+
+    url = f"/api/clicks/period/{link['id']}"
+    today = datetime.now(timezone.utc).date()
+    days = [(today - timedelta(days=n)).isoformat() for n in (2, 1, 0)]
+    response = await client.get(
+        url, params={"date_from": days[0], "date_to": days[2]}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "clicks_by_period": [
+            {"period": days[0], "count": 0},
+            {"period": days[1], "count": 0},
+            {"period": days[2], "count": 2},
+        ]
+    }
+
+    # served from the hourly rollups, shifted to the zone
+    zone = ZoneInfo("Asia/Tokyo")
+    local = datetime.now(zone).replace(minute=0, second=0, microsecond=0)
+    response = await client.get(
+        url,
+        params={
+            "date_from": local.date().isoformat(),
+            "date_to": local.date().isoformat(),
+            "granularity": "hour",
+            "tz": "Asia/Tokyo",
+        },
+        headers=auth_headers,
+    )
+    periods = response.json()["clicks_by_period"]
+    assert len(periods) == 24
+    assert {"period": local.isoformat(), "count": 2} in periods
+    assert sum(period["count"] for period in periods) == 2
+
+    for granularity, buckets in (("minute", 1440), ("month", 1)):
+        response = await client.get(
+            url,
+            params={
+                "date_from": days[2],
+                "date_to": days[2],
+                "granularity": granularity,
+            },
+            headers=auth_headers,
+        )
+        periods = response.json()["clicks_by_period"]
+        assert len(periods) == buckets
+        assert sum(period["count"] for period in periods) == 2
+
+    for params in (
+        {"granularity": "minute", "tz": "UTC"},
+        {"granularity": "day", "tz": "Mars/Olympus"},
+    ):
+        response = await client.get(
+            url,
+            params={"date_from": "2020-01-01", "date_to": days[2], **params},
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_links_stats(client: AsyncClient, auth_headers: dict):
+    links = [
+        await create_link(client, auth_headers, f"https://example.com/many/{n}")
+        for n in range(3)
+    ]
+    for n, link in enumerate(links):
+        for _ in range(n):
+            await client.get(f"/r/{link['short_code']}", headers={"referer": "r"})
+
+    response = await client.get(
+        "/api/clicks/stats", params={"limit": 2}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert [stats["link_id"] for stats in response.json()] == [
+        links[2]["id"],
+        links[1]["id"],
+    ]
+    assert response.json()[0] == {
+        "link_id": links[2]["id"],
+        "short_code": links[2]["short_code"],
+        "total_clicks": 2,
+        "today_clicks": 2,
+        "top_referrers": {"r": 2},
+    }
+    response = await client.get(
+        "/api/clicks/stats",
+        params={"limit": 2, "cursor": response.headers["x-next-cursor"]},
+        headers=auth_headers,
+    )
+    assert response.json() == [
+        {
+            "link_id": links[0]["id"],
+            "short_code": links[0]["short_code"],
+            "total_clicks": 0,
+            "today_clicks": 0,
+            "top_referrers": {},
+        }
+    ]
+    assert "x-next-cursor" not in response.headers
+
+    today = datetime.now(timezone.utc).date().isoformat()
+    response = await client.get(
+        "/api/clicks/period",
+        params={
+            "link_id": [links[1]["id"], links[2]["id"], 999],
+            "date_from": today,
+            "date_to": today,
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert [
+        (period["link_id"], period["clicks_by_period"]) for period in response.json()
+    ] == [
+        (links[2]["id"], [{"period": today, "count": 2}]),
+        (links[1]["id"], [{"period": today, "count": 1}]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_trending(
+    client: AsyncClient, auth_headers: dict, async_session: AsyncSession, monkeypatch
+):
+    # as if this worker had been up since before midnight
+    monkeypatch.setattr(trending, "_complete_since", 0.0)
+    link = await create_link(client, auth_headers, "https://example.com/hot")
+    other = await create_link(client, auth_headers, "https://example.com/warm")
+    for referrer in ("https://a", "https://a", "https://b", None):
+        headers = {"referer": referrer} if referrer else {}
+        await client.get(f"/r/{link['short_code']}", headers=headers)
+    await client.get(f"/r/{other['short_code']}")
+
+    response = await client.get("/api/clicks/trending", headers=auth_headers)
+    assert response.status_code == 403
+    await async_session.execute(update(User).values(is_superuser=True))
+    await async_session.commit()
+    user_cache.clear()
+    response = await client.get("/api/clicks/trending", headers=auth_headers)
+    assert response.json() == [
+        {"short_code": link["short_code"], "clicks": 4, "error": 0},
+        {"short_code": other["short_code"], "clicks": 1, "error": 0},
+    ]
+
+    # merged with what the other workers flushed, within the window
+    service = ClickService(ClickRepository())
+    assert await service.flush_trending(async_session) == 1
+    assert await service.flush_trending(async_session) == 0
+    another_worker = uuid.uuid4()
+    window_start = trending.window_started_at()
+    await TrendingRepository().save_slots(
+        async_session,
+        another_worker,
+        [
+            (
+                window_start,
+                SpaceSaving.from_items(10, [(other["short_code"], 5, 0), ("z", 2, 1)]),
+            ),
+            (
+                window_start - timedelta(seconds=1),
+                SpaceSaving.from_items(10, [(link["short_code"], 9, 0)]),
+            ),
+        ],
+    )
+    await async_session.commit()
+    response = await client.get("/api/clicks/trending", headers=auth_headers)
+    assert response.json() == [
+        {"short_code": other["short_code"], "clicks": 6, "error": 0},
+        {"short_code": link["short_code"], "clicks": 4, "error": 0},
+        {"short_code": "z", "clicks": 2, "error": 1},
+    ]
+    await service.flush_trending(async_session)
+    assert await async_session.scalar(select(func.count(TrendingSlot.worker_id))) == 2
+
+    # a click the tracker didn't see tells the two paths apart
+    await ClickService(ClickRepository()).register_click(
+        async_session, link["id"], None, None, "https://b"
+    )
+    monkeypatch.setattr(click_service_module.settings, "top_referrers_fast_path", True)
+    today = datetime.now(timezone.utc).date().isoformat()
+    response = await client.get(
+        f"/api/clicks/stats/{link['id']}",
+        params={"date_from": today},
+        headers=auth_headers,
+    )
+    assert response.json()["total_clicks"] == 5
+    assert response.json()["top_referrers"] == {"https://a": 2, "https://b": 1}
+
+
+@pytest.mark.asyncio
+async def test_stats_conditional_get(client: AsyncClient, auth_headers: dict):
+    link = await create_link(client, auth_headers, "https://example.com/polled")
+    await client.get(f"/r/{link['short_code']}")
+    url = f"/api/clicks/stats/{link['id']}"
+
+    response = await client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["total_clicks"] == 1
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"]
+
+    # served from the cache until the short TTL for today's ranges runs out
+    await client.get(f"/r/{link['short_code']}")
+    response = await client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = await client.get(
+        url, headers={**auth_headers, "If-None-Match": '"other"'}
+    )
+    assert response.status_code == 200
+    assert response.json()["total_clicks"] == 1
+
+    await client.request(
+        "DELETE",
+        "/api/links/delete",
+        json={"original_link": link["original_link"]},
+        headers=auth_headers,
+    )
+    response = await client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total_clicks"] == 0
+
+
+@pytest.mark.asyncio
+async def test_click_partition_maintenance(
+    client: AsyncClient,
+    auth_headers: dict,
+    engine: AsyncEngine,
+    async_session: AsyncSession,
+    monkeypatch,
+):
+    link = await create_link(client, auth_headers, "https://example.com/partitions")
+    service = ClickService(ClickRepository())
+    partitions = ClickPartitionRepository()
+    monkeypatch.setattr(click_service_module.settings, "click_partitions_ahead", 1)
+    try:
+        result = await service.maintain_partitions(
+            async_session, today=date(2020, 1, 9)
+        )
+        assert result["created"] == [date(2020, 1, 1), date(2020, 2, 1)]
+        await async_session.execute(
+            insert(Click).values(
+                link_id=link["id"],
+                clicked_at=datetime(2020, 1, 20, tzinfo=timezone.utc),
+            )
+        )
+        await async_session.commit()
+
+        monkeypatch.setattr(click_service_module.settings, "click_retention_months", 1)
+        result = await service.maintain_partitions(
+            async_session, today=date(2020, 3, 9)
+        )
+        assert result == {
+            "created": [date(2020, 3, 1), date(2020, 4, 1)],
+            "expired": [date(2020, 1, 1)],
+        }
+        assert await async_session.scalar(select(func.count()).select_from(Click)) == 0
+
+        # another worker's run in progress
+        async with AsyncSession(engine) as other:
+            assert await partitions.try_lock(other)
+            result = await service.maintain_partitions(
+                async_session, today=date(2020, 6, 9)
+            )
+            assert result == {"created": [], "expired": []}
+        assert not await partitions.detach(async_session, date(2019, 12, 1))
+    finally:
+        for month in await partitions.list_months(async_session):
+            if month.year == 2020:
+                await partitions.drop(async_session, month)
+        await async_session.commit()
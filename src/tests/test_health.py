@@ -18,3 +18,16 @@ async def test_readiness(client: AsyncClient):
     assert data["status"] == "ok"
     assert data["details"]["db_status"] == "ok"
     assert "db_resp_time" in data["details"]
+    assert set(data["details"]["pool_saturation"]) == {"main", "redirect"}
+    assert data["details"]["click_buffer"]["depth"] >= 0
+    assert "link_cache" in data["details"]["cache_hit_ratio"]
+
+
+@pytest.mark.asyncio
+async def test_metrics(client: AsyncClient):
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data["pools"]) == {"main", "redirect"}
+    assert "checked_out" in data["pools"]["redirect"]
+    assert "hit_ratio" in data["link_cache"]
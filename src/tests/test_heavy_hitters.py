@@ -0,0 +1,50 @@
+import random
+from collections import Counter
+from src.utils.heavy_hitters import SlidingTopK, SpaceSaving
+
+
+def test_space_saving_bounds():
+    rng = random.Random(7)
+    stream = [int(rng.paretovariate(1.1)) for _ in range(20_000)]
+    exact = Counter(stream)
+    summary = SpaceSaving(50)
+    for item in stream:
+        summary.add(item)
+
+    hitters = {hitter.item: hitter for hitter in summary.items()}
+    assert len(hitters) == 50
+    assert sum(hitter.count for hitter in hitters.values()) == len(stream)
+    for item, hitter in hitters.items():
+        assert hitter.count - hitter.error <= exact[item] <= hitter.count
+    # anything counted more than n / capacity times is kept
+    assert {item for item, n in exact.items() if n > len(stream) / 50} <= set(hitters)
+
+
+def test_space_saving_evicts_oldest_smallest():
+    summary = SpaceSaving(2)
+    summary.add("a", 3)
+    summary.add("b")
+    summary.add("c")
+    assert sorted(summary.items()) == [("a", 3, 0), ("c", 2, 1)]
+    summary.add("d", 5)
+    assert sorted(summary.items()) == [("a", 3, 0), ("d", 7, 2)]
+
+
+def test_sliding_top_k_merged_bounds():
+    rng = random.Random(11)
+    top_k = SlidingTopK(capacity=20, slot_seconds=60, slots=5)
+    exact = Counter()
+    for second in range(300):
+        for _ in range(20):
+            item = int(rng.paretovariate(1.0))
+            # the hot items move from slot to slot
+            item = item + second // 60 if item > 3 else item
+            top_k.add(item, now=second)
+            exact[item] += 1
+
+    hitters = top_k.top(100, now=299)
+    assert [hitter.count for hitter in hitters] == sorted(
+        (hitter.count for hitter in hitters), reverse=True
+    )
+    for item, count, error in hitters:
+        assert count - error <= exact[item] <= count
@@ -0,0 +1,33 @@
+import pytest
+from src.utils.hll import STANDARD_ERROR, HyperLogLog, visitor_hash
+
+
+def _sketch(values) -> HyperLogLog:
+    sketch = HyperLogLog()
+    sketch.update(visitor_hash(f"10.{value}", "ua") for value in values)
+    return sketch
+
+
+@pytest.mark.parametrize("cardinality", [10, 1_000, 10_000, 100_000])
+def test_estimate_within_bound(cardinality: int):
+    estimate = _sketch(range(cardinality)).estimate()
+    # 3 standard errors: fails about once in 370 hash functions
+    assert abs(estimate - cardinality) <= 3 * STANDARD_ERROR * cardinality + 1
+
+
+def test_repeats_do_not_count():
+    sketch = _sketch(range(500))
+    assert not sketch.update(visitor_hash(f"10.{value}", "ua") for value in range(500))
+    assert sketch.estimate() == _sketch(range(500)).estimate()
+    assert HyperLogLog().estimate() == 0
+
+
+def test_merge_equals_union():
+    first, second = _sketch(range(0, 30_000)), _sketch(range(20_000, 50_000))
+    union = _sketch(range(50_000))
+
+    merged = HyperLogLog.merged([first.to_bytes(), second.to_bytes()])
+    assert merged.to_bytes() == union.to_bytes()
+    assert merged.estimate() == union.estimate()
+    assert HyperLogLog.merged([first.to_bytes()]).to_bytes() == first.to_bytes()
+    assert HyperLogLog.merged([]).estimate() == 0
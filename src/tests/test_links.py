@@ -0,0 +1,420 @@
+import asyncio
+import json
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from src.api import links as links_api
+from src.api.fast_redirect import RedirectApp
+from src.models.click import Click
+from src.models.link import ArchivedLink
+from src.models.rollup import VisitorSketchDaily
+from src.repositories.click import ClickRepository
+from src.repositories.link import LinkRepository
+from src.services import link as link_service_module
+from src.services.click import ClickService
+from src.services.link import LinkService
+from src.services.invalidation import invalidation_bus
+from src.services.link_filter import link_filter
+from src.utils.cache import link_cache
+from src.utils.hll import HyperLogLog
+from src.utils.link_shortener import _permute
+
+
+@pytest.mark.asyncio
+async def test_create_link(client: AsyncClient, auth_headers: dict):
+    response = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/page"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["original_link"] == "https://example.com/page"
+    assert data["short_url"].endswith(data["short_code"])
+
+    again = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/page"},
+        headers=auth_headers,
+    )
+    assert again.status_code == 201
+    assert again.json()["short_code"] == data["short_code"]
+
+
+@pytest.mark.asyncio
+async def test_redirect_is_cached(client: AsyncClient, auth_headers: dict):
+    link_cache.clear()
+    response = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/cached"},
+        headers=auth_headers,
+    )
+    short_code = response.json()["short_code"]
+
+    hits = link_cache.hits
+    for _ in range(3):
+        redirect = await client.get(f"/r/{short_code}")
+        assert redirect.status_code == 307
+        assert redirect.headers["location"] == "https://example.com/cached"
+    assert link_cache.hits == hits + 2
+
+
+@pytest.mark.asyncio
+async def test_redirect_after_delete(client: AsyncClient, auth_headers: dict):
+    response = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/deleted"},
+        headers=auth_headers,
+    )
+    short_code = response.json()["short_code"]
+    assert (await client.get(f"/r/{short_code}")).status_code == 307
+
+    delete = await client.request(
+        "DELETE",
+        "/api/links/delete",
+        json={"original_link": "https://example.com/deleted"},
+        headers=auth_headers,
+    )
+    assert delete.status_code == 204
+    assert (await client.get(f"/r/{short_code}")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_redirect_unknown_code(client: AsyncClient):
+    response = await client.get("/r/zzzzzz")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_fast_redirect_app(
+    client: AsyncClient,
+    auth_headers: dict,
+    engine: AsyncEngine,
+    async_session: AsyncSession,
+):
+    response = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/fast"},
+        headers=auth_headers,
+    )
+    link = response.json()
+    response = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/bystander"},
+        headers=auth_headers,
+    )
+    bystander = response.json()
+    await client.get(f"/r/{bystander['short_code']}")
+
+    async with AsyncClient(
+        transport=ASGITransport(app=RedirectApp(engine)), base_url="http://test"
+    ) as fast:
+        redirect = await fast.get(
+            f"/{link['short_code']}", headers={"user-agent": "fast-agent"}
+        )
+        assert redirect.status_code == 307
+        assert redirect.headers["location"] == "https://example.com/fast"
+        # a new visitor the same day updates the existing sketch
+        other = await fast.get(
+            f"/{link['short_code']}", headers={"user-agent": "other-agent"}
+        )
+        assert other.status_code == 307
+
+        missing = await fast.get("/zzzzzz")
+        assert missing.status_code == 404
+        assert missing.json() == (await client.get("/r/zzzzzz")).json()
+
+        assert (await fast.post(f"/{link['short_code']}")).status_code == 405
+
+    clicks = await client.get(f"/api/clicks/{link['id']}", headers=auth_headers)
+    assert [click["user_agent"] for click in clicks.json()] == [
+        "other-agent",
+        "fast-agent",
+    ]
+    sketches = await async_session.execute(
+        select(VisitorSketchDaily.link_id, VisitorSketchDaily.registers)
+    )
+    assert {
+        link_id: HyperLogLog(registers).estimate() for link_id, registers in sketches
+    } == {link["id"]: 2, bystander["id"]: 1}
+    stats = await client.get(f"/api/clicks/stats/{link['id']}", headers=auth_headers)
+    assert stats.json()["unique_visitors"] == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_codes_skip_database(
+    client: AsyncClient, auth_headers: dict, async_session: AsyncSession
+):
+    link_filter.clear()
+    assert (await client.get("/r/bad!code")).status_code == 404
+    assert (await client.get("/r/toolongcode")).status_code == 404
+    assert (await client.get("/r/abcdef")).status_code == 404
+    assert not link_filter.might_exist("abcdef")
+
+    response = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/bloom"},
+        headers=auth_headers,
+    )
+    short_code = response.json()["short_code"]
+
+    await link_filter.rebuild(async_session)
+    assert link_filter.might_exist(short_code)
+    assert (await client.get(f"/r/{short_code}")).status_code == 307
+    link_filter.clear()
+
+
+@pytest.mark.asyncio
+async def test_invalidation_bus_evicts_cached_links(
+    client: AsyncClient, auth_headers: dict, async_session: AsyncSession
+):
+    response = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/notify"},
+        headers=auth_headers,
+    )
+    short_code = response.json()["short_code"]
+    assert (await client.get(f"/r/{short_code}")).status_code == 307
+    assert short_code in link_cache
+
+    invalidation_bus.start()
+    try:
+        received = invalidation_bus.received
+        for _ in range(50):
+            # the listener connects asynchronously; keep notifying until it hears us
+            await invalidation_bus.publish(
+                async_session, "link_deleted", short_code=short_code
+            )
+            await async_session.commit()
+            await asyncio.sleep(0.1)
+            if invalidation_bus.received > received:
+                break
+    finally:
+        await invalidation_bus.stop()
+
+    assert short_code not in link_cache
+
+
+@pytest.mark.asyncio
+async def test_short_codes_are_unique(client: AsyncClient, auth_headers: dict):
+    codes = set()
+    for i in range(20):
+        response = await client.post(
+            "/api/links/create",
+            json={"original_link": f"https://example.com/unique/{i}"},
+            headers=auth_headers,
+        )
+        assert response.status_code == 201
+        codes.add(response.json()["short_code"])
+    assert len(codes) == 20
+
+
+def test_short_code_permutation_is_keyed():
+    # a bijection whatever the key, and a different one per key
+    values = range(1 << 12)
+    first = [_permute(value, 12, key=b"first") for value in values]
+    second = [_permute(value, 12, key=b"second") for value in values]
+    assert sorted(first) == sorted(second) == list(values)
+    assert first != second
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_links(client: AsyncClient, auth_headers: dict):
+    existing = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/bulk/0"},
+        headers=auth_headers,
+    )
+    items = [{"original_link": f"https://example.com/bulk/{i}"} for i in range(3)]
+    items += [{"original_link": "https://example.com/bulk/1"}, {"nope": 1}]
+
+    response = await client.post("/api/links/bulk", json=items, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = sorted(
+        (json.loads(line) for line in response.text.splitlines()),
+        key=lambda result: result["index"],
+    )
+    assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+    assert results[0]["short_code"] == existing.json()["short_code"]
+    assert [result["created"] for result in results[:4]] == [
+        False,
+        True,
+        True,
+        False,
+    ]
+    assert results[3]["short_code"] == results[1]["short_code"]
+    assert "error" in results[4]
+    assert len({result["short_code"] for result in results[:3]}) == 3
+
+    ndjson = "\n".join(json.dumps(item) for item in items[:3]) + "\n{broken\n"
+    response = await client.post(
+        "/api/links/bulk",
+        content=ndjson,
+        headers={**auth_headers, "content-type": "application/x-ndjson"},
+    )
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert len(results) == 4
+    assert not any(result.get("created") for result in results)
+    assert sum("error" in result for result in results) == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_size_limits(
+    client: AsyncClient, auth_headers: dict, monkeypatch
+):
+    monkeypatch.setattr(links_api.settings, "bulk_max_bytes", 4096)
+    monkeypatch.setattr(links_api.settings, "bulk_max_line_bytes", 256)
+    ndjson_headers = {**auth_headers, "content-type": "application/x-ndjson"}
+
+    async def chunked(*parts: bytes):
+        for part in parts:
+            yield part
+
+    # one line without a newline, streamed with no Content-Length
+    long_line = json.dumps({"original_link": "https://example.com/" + "a" * 300})
+    response = await client.post(
+        "/api/links/bulk",
+        content=chunked(long_line[:100].encode(), long_line[100:].encode()),
+        headers=ndjson_headers,
+    )
+    assert response.status_code == 413
+
+    item = json.dumps({"original_link": "https://example.com/x"}) + "\n"
+    response = await client.post(
+        "/api/links/bulk",
+        content=chunked(*[item.encode()] * 200),
+        headers=ndjson_headers,
+    )
+    assert response.status_code == 413
+
+    items = [{"original_link": f"https://example.com/{i}"} for i in range(200)]
+    response = await client.post("/api/links/bulk", json=items, headers=auth_headers)
+    assert response.status_code == 413
+
+    response = await client.post(
+        "/api/links/bulk", content=item * 3, headers=ndjson_headers
+    )
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 3
+
+
+@pytest.mark.asyncio
+async def test_links_keyset_pagination(client: AsyncClient, auth_headers: dict):
+    items = [{"original_link": f"https://example.com/page/{i}"} for i in range(7)]
+    await client.post("/api/links/bulk", json=items, headers=auth_headers)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(
+            "/api/links/all", params=params, headers=auth_headers
+        )
+        assert response.status_code == 200
+        seen += [link["short_code"] for link in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 7
+
+    response = await client.get(
+        "/api/links/all", params={"cursor": "garbage"}, headers=auth_headers
+    )
+    assert response.status_code == 400
+
+    response = await client.get(
+        "/api/links/all", params={"limit": 0}, headers=auth_headers
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_link_expiry_and_click_cap(client: AsyncClient, auth_headers: dict):
+    expired = await client.post(
+        "/api/links/create",
+        json={
+            "original_link": "https://example.com/expired",
+            "expires_at": "2020-01-01T00:00:00",
+        },
+        headers=auth_headers,
+    )
+    assert (await client.get(f"/r/{expired.json()['short_code']}")).status_code == 410
+
+    capped = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/capped", "max_clicks": 2},
+        headers=auth_headers,
+    )
+    short_code = capped.json()["short_code"]
+    statuses = [(await client.get(f"/r/{short_code}")).status_code for _ in range(3)]
+    assert statuses == [307, 307, 410]
+
+    uncapped = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/counted"},
+        headers=auth_headers,
+    )
+    for _ in range(3):
+        await client.get(f"/r/{uncapped.json()['short_code']}")
+
+    for link, count in ((capped, 2), (uncapped, 3)):
+        info = await client.get(
+            f"/api/links/info/{link.json()['short_code']}", headers=auth_headers
+        )
+        assert info.json()["click_count"] == count
+
+
+@pytest.mark.asyncio
+async def test_sweeper_archives_expired_links(
+    client: AsyncClient, auth_headers: dict, async_session: AsyncSession, monkeypatch
+):
+    response = await client.post(
+        "/api/links/create",
+        json={
+            "original_link": "https://example.com/archived",
+            "expires_at": "2020-01-01T00:00:00Z",
+        },
+        headers=auth_headers,
+    )
+    link = response.json()
+    await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/kept"},
+        headers=auth_headers,
+    )
+
+    # clicks from before it expired
+    for _ in range(5):
+        await ClickService(ClickRepository()).register_click(
+            async_session, link["id"], "10.0.0.1", None, None
+        )
+
+    monkeypatch.setattr(link_service_module.settings, "link_archive_after_days", 0)
+    monkeypatch.setattr(link_service_module.settings, "link_purge_chunk_size", 2)
+    repository = LinkRepository()
+    chunks = []
+    delete_clicks_chunk = repository.delete_clicks_chunk
+
+    async def record_chunk(*args, **kwargs):
+        chunks.append(await delete_clicks_chunk(*args, **kwargs))
+        return chunks[-1]
+
+    monkeypatch.setattr(repository, "delete_clicks_chunk", record_chunk)
+    archived = await LinkService(repository).archive_expired_links(async_session)
+    assert archived == 1
+    # deleted in short transactions, not through the archiving DELETE
+    assert chunks == [2, 2, 1]
+    assert (
+        await async_session.scalar(
+            select(func.count(Click.id)).where(Click.link_id == link["id"])
+        )
+        == 0
+    )
+
+    assert await async_session.get(ArchivedLink, link["id"]) is not None
+    info = await client.get(
+        f"/api/links/info/{link['short_code']}", headers=auth_headers
+    )
+    assert info.status_code == 404
+    assert (await client.get(f"/r/{link['short_code']}")).status_code == 404
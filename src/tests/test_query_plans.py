@@ -0,0 +1,168 @@
+import json
+import uuid
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Tuple
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, func, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from src.models.click import Click
+from src.repositories.click import ClickRepository
+from src.repositories.link import LinkRepository
+from src.repositories.rollup import RollupRepository
+from src.services.click import ClickService
+
+SINCE = datetime.now(timezone.utc) - timedelta(days=7)
+
+
+@asynccontextmanager
+async def captured_statements(engine: AsyncEngine):
+    """(sql, parameters) of every statement run on `engine` in the block"""
+    statements: List[Tuple[str, tuple]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+
+def click_scans(plan: dict) -> List[Tuple[str, str]]:
+    """(node type, relation) for every scan of a clicks partition"""
+    scans = []
+    # ModifyTable is the DELETE or UPDATE itself, not a scan
+    if plan.get("Relation Name", "").startswith("clicks") and (
+        plan["Node Type"] != "ModifyTable"
+    ):
+        scans.append((plan["Node Type"], plan["Relation Name"]))
+    for child in plan.get("Plans", []):
+        scans += click_scans(child)
+    return scans
+
+
+async def explain(db: AsyncSession, statement: str, parameters) -> List[Tuple]:
+    # with sequential and bitmap scans priced out, a shape no index can serve
+    # still shows up as a Seq Scan
+    await db.execute(text("SET LOCAL enable_seqscan = off"))
+    await db.execute(text("SET LOCAL enable_bitmapscan = off"))
+    conn = await db.connection()
+    result = await conn.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {statement}", parameters
+    )
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    await db.rollback()
+    return click_scans(plan[0]["Plan"])
+
+
+async def assert_scans(
+    db: AsyncSession, statements: List[Tuple[str, tuple]], allowed: set
+) -> None:
+    """Every scan of clicks by the statements is one of `allowed`"""
+    scanned = False
+    for statement, parameters in statements:
+        scans = await explain(db, statement, parameters)
+        assert {node for node, _ in scans} <= allowed, (statement, scans)
+        scanned = scanned or bool(scans)
+    assert scanned
+
+
+@pytest.fixture
+async def link_id(client: AsyncClient, auth_headers: dict) -> int:
+    response = await client.post(
+        "/api/links/create",
+        json={"original_link": "https://example.com/plans"},
+        headers=auth_headers,
+    )
+    link = response.json()
+    for _ in range(3):
+        await client.get(f"/r/{link['short_code']}", headers={"referer": "https://r"})
+    return link["id"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "call",
+    [
+        lambda db, repo, filters: repo.aggregate_records(db, Click.id, filters),
+        lambda db, repo, filters: repo.aggregate_records(
+            db, Click.ip_address, filters, distinct_flag=True
+        ),
+        lambda db, repo, filters: repo.aggregate_records(
+            db,
+            Click.referrer_id,
+            filters,
+            group_by=Click.referrer_id,
+            order_by=func.count(Click.referrer_id).desc(),
+            limit=5,
+        ),
+        lambda db, repo, filters: repo.aggregate_records(
+            db, Click.user_agent_id, filters, group_by=Click.user_agent_id
+        ),
+        lambda db, repo, filters: repo.aggregate_records(
+            db,
+            func.date_trunc("day", Click.clicked_at).label("period"),
+            filters,
+            group_by="period",
+            order_by="period",
+        ),
+    ],
+    ids=["count", "distinct_ips", "top_referrers", "user_agents", "per_day"],
+)
+async def test_aggregate_records_are_index_only(
+    engine: AsyncEngine, async_session: AsyncSession, link_id: int, call
+):
+    filters = [Click.link_id == link_id, Click.clicked_at >= SINCE]
+    async with captured_statements(engine) as statements:
+        await call(async_session, ClickRepository(), filters)
+    await assert_scans(async_session, statements, {"Index Only Scan"})
+
+
+@pytest.mark.asyncio
+async def test_stats_queries_use_indexes(
+    engine: AsyncEngine,
+    async_session: AsyncSession,
+    client: AsyncClient,
+    auth_headers: dict,
+    link_id: int,
+):
+    user = await client.get("/api/users/me", headers=auth_headers)
+    user_id = uuid.UUID(user.json()["id"])
+    service = ClickService(ClickRepository())
+    week_ago = SINCE.date()
+
+    async with captured_statements(engine) as statements:
+        await service.get_summary_from_clicks(
+            async_session, user_id, link_id, date_from=week_ago
+        )
+        await RollupRepository().get_summary_rows(
+            async_session,
+            user_id,
+            link_id,
+            day_from=week_ago,
+            day_to=None,
+            today=date.today(),
+            exact=True,
+        )
+    await assert_scans(async_session, statements, {"Index Only Scan"})
+
+    async with captured_statements(engine) as statements:
+        await service.get_link_clicks(async_session, user_id, link_id, limit=2)
+    await assert_scans(async_session, statements, {"Index Scan"})
+
+
+@pytest.mark.asyncio
+async def test_click_purge_uses_indexes(
+    engine: AsyncEngine, async_session: AsyncSession, link_id: int
+):
+    async with captured_statements(engine) as statements:
+        assert (
+            await LinkRepository().delete_clicks_chunk(async_session, link_id, 2) == 2
+        )
+    await assert_scans(async_session, statements, {"Index Only Scan", "Index Scan"})
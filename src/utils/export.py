@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Literal, Sequence
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def as_utc(value: datetime | None) -> datetime | None:
+    """Query parameters without an offset are taken as UTC"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def encode_rows(
+    rows: AsyncIterator[Sequence],
+    fields: Sequence[str],
+    format: ExportFormat,
+    batch_size: int = 1000,
+) -> AsyncIterator[str]:
+    """Serialize rows as NDJSON or CSV, `batch_size` rows per yielded chunk so
+    the response isn't written one tiny frame per row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if format == "csv" else None
+    if writer is not None:
+        writer.writerow(fields)
+
+    pending = 0
+    async for row in rows:
+        if writer is not None:
+            writer.writerow(
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            )
+        else:
+            buffer.write(json.dumps(dict(zip(fields, row)), default=_json_default))
+            buffer.write("\n")
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(
+    chunks: AsyncIterator[str], db: AsyncSession, format: ExportFormat, name: str
+) -> StreamingResponse:
+    async def body() -> AsyncIterator[str]:
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # the dependency's cleanup has already run by the time the body
+            # streams; this returns the connection holding the cursor
+            await db.close()
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
+    )
@@ -0,0 +1,150 @@
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Iterable, List, NamedTuple, Tuple
+
+
+class HeavyHitter(NamedTuple):
+    item: Hashable
+    # overestimates the true count by at most `error`
+    count: int
+    error: int
+
+
+class SpaceSaving:
+    """Space-Saving summary (Metwally et al.) of the `capacity` most frequent
+    items of a stream. Any item seen more than n / capacity times out of n is
+    in it; a new item takes over the smallest counter and inherits its count
+    as error.
+
+    Items are grouped by count, as in the paper's Stream-Summary, so that an
+    update costs O(count) rather than a scan of every counter."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._counts: Dict[Hashable, int] = {}
+        self._errors: Dict[Hashable, int] = {}
+        # count -> its items, oldest first (dicts keep insertion order)
+        self._buckets: Dict[int, Dict[Hashable, None]] = {}
+        self._min = 0
+        # items counted so far
+        self.total = 0
+
+    @classmethod
+    def from_items(
+        cls, capacity: int, items: Iterable[Tuple[Hashable, int, int]]
+    ) -> "SpaceSaving":
+        """A summary with the given (item, count, error) counters, as returned
+        by items()"""
+        summary = cls(capacity)
+        for item, count, error in items:
+            summary._counts[item] = count
+            summary._errors[item] = error
+            summary._buckets.setdefault(count, {})[item] = None
+        summary._min = min(summary._buckets, default=0)
+        # every count goes to exactly one counter
+        summary.total = sum(summary._counts.values())
+        return summary
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._counts
+
+    def add(self, item: Hashable, count: int = 1) -> None:
+        self.total += count
+        if item in self._counts:
+            old = self._counts[item]
+            self._unlink(item, old)
+        elif len(self._counts) >= self.capacity:
+            # the oldest of the smallest counters
+            old = self._min
+            victim = next(iter(self._buckets[old]))
+            self._unlink(victim, old)
+            del self._counts[victim], self._errors[victim]
+            self._errors[item] = old
+        else:
+            old = 0
+            self._errors[item] = 0
+        new = old + count
+        self._counts[item] = new
+        self._buckets.setdefault(new, {})[item] = None
+        if len(self._counts) == 1 or new < self._min:
+            self._min = new
+        elif old == self._min and old not in self._buckets:
+            # the next smallest count is at most `new`
+            self._min = next(c for c in range(old + 1, new + 1) if c in self._buckets)
+
+    def _unlink(self, item: Hashable, count: int) -> None:
+        bucket = self._buckets[count]
+        del bucket[item]
+        if not bucket:
+            del self._buckets[count]
+
+    @property
+    def min_count(self) -> int:
+        """Most times an item not in the summary can have been seen"""
+        return self._min if len(self._counts) >= self.capacity else 0
+
+    def items(self) -> List[HeavyHitter]:
+        return [
+            HeavyHitter(item, count, self._errors[item])
+            for item, count in self._counts.items()
+        ]
+
+
+class SlidingTopK:
+    """Space-Saving summaries of consecutive `slot_seconds` slots, aligned on
+    the epoch (slots of a day or an hour start at UTC midnight or on the
+    hour). Queries merge the last `slots` of them, or those since a time."""
+
+    def __init__(self, capacity: int, slot_seconds: int, slots: int):
+        self.capacity = capacity
+        self.slot_seconds = slot_seconds
+        self._slots: Deque[Tuple[int, SpaceSaving]] = deque(maxlen=slots)
+
+    def add(self, item: Hashable, count: int = 1, now: float | None = None) -> None:
+        index = int((time.time() if now is None else now) // self.slot_seconds)
+        if not self._slots or self._slots[-1][0] != index:
+            self._slots.append((index, SpaceSaving(self.capacity)))
+        self._slots[-1][1].add(item, count)
+
+    def slots(
+        self, since: float | None = None, now: float | None = None
+    ) -> List[Tuple[int, SpaceSaving]]:
+        """(slot index, summary) of the slots in the window, or since `since`"""
+        now = time.time() if now is None else now
+        first = int(now // self.slot_seconds) - self._slots.maxlen + 1
+        if since is not None:
+            first = max(first, int(since // self.slot_seconds))
+        return [(index, summary) for index, summary in self._slots if index >= first]
+
+    def top(
+        self, k: int, since: float | None = None, now: float | None = None
+    ) -> List[HeavyHitter]:
+        """The k items counted most in the window (or since `since`)"""
+        return merge_top([summary for _, summary in self.slots(since, now)], k)
+
+
+def merge_top(summaries: Iterable[SpaceSaving], k: int) -> List[HeavyHitter]:
+    """The k items counted most over summaries of disjoint streams, most
+    counted first. Counts are upper bounds and errors add up: an item missing
+    from a full summary may have been evicted from it, after up to that
+    summary's smallest count."""
+    summaries = list(summaries)
+    counts: Dict[Hashable, int] = {}
+    errors: Dict[Hashable, int] = {}
+    for summary in summaries:
+        for item, count, error in summary.items():
+            counts[item] = counts.get(item, 0) + count
+            errors[item] = errors.get(item, 0) + error
+    for summary in summaries:
+        missing = summary.min_count
+        if not missing:
+            continue
+        for item in counts:
+            if item not in summary:
+                counts[item] += missing
+                errors[item] += missing
+    ranked = sorted(counts, key=lambda item: (-counts[item], str(item)))
+    return [HeavyHitter(item, counts[item], errors[item]) for item in ranked[:k]]
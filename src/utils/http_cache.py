@@ -0,0 +1,60 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, NamedTuple
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+
+class CachedResult(NamedTuple):
+    """A JSON-ready response body with its validators"""
+
+    body: Any
+    etag: str
+    last_modified: datetime
+
+    @classmethod
+    def build(cls, body: Any) -> "CachedResult":
+        # same body, same tag: a recomputed but unchanged result still matches
+        payload = json.dumps(body, sort_keys=True, separators=(",", ":"))
+        digest = hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+        # HTTP dates have second precision
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        return cls(body, f'"{digest}"', now)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _not_modified(request: Request, result: CachedResult) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # takes precedence over If-Modified-Since
+        return etag_matches(if_none_match, result.etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return result.last_modified <= since
+
+
+def conditional_response(request: Request, result: CachedResult) -> Response:
+    """`result` as JSON, or an empty 304 when the client's copy is current"""
+    headers = {
+        "ETag": result.etag,
+        "Last-Modified": format_datetime(result.last_modified, usegmt=True),
+        # clients keep their copy but revalidate on every poll
+        "Cache-Control": "private, no-cache",
+    }
+    if _not_modified(request, result):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(result.body, headers=headers)
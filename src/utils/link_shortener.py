@@ -1,10 +1,72 @@
+import hashlib
 import secrets
 import string
 from src.config import get_settings
 
 settings = get_settings()
 
+ALPHABET = string.ascii_letters + string.digits + "-_"
+_ALPHABET_SET = frozenset(ALPHABET)
+
+
+def build_short_url(short_code: str) -> str:
+    prefix_part = f"/{settings.redirect_prefix}" if settings.redirect_prefix else ""
+    return f"{settings.base_url}{prefix_part}/{short_code}"
+
+
+def hash_url(original_link: str) -> bytes:
+    """SHA-256 of the URL as stored (already normalized by `HttpUrl`); the
+    backfill migration computes the same value with Postgres' sha256()"""
+    return hashlib.sha256(original_link.encode()).digest()
+
 
 def gen_short_code(length: int = settings.short_code_length) -> str:
-    alphabet = string.ascii_letters + string.digits + "-_"
-    return "".join(secrets.choice(alphabet) for _ in range(length))
+    return "".join(secrets.choice(ALPHABET) for _ in range(length))
+
+
+def is_valid_short_code(code: str, length: int = settings.short_code_length) -> bool:
+    """Whether `code` has the shape of the codes this service hands out"""
+    return len(code) == length and _ALPHABET_SET.issuperset(code)
+
+
+# keys the id -> code permutation; without the key, codes can't be mapped
+# back to ids or enumerated
+_PERMUTATION_KEY = hashlib.blake2b(
+    (settings.short_code_secret or settings.secret_key).encode(),
+    digest_size=32,
+    person=b"short-codes",
+).digest()
+_ROUNDS = 4
+
+
+def _permute(value: int, bits: int, key: bytes = _PERMUTATION_KEY) -> int:
+    # balanced Feistel network with keyed BLAKE2b as round function: a
+    # bijection on `bits`-bit values whatever the round function, and a
+    # pseudorandom permutation for four rounds
+    half = bits // 2
+    mask = (1 << half) - 1
+    left, right = value >> half, value & mask
+    for round_ in range(_ROUNDS):
+        digest = hashlib.blake2b(
+            bytes([round_]) + right.to_bytes(8, "big"), key=key, digest_size=8
+        ).digest()
+        left, right = right, left ^ (int.from_bytes(digest, "big") & mask)
+    return (left << half) | right
+
+
+def encode_short_code(value: int, length: int = settings.short_code_length) -> str:
+    """Map an integer id to a unique fixed-length code over ALPHABET.
+
+    Ids go through a permutation keyed with SHORT_CODE_SECRET (SECRET_KEY by
+    default), so codes can't be guessed from neighbouring ones or by
+    encoding 1..N.
+    """
+    bits = 6 * length  # len(ALPHABET) == 64, so always an even number
+    if not 0 <= value < 1 << bits:
+        raise ValueError(f"Id {value} doesn't fit in a {length}-character code")
+    value = _permute(value, bits)
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 64)
+        chars.append(ALPHABET[index])
+    return "".join(reversed(chars))
@@ -1,25 +1,53 @@
+import logging
 import re
 import time
 from typing import Dict
-import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
 from src.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 
 def normalize_dsn(dsn: str) -> str:
     return re.sub(r"^(postgresql|postgres)\+[^:]+", r"\1", dsn)
 
 
-async def check_db() -> Dict:
-    try:
-        start = time.perf_counter()
-        dsn = normalize_dsn(settings.db_url_str)
-        conn = await asyncpg.connect(dsn)
-        await conn.execute("SELECT 1;")
-        await conn.close()
-        duration = time.perf_counter() - start
-        return {"db_status": "ok", "db_resp_time": f"{round(duration * 1000, 2)} ms"}
-    except Exception as e:
-        print(e)
-        return {"db_status": "error", "db_resp_time": "0.00 ms"}
+class DBProbe:
+    """`SELECT 1` over a pooled connection, cached for `ttl` seconds so frequent
+    probes from many pods don't turn into database load"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._result: Dict | None = None
+        self._checked_at = 0.0
+
+    async def check(self, engine: AsyncEngine) -> Dict:
+        now = time.monotonic()
+        if self._result is not None and now - self._checked_at < self.ttl:
+            return self._result
+
+        try:
+            start = time.perf_counter()
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            duration = time.perf_counter() - start
+            result = {
+                "db_status": "ok",
+                "db_resp_time": f"{round(duration * 1000, 2)} ms",
+            }
+        except Exception:
+            logger.exception("Database readiness check failed")
+            result = {"db_status": "error", "db_resp_time": "0.00 ms"}
+
+        self._result = result
+        self._checked_at = time.monotonic()
+        return result
+
+
+db_probe = DBProbe(ttl=settings.health_cache_ttl_seconds)
+
+
+async def check_db(engine: AsyncEngine) -> Dict:
+    return await db_probe.check(engine)
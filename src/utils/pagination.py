@@ -0,0 +1,36 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple, TypeVar
+from src.exceptions import InvalidCursorException
+
+T = TypeVar("T")
+
+
+def encode_cursor(timestamp: datetime, id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(id)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursorException("Invalid cursor")
+
+
+def paginate(
+    rows: List[T], limit: int, timestamp_attr: str
+) -> Tuple[List[T], Optional[str]]:
+    """Split `limit + 1` rows fetched in keyset order into the page and the
+    cursor for the next one (None on the last page)"""
+    if limit <= 0:
+        return [], None
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, timestamp_attr), last.id)
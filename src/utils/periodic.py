@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Runs `func` every `interval` seconds in the background until stopped"""
+
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        func: Callable[[], Awaitable[None]],
+        run_immediately: bool = False,
+    ):
+        self.name = name
+        self.interval = interval
+        self._func = func
+        self._run_immediately = run_immediately
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        if not self._run_immediately:
+            await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await self._func()
+            except Exception:
+                logger.exception("Periodic task %s failed", self.name)
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,93 @@
+from typing import NamedTuple, Optional
+from user_agents import parse
+from src.config import get_settings
+from src.utils.cache import LRUTTLCache
+
+settings = get_settings()
+
+# Dimension values stored on clicks as their index in these tuples: append
+# only, never reorder. Families that aren't listed are stored as 0 ("Other").
+BROWSERS = (
+    "Other",
+    "Chrome",
+    "Chrome Mobile",
+    "Chrome Mobile iOS",
+    "Chrome Mobile WebView",
+    "Firefox",
+    "Firefox Mobile",
+    "Firefox iOS",
+    "Safari",
+    "Mobile Safari",
+    "Mobile Safari UI/WKWebView",
+    "Edge",
+    "Edge Mobile",
+    "Opera",
+    "Opera Mobile",
+    "Samsung Internet",
+    "IE",
+    "Yandex Browser",
+    "UC Browser",
+    "Facebook",
+    "Instagram",
+    "Googlebot",
+    "bingbot",
+    "curl",
+    "Python Requests",
+)
+OPERATING_SYSTEMS = (
+    "Other",
+    "Windows",
+    "Mac OS X",
+    "iOS",
+    "Android",
+    "Linux",
+    "Ubuntu",
+    "Chrome OS",
+    "Fedora",
+)
+DEVICES = ("Other", "Desktop", "Mobile", "Tablet", "Bot")
+
+_BROWSER_IDS = {name: index for index, name in enumerate(BROWSERS)}
+_OS_IDS = {name: index for index, name in enumerate(OPERATING_SYSTEMS)}
+
+
+class UserAgentDimensions(NamedTuple):
+    browser: int
+    os: int
+    device: int
+
+
+# user agents repeat heavily, so each distinct string is parsed once per worker
+_parsed = LRUTTLCache(maxsize=settings.user_agent_cache_size, ttl=float("inf"))
+
+
+def _device(agent) -> int:
+    if agent.is_bot:
+        return DEVICES.index("Bot")
+    if agent.is_tablet:
+        return DEVICES.index("Tablet")
+    if agent.is_mobile:
+        return DEVICES.index("Mobile")
+    if agent.is_pc:
+        return DEVICES.index("Desktop")
+    return 0
+
+
+def parse_user_agent(user_agent: str) -> UserAgentDimensions:
+    dimensions = _parsed.get(user_agent)
+    if dimensions is None:
+        agent = parse(user_agent)
+        dimensions = UserAgentDimensions(
+            browser=_BROWSER_IDS.get(agent.browser.family, 0),
+            os=_OS_IDS.get(agent.os.family, 0),
+            device=_device(agent),
+        )
+        _parsed.set(user_agent, dimensions)
+    return dimensions
+
+
+def user_agent_dimensions(user_agent: Optional[str]) -> dict:
+    """Click columns for a user agent; all None when there is none"""
+    if not user_agent:
+        return {"browser": None, "os": None, "device": None}
+    return parse_user_agent(user_agent)._asdict()